@@ -0,0 +1,76 @@
+"""
+Per-message build cost of a 10k-recipient payment email batch.
+
+    python -m benchmarks.bench_email [-n 10000]
+
+"before" is what emails/email_utils used to do for every message: format
+the HTML with an f-string, assemble a MIMEMultipart and serialise it.
+"after" renders the precompiled template blocks and fills the prebuilt
+MessageSkeleton. No SMTP traffic is involved.
+"""
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+import argparse
+import time
+
+from emails.registry import MessageSkeleton, TemplateRegistry
+
+SENDER = "no-reply@checktoncontrat.fr"
+DASHBOARD_URL = "https://checktoncontrat.fr/dashboard"
+
+
+def _recipients(n):
+    return [(f"user{i}@example.com", f"Utilisateur {i}") for i in range(n)]
+
+
+def before(recipients):
+    for email, username in recipients:
+        analyse_type = "fiche"
+        subject = f"Paiement confirmé - Votre analyse de {analyse_type} est prête"
+        html = f"""
+    <html>
+      <body style="font-family:Arial,sans-serif;color:#333;">
+        <p>Bonjour <strong>{username}</strong>,</p>
+        <p>Nous vous confirmons que votre paiement Stripe a été effectué avec succès 🎉.</p>
+        <p>Votre analyse de <strong>{analyse_type}</strong> est maintenant terminée et disponible sur votre tableau de bord.</p>
+        <p><a href="{DASHBOARD_URL}">Accéder à mon tableau de bord</a></p>
+        <p>Merci d’avoir utilisé <strong>CheckTonContrat</strong> !</p>
+      </body>
+    </html>
+    """
+        msg = MIMEMultipart("alternative")
+        msg["Subject"] = subject
+        msg["From"] = SENDER
+        msg["To"] = email
+        msg.attach(MIMEText(html, "html"))
+        msg.as_bytes()
+
+
+def after(recipients, registry, skeleton):
+    for email, username in recipients:
+        message = registry.render("payment_success", username=username, analyse_type="fiche",
+                                  dashboard_url=DASHBOARD_URL)
+        skeleton.build(email, message.subject, message.html, message.text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=10000, help="number of recipients")
+    args = parser.parse_args()
+    recipients = _recipients(args.n)
+
+    start = time.perf_counter()
+    registry = TemplateRegistry()
+    skeleton = MessageSkeleton(SENDER)
+    print(f"template compilation (once)   {(time.perf_counter() - start) * 1000:8.2f} ms")
+
+    for label, run in (("before (f-string + MIME)", lambda: before(recipients)),
+                       ("after (registry + skeleton)", lambda: after(recipients, registry, skeleton))):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        print(f"{label:<29} {elapsed * 1e6 / args.n:8.1f} µs/message   {elapsed:6.2f} s total")
+
+
+if __name__ == "__main__":
+    main()
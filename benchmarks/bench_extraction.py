@@ -0,0 +1,71 @@
+"""
+Serial vs process-pool PDF text extraction over core/input-files.
+
+    python -m benchmarks.bench_extraction [--workers N] [--repeat R]
+
+The sample payslips are short, so each document is also repeated `--concat`
+times (pages are read back-to-back) to emulate long contracts.
+"""
+from pathlib import Path
+import argparse
+import time
+
+from core import extraction
+
+INPUT_DIR = Path(__file__).resolve().parent.parent / "core" / "input-files"
+
+
+def _time(func, *args, repeat=3, **kwargs):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _build_long_pdf(paths, concat, target):
+    """Concatenate the sample PDFs `concat` times into one long document."""
+    from PyPDF2 import PdfReader, PdfWriter
+    writer = PdfWriter()
+    for _ in range(concat):
+        for path in paths:
+            for page in PdfReader(str(path)).pages:
+                writer.add_page(page)
+    with open(target, "wb") as f:
+        writer.write(f)
+    return target
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=extraction.EXTRACT_WORKERS)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--concat", type=int, default=5)
+    args = parser.parse_args()
+
+    paths = sorted(INPUT_DIR.glob("*.pdf"))
+    if not paths:
+        raise SystemExit(f"No PDF found in {INPUT_DIR}")
+
+    long_pdf = _build_long_pdf(paths, args.concat, Path("/tmp") / "bench_extraction_long.pdf")
+    cases = [("all samples (one by one)", paths), ("long document", [long_pdf])]
+
+    # Warm the pool so process start-up is not billed to the first run
+    extraction.extract_pdf_pages(long_pdf, workers=args.workers, threshold=1)
+
+    print(f"workers={args.workers} threshold={extraction.PARALLEL_PAGE_THRESHOLD}")
+    for label, docs in cases:
+        serial = sum(_time(extraction.extract_pdf_pages, p, workers=1, repeat=args.repeat) for p in docs)
+        parallel = sum(
+            _time(extraction.extract_pdf_pages, p, workers=args.workers, threshold=1, repeat=args.repeat)
+            for p in docs
+        )
+        print(f"{label:<28} serial {serial * 1000:8.1f} ms   pool {parallel * 1000:8.1f} ms   "
+              f"speedup x{serial / parallel:.2f}")
+
+    extraction.shutdown_pool()
+
+
+if __name__ == "__main__":
+    main()
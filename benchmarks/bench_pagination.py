@@ -0,0 +1,109 @@
+"""
+Deep-page latency of the dashboard listing: OFFSET vs keyset pagination.
+
+    python -m benchmarks.bench_pagination [-n 1000000] [--url sqlite:///bench.db]
+
+Seeds `-n` checks spread over a few users into a scratch database (SQLite
+by default, any SQLAlchemy URL such as a local Postgres works), with the
+(user_id, created_at DESC, id) index, then times fetching a page at several
+depths for the busiest user. Seeding is skipped when the database already
+holds enough rows.
+"""
+from datetime import datetime, timedelta
+import argparse
+import time
+
+from sqlalchemy import create_engine, func, select, tuple_
+
+from models.models import db, User, Check
+
+PER_PAGE = 8
+USERS = 10
+INSERT_CHUNK = 20000
+
+
+def _seed(engine, n):
+    db.metadata.create_all(engine, tables=[User.__table__, Check.__table__])
+    with engine.begin() as conn:
+        if conn.execute(select(func.count()).select_from(Check.__table__)).scalar() >= n:
+            return
+        conn.execute(Check.__table__.delete())
+        conn.execute(User.__table__.delete())
+        conn.execute(User.__table__.insert(), [
+            {"id": u, "username": f"user{u}", "email": f"user{u}@example.com", "password_hash": "x",
+             "confirmed_email": True, "created_at": datetime.now()}
+            for u in range(1, USERS + 1)
+        ])
+
+        start = datetime(2024, 1, 1)
+        rows = []
+        for i in range(n):
+            # half the rows belong to user 1, the rest are spread out
+            user_id = 1 if i % 2 == 0 else 2 + i % (USERS - 1)
+            rows.append({"user_id": user_id, "module": "fiche", "input_files": f"{user_id}_f{i}.pdf",
+                         "output_files": f"report_{i}.pdf", "has_paid": True, "result": "Conforme",
+                         "detail": "", "created_at": start + timedelta(seconds=i)})
+            if len(rows) == INSERT_CHUNK:
+                conn.execute(Check.__table__.insert(), rows)
+                rows = []
+        if rows:
+            conn.execute(Check.__table__.insert(), rows)
+
+
+def _listing(user_id):
+    checks = Check.__table__
+    return (select(checks.c.id, checks.c.created_at, checks.c.module, checks.c.input_files,
+                   checks.c.has_paid, checks.c.result)
+            .where(checks.c.user_id == user_id))
+
+
+def _best(conn, stmt, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = conn.execute(stmt).all()
+        best = min(best, time.perf_counter() - start)
+    return best, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=1_000_000, help="number of checks to seed")
+    parser.add_argument("--url", default="sqlite:///bench_pagination.db", help="SQLAlchemy database URL")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = create_engine(args.url)
+    start = time.perf_counter()
+    _seed(engine, args.n)
+    print(f"seeded/checked {args.n} rows in {time.perf_counter() - start:.1f}s ({args.url})")
+
+    checks = Check.__table__
+    newest_first = (checks.c.created_at.desc(), checks.c.id.desc())
+    with engine.connect() as conn:
+        total = conn.execute(select(func.count()).where(checks.c.user_id == 1)).scalar()
+        for fraction in (0.0, 0.1, 0.5, 0.99):
+            offset = int(total * fraction) // PER_PAGE * PER_PAGE
+            offset_time, rows = _best(
+                conn, _listing(1).order_by(*newest_first).offset(offset).limit(PER_PAGE), args.repeat
+            )
+
+            # keyset: seek from the row just before the page, as the "after" cursor does
+            if offset:
+                cursor = conn.execute(
+                    _listing(1).order_by(*newest_first).offset(offset - 1).limit(1)
+                ).one()
+                stmt = _listing(1).where(
+                    tuple_(checks.c.created_at, checks.c.id) < tuple_(cursor.created_at, cursor.id)
+                )
+            else:
+                stmt = _listing(1)
+            keyset_time, keyset_rows = _best(conn, stmt.order_by(*newest_first).limit(PER_PAGE), args.repeat)
+            assert [r.id for r in rows] == [r.id for r in keyset_rows]
+
+            print(f"page {offset // PER_PAGE + 1:>7}   offset {offset_time * 1000:8.2f} ms   "
+                  f"keyset {keyset_time * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
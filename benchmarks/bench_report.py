@@ -0,0 +1,53 @@
+"""
+Per-report cost of PDF rendering, with and without a shared ReportRenderer.
+
+    python -m benchmarks.bench_report [-n 200]
+
+"before" builds a fresh renderer for every report, which is what
+_generate_report_file used to do (stylesheet, logo decoding and header
+table rebuilt each time); "after" reuses the process-wide renderer.
+Reports are rendered to memory so disk speed does not blur the numbers.
+"""
+from io import BytesIO
+import argparse
+import time
+import tracemalloc
+
+from core.report import ReportRenderer
+
+SAMPLE = {
+    "result": "Non conforme",
+    "detail": "### 1. Période d'essai\n- **Conformité** : durée supérieure au maximum légal.\n\n"
+              "### 2. Salaire\n- Le salaire mentionné est inférieur au SMIC.\n" * 5,
+}
+
+
+def _run(n, make_renderer):
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(n):
+        make_renderer().render(SAMPLE, BytesIO())
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size for stat in snapshot.statistics("filename"))
+    return elapsed / n, allocated, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=200, help="number of reports per run")
+    args = parser.parse_args()
+
+    shared = ReportRenderer()
+    shared.render(SAMPLE, BytesIO())  # warm-up
+
+    for label, factory in (("before (fresh renderer)", ReportRenderer), ("after (shared renderer)", lambda: shared)):
+        per_report, retained, peak = _run(args.n, factory)
+        print(f"{label:<26} {per_report * 1000:7.2f} ms/report   "
+              f"retained {retained / 1024:8.1f} KiB   peak {peak / 1024:8.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
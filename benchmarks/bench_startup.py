@@ -0,0 +1,68 @@
+"""
+Cold start of the web app: wall time to import `main` and where it goes.
+
+    python -m benchmarks.bench_startup [--module main] [--runs 5] [--top 15]
+
+Each run imports the module in a fresh interpreter. The profile is taken
+from `python -X importtime` and reports, per top-level package, the import
+time spent in its own modules (self time, so nested imports are not counted
+twice), followed by the slowest individual modules.
+"""
+from collections import defaultdict
+from pathlib import Path
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def cold_start(module: str) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", f"import {module}"], cwd=ROOT, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def import_profile(module: str) -> list:
+    """(self_us, cumulative_us, module) for every module imported by `module`."""
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT,
+                               check=True, capture_output=True, text=True)
+    rows = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(self_us), int(cumulative_us), name.strip()))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--module", default="main", help="module to import (default: main)")
+    parser.add_argument("--runs", type=int, default=5, help="cold starts to time")
+    parser.add_argument("--top", type=int, default=15, help="rows per profile table")
+    args = parser.parse_args()
+
+    timings = [cold_start(args.module) for _ in range(args.runs)]
+    print(f"cold start `import {args.module}`: median {statistics.median(timings) * 1000:.0f} ms, "
+          f"min {min(timings) * 1000:.0f} ms over {args.runs} runs (includes interpreter start)")
+
+    rows = import_profile(args.module)
+    by_package = defaultdict(int)
+    for self_us, _, name in rows:
+        by_package[name.split(".")[0]] += self_us
+    total = sum(by_package.values())
+    print(f"\nimport time by package (self, total {total / 1000:.0f} ms)")
+    for package, self_us in sorted(by_package.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {self_us / 1000:8.1f} ms  {package}")
+
+    print("\nslowest modules (self / cumulative)")
+    for self_us, cumulative_us, name in sorted(rows, reverse=True)[:args.top]:
+        print(f"  {self_us / 1000:8.1f} ms  {cumulative_us / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import asyncio
+import contextvars
+import inspect
+import threading
+from typing import Callable, Optional
+
+from core import chunking
+from core.openai_engine import OpenaiAnalyse, CHUNK_WORKERS
+from core.rate_limit import client_options
+
+
+class AsyncOpenaiAnalyse(OpenaiAnalyse):
+    """
+    Asynchronous variant of OpenaiAnalyse using the async OpenAI client.
+
+    In `analyse_fiche_async` both documents are extracted concurrently and
+    the PDF report is rendered while the caller's `on_result` callback
+    (DB update, emails...) runs, so a fiche check costs roughly
+    max(extract) + LLM + render. The sync methods stay available and run
+    the coroutines on a private event loop thread, which keeps the async
+    HTTP client bound to a single loop.
+    """
+
+    def __init__(self, *args, async_client=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._async_client = async_client
+        self._loop = None
+        self._loop_lock = threading.Lock()
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            import openai
+            self._async_client = openai.AsyncOpenAI(**client_options())
+        return self._async_client
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        """Start (once) the event loop thread used by the sync wrappers."""
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="openai-async-loop", daemon=True).start()
+            return self._loop
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._get_loop()).result()
+
+    async def _analyse_text_async(self, prompt: str, text: str, use_cache: bool = True,
+                                  on_text: Optional[Callable[[str], None]] = None) -> dict:
+        request = self._build_request(prompt, text)
+
+        ai_message = await asyncio.to_thread(self.response_cache.get, request) if use_cache else None
+        if ai_message is not None:
+            if on_text is not None:
+                await asyncio.to_thread(on_text, ai_message)
+        else:
+            if self.stream and on_text is not None:
+                ai_message = await self._stream_completion_async(request, on_text)
+            else:
+                response = await self.call_policy.call_async(
+                    request, lambda: self.async_client.chat.completions.create(**request)
+                )
+                ai_message = response.choices[0].message.content.strip()
+            await asyncio.to_thread(self.response_cache.set, request, ai_message)
+
+        return self._parse_message(ai_message)
+
+    async def _stream_completion_async(self, request: dict, on_text: Callable[[str], None]) -> str:
+        """
+        Async counterpart of `_stream_completion`. `on_text` runs in a worker
+        thread: it may save the text (a blocking database write), which must
+        not stall the other analyses sharing the loop.
+        """
+        async def consume():
+            answer = ""
+            stream = await self.async_client.chat.completions.create(**request, stream=True)
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    answer += chunk.choices[0].delta.content
+                    await asyncio.to_thread(on_text, answer)
+            return answer
+
+        return (await self.call_policy.call_async(request, consume)).strip()
+
+    async def _analyse_chunks_async(self, prompt: str, text: str, use_cache: bool = True, context: str = "") -> dict:
+        chunks = chunking.chunk_text(text, self.chunk_tokens)
+        total = len(chunks)
+        semaphore = asyncio.Semaphore(CHUNK_WORKERS)
+
+        async def analyse(index, chunk):
+            chunk_prompt, chunk_text = self._chunk_request(prompt, chunk, index, total, context)
+            async with semaphore:
+                return await self._analyse_text_async(chunk_prompt, chunk_text, use_cache=use_cache)
+
+        results = await asyncio.gather(*(analyse(i, c) for i, c in enumerate(chunks, start=1)))
+        return chunking.merge_verdicts(list(results))
+
+    async def _analyse_fiche_texts_async(self, fiche_text: str, contrat_text: str, prompt: str,
+                                         hours: int = None, use_cache: bool = True,
+                                         on_text: Optional[Callable[[str], None]] = None) -> dict:
+        verdict, prompt = self._precheck_fiche(fiche_text, contrat_text, prompt, hours)
+        if verdict is not None:
+            if on_text is not None:
+                await asyncio.to_thread(on_text, verdict["detail"])
+            return verdict
+
+        combined_text, contrat_part, fiche_part = self._fiche_parts(fiche_text, contrat_text, hours)
+
+        if self._needs_chunking(combined_text):
+            return await self._analyse_chunks_async(prompt, contrat_part, use_cache=use_cache, context=fiche_part)
+        return await self._analyse_text_async(prompt, combined_text, use_cache=use_cache, on_text=on_text)
+
+    async def analyse_fiche_async(self, fiche_file: str, contrat_file: str, prompt: str, hours: int = None,
+                                  use_cache: bool = True, on_result: Optional[Callable] = None,
+                                  context: Optional[contextvars.Context] = None,
+                                  on_text: Optional[Callable[[str], None]] = None) -> dict:
+        """
+        Analyse a payslip and contract pair. `on_result(ai_result)` may be a
+        plain function (run in a thread, inside `context` if given) or a
+        coroutine function; it runs concurrently with report rendering.
+        `on_text` follows the answer while it is generated.
+        """
+        fiche_text, contrat_text = await asyncio.gather(
+            asyncio.to_thread(self._read_file, fiche_file, self.token_budget // 2),
+            asyncio.to_thread(self._read_file, contrat_file, self.document_tokens),
+        )
+
+        ai_result = await self._analyse_fiche_texts_async(fiche_text, contrat_text, prompt, hours,
+                                                          use_cache=use_cache, on_text=on_text)
+
+        render = asyncio.to_thread(self._generate_report_file, ai_result)
+        if on_result is None:
+            report_file = await render
+        elif inspect.iscoroutinefunction(on_result):
+            report_file, _ = await asyncio.gather(render, on_result(ai_result))
+        else:
+            ctx = context or contextvars.copy_context()
+            callback = asyncio.get_running_loop().run_in_executor(None, ctx.run, on_result, ai_result)
+            report_file, _ = await asyncio.gather(render, callback)
+
+        return {
+            "result": ai_result.get("result", "Non conforme"),
+            "detail": ai_result.get("detail", ""),
+            "report_file": report_file,
+        }
+
+    def analyse_fiche(self, fiche_file: str, contrat_file: str, prompt: str, hours: int = None,
+                      use_cache: bool = True, on_result: Optional[Callable] = None,
+                      on_text: Optional[Callable[[str], None]] = None) -> dict:
+        """Sync wrapper of analyse_fiche_async (callback runs in the caller's context)."""
+        return self._run(self.analyse_fiche_async(
+            fiche_file, contrat_file, prompt, hours=hours, use_cache=use_cache,
+            on_result=on_result, context=contextvars.copy_context(), on_text=on_text,
+        ))
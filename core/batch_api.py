@@ -0,0 +1,180 @@
+from pathlib import Path
+from types import SimpleNamespace
+import json
+import secrets
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Offline submission of non-urgent analyses through the OpenAI Batch API
+BASE_DIR = Path(__file__).resolve().parent
+BATCH_DIR = BASE_DIR / "batch-files"
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+COMPLETION_WINDOW = "24h"
+
+
+class BatchError(Exception):
+    """Raised when a submitted batch failed, expired or was cancelled."""
+    pass
+
+
+def make_custom_id(job_id: int, item: int, part: int, parts: int) -> str:
+    """custom_id of one request line: job, payslip index and chunk part."""
+    return f"job-{job_id}-{item}-{part}-{parts}"
+
+
+def parse_custom_id(custom_id: str) -> Tuple[int, int, int, int]:
+    _, job_id, item, part, parts = custom_id.split("-")
+    return int(job_id), int(item), int(part), int(parts)
+
+
+def write_requests(lines: List[Tuple[str, dict]], path: Optional[Path] = None) -> Path:
+    """Write (custom_id, request body) pairs as a Batch API input JSONL file."""
+    BATCH_DIR.mkdir(parents=True, exist_ok=True)
+    path = Path(path) if path else BATCH_DIR / f"batch_{secrets.token_urlsafe(8)}.jsonl"
+
+    with open(path, "w", encoding="utf-8") as f:
+        for custom_id, body in lines:
+            row = {"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body}
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+    return path
+
+
+def submit(client, path: Path) -> str:
+    """Upload the JSONL file and create the batch; returns the batch id."""
+    with open(path, "rb") as f:
+        uploaded = client.files.create(file=f, purpose="batch")
+    batch = client.batches.create(
+        input_file_id=uploaded.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window=COMPLETION_WINDOW,
+    )
+    return batch.id
+
+
+def fetch(client, batch_id: str) -> Optional[Dict[str, Optional[str]]]:
+    """
+    Return {custom_id: answer} for a completed batch, None while it is still
+    running. Lines that errored map to None.
+    """
+    batch = client.batches.retrieve(batch_id)
+    if batch.status in ("failed", "expired", "cancelled"):
+        raise BatchError(f"Batch {batch_id} {batch.status}")
+    if batch.status != "completed":
+        return None
+
+    messages = {}
+    if batch.output_file_id:
+        for line in client.files.content(batch.output_file_id).text.splitlines():
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            response = row.get("response") or {}
+            if row.get("error") or response.get("status_code") != 200:
+                messages[row["custom_id"]] = None
+                continue
+            messages[row["custom_id"]] = response["body"]["choices"][0]["message"]["content"].strip()
+
+    # Requests that failed validation are reported in the error file only
+    if getattr(batch, "error_file_id", None):
+        for line in client.files.content(batch.error_file_id).text.splitlines():
+            if line.strip():
+                messages.setdefault(json.loads(line)["custom_id"], None)
+
+    return messages
+
+
+def prepare_fiche_batch(engine, job_id: int, contrat_file: str, fiche_files: List[str], prompt: str,
+                        hours: int = None) -> List[Tuple[str, dict]]:
+    """Request lines for every payslip of a batch job (one line per chunk)."""
+    contrat_text = engine._read_file(contrat_file, max_tokens=engine.document_tokens)
+
+    lines = []
+    for item, fiche_file in enumerate(fiche_files):
+        fiche_text = engine._read_file(fiche_file, max_tokens=engine.token_budget // 2)
+        requests = engine._fiche_requests(fiche_text, contrat_text, prompt, hours)
+        for part, request in enumerate(requests, start=1):
+            lines.append((make_custom_id(job_id, item, part, len(requests)), request))
+    return lines
+
+
+def collect_fiche_batch(engine, job_id: int, fiche_files: List[str], messages: Dict[str, Optional[str]]) -> List[dict]:
+    """
+    Turn the answers of a job into the same per-payslip items as
+    OpenaiAnalyse.analyse_batch (reports are rendered here).
+    """
+    parts_by_item = {}
+    for custom_id, message in messages.items():
+        owner, item, part, parts = parse_custom_id(custom_id)
+        if owner == job_id:
+            parts_by_item.setdefault(item, {"parts": parts, "messages": {}})["messages"][part] = message
+
+    results = []
+    for item, fiche_file in enumerate(fiche_files):
+        entry = parts_by_item.get(item)
+        ordered = [entry["messages"].get(p) for p in range(1, entry["parts"] + 1)] if entry else [None]
+        if any(m is None for m in ordered):
+            results.append({"fiche_file": fiche_file, "status": "error", "error": "Aucune réponse du modèle"})
+            continue
+
+        ai_result = engine._verdict_from_messages(ordered)
+        results.append({
+            "fiche_file": fiche_file,
+            "status": "ok",
+            "result": ai_result.get("result", "Non conforme"),
+            "detail": ai_result.get("detail", ""),
+            "report_file": engine._generate_report_file(ai_result),
+        })
+    return results
+
+
+class LocalBatchClient:
+    """
+    Offline stand-in for the `files` and `batches` endpoints of the OpenAI
+    client: a submitted JSONL file is read back and every line is answered
+    immediately by `responder(request_body) -> str` (a canned verdict by
+    default).
+    """
+
+    def __init__(self, responder: Optional[Callable[[dict], str]] = None):
+        self.responder = responder or (lambda body: json.dumps(
+            {"result": "Conforme", "detail": "Réponse simulée (LocalBatchClient)."}, ensure_ascii=False
+        ))
+        self._files = {}
+        self._batches = {}
+        self.files = SimpleNamespace(create=self._create_file, content=self._file_content)
+        self.batches = SimpleNamespace(create=self._create_batch, retrieve=self._retrieve_batch)
+
+    def _create_file(self, file, purpose):
+        file_id = f"file-{secrets.token_hex(6)}"
+        data = file.read()
+        self._files[file_id] = data.decode("utf-8") if isinstance(data, bytes) else data
+        return SimpleNamespace(id=file_id, purpose=purpose)
+
+    def _file_content(self, file_id):
+        return SimpleNamespace(text=self._files[file_id])
+
+    def _create_batch(self, input_file_id, endpoint, completion_window):
+        output = []
+        for line in self._files[input_file_id].splitlines():
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            content = self.responder(row["body"])
+            output.append(json.dumps({
+                "custom_id": row["custom_id"],
+                "response": {
+                    "status_code": 200,
+                    "body": {"choices": [{"message": {"role": "assistant", "content": content}}]},
+                },
+                "error": None,
+            }, ensure_ascii=False))
+
+        output_id = f"file-{secrets.token_hex(6)}"
+        self._files[output_id] = "\n".join(output)
+        batch = SimpleNamespace(id=f"batch-{secrets.token_hex(6)}", status="completed",
+                                output_file_id=output_id, error_file_id=None)
+        self._batches[batch.id] = batch
+        return batch
+
+    def _retrieve_batch(self, batch_id):
+        return self._batches[batch_id]
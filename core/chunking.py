@@ -0,0 +1,93 @@
+import re
+from typing import List
+
+from core.extraction import CHARS_PER_TOKEN, estimate_tokens
+
+# Start of an article / clause: "Article 3", "ARTICLE IV", "Art. 2", "Clause 5",
+# "Titre II", "Section 1", or numbered headings such as "3." / "4.2)".
+CLAUSE_PATTERN = re.compile(
+    r"^[ \t]*(?:"
+    r"(?:article|art\.|clause|titre|chapitre|section)\s+(?:\d+|[ivxlc]+\b|premier|1er)"
+    r"|\d+(?:\.\d+)*[ \t]*[.)\-][ \t]+\S"
+    r")",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+
+def split_sections(text: str) -> List[str]:
+    """Split a document on article/clause headings (preamble kept first)."""
+    starts = [m.start() for m in CLAUSE_PATTERN.finditer(text)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    bounds = starts + [len(text)]
+    sections = [text[bounds[i]:bounds[i + 1]].strip() for i in range(len(starts))]
+    return [s for s in sections if s]
+
+
+def _split_oversized(section: str, max_tokens: int) -> List[str]:
+    """Split a single section larger than the budget by paragraph, then by size."""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    pieces, current = [], ""
+    for paragraph in section.split("\n\n"):
+        while len(paragraph) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(paragraph[:max_chars])
+            paragraph = paragraph[max_chars:]
+        if current and len(current) + len(paragraph) + 2 > max_chars:
+            pieces.append(current)
+            current = paragraph
+        else:
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def chunk_text(text: str, max_tokens: int) -> List[str]:
+    """
+    Group consecutive clauses into chunks of at most `max_tokens`
+    (estimated), never cutting inside a clause unless the clause alone
+    exceeds the budget.
+    """
+    chunks, current, current_tokens = [], [], 0
+    for section in split_sections(text):
+        tokens = estimate_tokens(section)
+        if tokens > max_tokens:
+            parts = _split_oversized(section, max_tokens)
+        else:
+            parts = [section]
+
+        for part in parts:
+            part_tokens = estimate_tokens(part)
+            if current and current_tokens + part_tokens > max_tokens:
+                chunks.append("\n\n".join(current))
+                current, current_tokens = [], 0
+            current.append(part)
+            current_tokens += part_tokens
+
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def merge_verdicts(results: List[dict]) -> dict:
+    """
+    Reduce partial {"result", "detail"} verdicts into one: the document is
+    "Conforme" only if every part is, and details are kept part by part.
+    """
+    non_conforme = any("non" in (r.get("result") or "Non conforme").lower() for r in results)
+
+    if len(results) == 1:
+        details = results[0].get("detail", "")
+    else:
+        details = "\n\n".join(
+            f"### Partie {i}/{len(results)}\n\n{r.get('detail', '')}"
+            for i, r in enumerate(results, start=1)
+        )
+
+    return {
+        "result": "Non conforme" if non_conforme else "Conforme",
+        "detail": details,
+    }
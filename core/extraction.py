@@ -0,0 +1,182 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import logging
+import multiprocessing
+import os
+import threading
+from typing import Dict, Iterator, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# Documents with fewer pages are extracted serially: below this size the
+# cost of shipping work to another process outweighs the gain.
+PARALLEL_PAGE_THRESHOLD = int(os.getenv("EXTRACT_PARALLEL_THRESHOLD", 8))
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", os.cpu_count() or 1))
+# Pages per pool task; at most EXTRACT_WORKERS tasks are in flight at once
+BATCH_PAGES = int(os.getenv("EXTRACT_BATCH_PAGES", 4))
+
+# Rough token estimate for French text (~4 characters per token)
+CHARS_PER_TOKEN = 4
+
+# Document token budget per model: context window minus room for the
+# prompt and the answer.
+MODEL_TOKEN_BUDGETS = {
+    "gpt-4o-mini": 100_000,
+    "gpt-4o": 100_000,
+    "gpt-4.1-mini": 100_000,
+    "gpt-3.5-turbo": 12_000,
+}
+DEFAULT_TOKEN_BUDGET = int(os.getenv("DOCUMENT_TOKEN_BUDGET", 100_000))
+
+TRUNCATION_MARKER = "\n\n[... document tronqué : limite de {tokens} tokens atteinte ...]"
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def pool_context():
+    """
+    Start method of the process pools. Never "fork": the web and job threads
+    of this process may hold a lock (the report renderer's...) that a forked
+    child would inherit locked.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def _get_pool(workers: int) -> Optional[ProcessPoolExecutor]:
+    """Return the shared process pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            try:
+                _pool = ProcessPoolExecutor(max_workers=workers, mp_context=pool_context())
+            except (OSError, NotImplementedError) as e:
+                logger.warning("Process pool unavailable, extracting serially: %s", e)
+                return None
+        return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
+
+
+def _extract_range(path: str, start: int, stop: int) -> List[str]:
+    """Extract pages [start, stop) of a PDF. Runs inside a pool process."""
+    from PyPDF2 import PdfReader
+    reader = PdfReader(path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate, good enough to budget a request."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def budget_for(model: str) -> int:
+    """Token budget available for document text with `model`."""
+    return MODEL_TOKEN_BUDGETS.get(model, DEFAULT_TOKEN_BUDGET)
+
+
+def iter_pdf_pages(path: Union[str, Path], workers: int = EXTRACT_WORKERS,
+                   threshold: int = PARALLEL_PAGE_THRESHOLD, batch_pages: int = BATCH_PAGES) -> Iterator[str]:
+    """
+    Lazily yield the text of each page of a PDF, in page order.
+
+    Documents of at least `threshold` pages are extracted by the process
+    pool in batches of `batch_pages` pages, with at most `workers` batches
+    in flight, so memory stays bounded whatever the document length and
+    closing the generator early stops any further extraction.
+    """
+    from PyPDF2 import PdfReader
+    path = str(path)
+    reader = PdfReader(path)
+    page_count = len(reader.pages)
+
+    pool = _get_pool(workers) if workers > 1 and page_count >= threshold else None
+    if pool is None:
+        for i in range(page_count):
+            yield reader.pages[i].extract_text() or ""
+        return
+
+    ranges = [(start, min(start + batch_pages, page_count)) for start in range(0, page_count, batch_pages)]
+    pending = deque()
+    next_range = 0
+    done_pages = 0
+    try:
+        while next_range < len(ranges) or pending:
+            while next_range < len(ranges) and len(pending) < workers:
+                pending.append(pool.submit(_extract_range, path, *ranges[next_range]))
+                next_range += 1
+            try:
+                texts = pending.popleft().result()
+            except Exception as e:
+                logger.warning("Parallel extraction failed, continuing serially: %s", e)
+                break
+            for text in texts:
+                done_pages += 1
+                yield text
+    finally:
+        for future in pending:
+            future.cancel()
+
+    # Serial fallback for whatever the pool could not extract
+    for i in range(done_pages, page_count):
+        yield reader.pages[i].extract_text() or ""
+
+
+def extract_pdf_pages(path: Union[str, Path], workers: int = EXTRACT_WORKERS,
+                      threshold: int = PARALLEL_PAGE_THRESHOLD) -> List[str]:
+    """Return the text of every page of a PDF, in page order."""
+    return list(iter_pdf_pages(path, workers=workers, threshold=threshold))
+
+
+def extract_pdf_text(path: Union[str, Path], workers: int = EXTRACT_WORKERS,
+                     threshold: int = PARALLEL_PAGE_THRESHOLD) -> str:
+    """Text of a whole PDF, pages joined by newlines."""
+    return "\n".join(extract_pdf_pages(path, workers=workers, threshold=threshold))
+
+
+def truncate_to_budget(pages: Iterator[str], max_tokens: Optional[int]) -> Dict:
+    """
+    Consume page texts until `max_tokens` is reached.
+
+    Returns a dict with the joined `text` (ending with TRUNCATION_MARKER when
+    cut), `pages` read, estimated `tokens` and a `truncated` flag. The page
+    iterator is closed as soon as the budget is exhausted, so the remaining
+    pages are never parsed.
+    """
+    parts, tokens, pages_read, truncated = [], 0, 0, False
+    try:
+        for text in pages:
+            cost = estimate_tokens(text) + 1  # + joining newline
+            if max_tokens is not None and tokens + cost > max_tokens:
+                remaining = max_tokens - tokens
+                if remaining > 0:
+                    parts.append(text[:remaining * CHARS_PER_TOKEN])
+                    tokens = max_tokens
+                truncated = True
+                break
+            parts.append(text)
+            tokens += cost
+            pages_read += 1
+    finally:
+        if hasattr(pages, "close"):
+            pages.close()
+
+    text = "\n".join(parts).strip()
+    if truncated:
+        text += TRUNCATION_MARKER.format(tokens=max_tokens)
+
+    return {"text": text, "pages": pages_read, "tokens": tokens, "truncated": truncated}
+
+
+def read_pdf(path: Union[str, Path], max_tokens: Optional[int] = None, workers: int = EXTRACT_WORKERS,
+             threshold: int = PARALLEL_PAGE_THRESHOLD) -> Dict:
+    """Read a PDF lazily, stopping once `max_tokens` is reached (see truncate_to_budget)."""
+    return truncate_to_budget(iter_pdf_pages(path, workers=workers, threshold=threshold), max_tokens)
@@ -0,0 +1,204 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import json
+import logging
+import os
+import threading
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import func, update
+
+from models.models import db, Job
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 2.0))
+# A running job whose heartbeat is older than this is considered lost (crashed worker)
+JOB_STALE_AFTER = timedelta(seconds=int(os.getenv("JOB_STALE_AFTER", 15 * 60)))
+# Running jobs refresh their heartbeat this often
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", 60))
+
+
+class JobQueue:
+    """
+    Persisted job queue backed by the `jobs` table.
+
+    Web requests only insert a row (`submit`) and return. A pool of worker
+    threads claims pending rows with an atomic UPDATE, so any number of
+    processes (web workers or a dedicated `flask run-jobs` process) can
+    share the same table without running a job twice.
+    """
+
+    def __init__(self, app=None, workers: int = JOB_WORKERS, poll_interval: float = JOB_POLL_INTERVAL):
+        self.app = None
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.handlers: Dict[str, Callable] = {}
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        self.app = app
+        app.extensions["jobs"] = self
+
+    def handler(self, module: str):
+        """Decorator registering the function that runs jobs of `module`."""
+        def decorator(func: Callable) -> Callable:
+            self.handlers[module] = func
+            return func
+        return decorator
+
+    def submit(self, module: str, payload: dict, check=None, user_id=None, status: str = "pending") -> Job:
+        """
+        Persist a new job (committing the current session) and wake a worker.
+        Use status="awaiting_payment" to store the job before checkout and
+        `release` it once paid.
+        """
+        job = Job(module=module, payload=json.dumps(payload), check=check, user_id=user_id, status=status)
+        db.session.add(job)
+        db.session.commit()
+        if status == "pending":
+            self._wakeup.set()
+        return job
+
+    def release(self, job: Job) -> None:
+        """Make a job that was awaiting payment runnable."""
+        if job.status == "awaiting_payment":
+            job.status = "pending"
+            db.session.commit()
+            self._wakeup.set()
+
+    def start(self) -> None:
+        """Start the worker threads of this process (no-op if workers == 0)."""
+        if self._threads or self.workers <= 0:
+            return
+        self._requeue_stale()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wakeup.set()
+
+    def _requeue_stale(self) -> None:
+        with self.app.app_context():
+            db.session.execute(
+                update(Job)
+                .where(Job.status == "running",
+                       func.coalesce(Job.heartbeat_at, Job.started_at) < datetime.now() - JOB_STALE_AFTER)
+                .values(status="pending")
+            )
+            db.session.commit()
+
+    def _worker_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                job_id = self._claim_next()
+            except Exception:
+                logger.exception("Failed to claim a job")
+                job_id = None
+
+            if job_id is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            self._run(job_id)
+
+    def _claim_next(self) -> Optional[int]:
+        """Atomically move the oldest pending job to `running` and return its id."""
+        with self.app.app_context():
+            while True:
+                job_id = db.session.execute(
+                    db.select(Job.id).where(Job.status == "pending").order_by(Job.id).limit(1)
+                ).scalar()
+                if job_id is None:
+                    return None
+
+                claimed = db.session.execute(
+                    update(Job)
+                    .where(Job.id == job_id, Job.status == "pending")
+                    .values(status="running", started_at=datetime.now(), heartbeat_at=datetime.now(),
+                            attempts=Job.attempts + 1)
+                )
+                db.session.commit()
+                if claimed.rowcount == 1:
+                    return job_id
+                # another worker took it first, try the next one
+
+    def _run(self, job_id: int) -> None:
+        with self.app.app_context():
+            job = db.session.get(Job, job_id)
+            payload = json.loads(job.payload or "{}")
+            handler = self.handlers.get(job.module)
+
+            try:
+                if handler is None:
+                    raise LookupError(f"No handler registered for module {job.module!r}")
+
+                # Handlers may build absolute URLs (emails), so give them a request context
+                base_url = payload.get("base_url", "http://localhost/")
+                with self.app.test_request_context(base_url=base_url), self._heartbeat(job_id):
+                    handler(job, payload)
+
+                job.status = "done"
+                job.error = None
+                # Written on another connection by the stream producer: reload it so clearing it is an UPDATE
+                db.session.expire(job, ["partial"])
+                job.partial = None
+            except Exception as e:
+                db.session.rollback()
+                logger.exception("Job %s failed", job_id)
+                job = db.session.get(Job, job_id)
+                job.error = str(e)
+                job.partial = None  # a retry streams from scratch
+                job.status = "pending" if job.attempts < JOB_MAX_ATTEMPTS else "failed"
+
+            job.finished_at = datetime.now()
+            db.session.commit()
+
+    @contextmanager
+    def _heartbeat(self, job_id: int):
+        """Refresh the job's heartbeat every JOB_HEARTBEAT_SECONDS while the block runs."""
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(JOB_HEARTBEAT_SECONDS):
+                try:
+                    self.heartbeat(job_id)
+                except Exception:
+                    logger.exception("Heartbeat of job %s failed", job_id)
+
+        thread = threading.Thread(target=beat, name=f"job-heartbeat-{job_id}", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def heartbeat(self, job_id: int) -> None:
+        """Mark a running job as alive (own app context and commit)."""
+        with self.app.app_context():
+            db.session.execute(
+                update(Job).where(Job.id == job_id, Job.status == "running").values(heartbeat_at=datetime.now())
+            )
+            db.session.commit()
+
+    def run_forever(self, workers: Optional[int] = None) -> None:
+        """Run the workers in the foreground (dedicated worker process)."""
+        if workers:
+            self.workers = workers
+        self.start()
+        try:
+            for thread in self._threads:
+                thread.join()
+        except KeyboardInterrupt:
+            self.stop()
@@ -1,16 +1,20 @@
 from pathlib import Path
-import markdown
-from datetime import datetime
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
-from reportlab.lib.units import cm
-from reportlab.lib import colors
 import json
-import openai
 import secrets
+import threading
 import os
 from dotenv import load_dotenv
+from core import store
+from core.text_cache import TextCache
+from core.response_cache import ResponseCache
+from core import extraction
+from core import chunking
+from core import payslip_rules
+from core.report import ReportRenderer, REPORT_MODE, get_report_cache
+from core.render_service import RenderService, render_report
+from core.rate_limit import CallPolicy, client_options, get_call_policy
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Optional
 
 load_dotenv()
 
@@ -22,132 +26,145 @@ OUTPUT_DIR = BASE_DIR / "output-files"
 # Make sure output folder exists
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
+# Documents above this estimate are analysed in clause-aligned chunks
+CHUNK_TOKENS = int(os.getenv('CHUNK_TOKENS', 12000))
+# Documents that may be chunked are read up to this many tokens: a bound on
+# the map-reduce total (~DOCUMENT_MAX_TOKENS / CHUNK_TOKENS requests), not
+# on a single request
+DOCUMENT_MAX_TOKENS = int(os.getenv('DOCUMENT_MAX_TOKENS', 1_000_000))
+CHUNK_WORKERS = int(os.getenv('CHUNK_WORKERS', 4))
+# Payslips analysed at the same time in a batch
+BATCH_IN_FLIGHT = int(os.getenv('BATCH_IN_FLIGHT', 8))
+
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
-# Initialize the OpenAI client
-client = openai.OpenAI()
+# Stream completions to `on_text` callbacks as they are generated
+OPENAI_STREAM = os.getenv('OPENAI_STREAM', '1') == '1'
+
+# Shared OpenAI client, created (and the SDK imported) on first use
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            import openai
+            _client = openai.OpenAI(**client_options())
+        return _client
+
 
 class OpenaiAnalyse:
     """
     Handles AI-powered analysis for contracts and payslips using OpenAI models.
     """
 
-    def __init__(self, model: str = "gpt-4o-mini"):
+    SYSTEM_PROMPT = "Tu es un expert juridique spécialisé en droit du travail français."
+
+    def __init__(self, model: str = "gpt-4o-mini", text_cache: TextCache = None,
+                 response_cache: ResponseCache = None, openai_client=None,
+                 render_service: RenderService = None, call_policy: CallPolicy = None,
+                 stream: bool = OPENAI_STREAM, payslip_precheck: bool = payslip_rules.PAYSLIP_PRECHECK):
         self.model = model
+        self.text_cache = text_cache if text_cache is not None else TextCache()
+        self.response_cache = response_cache if response_cache is not None else ResponseCache()
+        self._client = openai_client
+        self.token_budget = extraction.budget_for(model)
+        # A chunk and the payslip sent along with it must fit in one request
+        self.chunk_tokens = min(CHUNK_TOKENS, self.token_budget // 2)
+        self.document_tokens = DOCUMENT_MAX_TOKENS
+        self.report_mode = REPORT_MODE
+        self.render_service = render_service
+        self.call_policy = call_policy if call_policy is not None else get_call_policy()
+        self.stream = stream
+        self.payslip_precheck = payslip_precheck
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_client()
+        return self._client
 
     def _generate_token(self) -> str:
         """Generate a short, URL-safe random token."""
         return secrets.token_urlsafe(8)
 
-    def _read_file(self, filename: str) -> str:
+    def _read_file(self, filename: str, max_tokens: int = None) -> str:
         """
         Read the uploaded file (pdf or docx) and extract its text.
-        You can improve extraction using libraries like PyPDF2 or python-docx.
+        Extracted text is cached by content digest, so a document already
+        seen (e.g. the same contract checked against several payslips) is
+        not parsed again.
+
+        When `max_tokens` is given, PDF pages are read lazily and reading
+        stops once the budget is reached; the returned text then ends with
+        extraction.TRUNCATION_MARKER. Truncated text is never cached.
         """
-        filepath = INPUT_DIR / filename
+        filepath = store.resolve(filename)
         ext = filepath.suffix.lower()
 
-        if not filepath.exists():
-            raise FileNotFoundError(f"File not found: {filepath}")
+        digest = store.digest_for(filename)
+        cached = self.text_cache.get(digest)
+        if cached is not None:
+            return self._apply_budget(cached, max_tokens)
 
         if ext == ".pdf":
-            from PyPDF2 import PdfReader
-            reader = PdfReader(str(filepath))
-            text = "\n".join(page.extract_text() or "" for page in reader.pages)
+            read = extraction.read_pdf(filepath, max_tokens=max_tokens)
+            if read["truncated"]:
+                return read["text"]
+            text = read["text"]
         elif ext == ".docx":
             import docx
             doc = docx.Document(str(filepath))
-            text = "\n".join(p.text for p in doc.paragraphs)
+            text = "\n".join(p.text for p in doc.paragraphs).strip()
         else:
             raise ValueError("Unsupported file type. Must be PDF or DOCX.")
 
-        return text.strip()
+        self.text_cache.put(digest, text)
+        return self._apply_budget(text, max_tokens)
+
+    def _apply_budget(self, text: str, max_tokens: int = None) -> str:
+        """Cut an already extracted text to `max_tokens` (line by line)."""
+        if max_tokens is None or extraction.estimate_tokens(text) <= max_tokens:
+            return text
+        return extraction.truncate_to_budget(iter(text.split("\n")), max_tokens)["text"]
     
     def _render_markdown(self, text):
-        if not text:
-            return ""
-        return markdown.markdown(text, extensions=['fenced_code', 'tables'])
+        return ReportRenderer.render_markdown(text)
 
     def _generate_report_file(self, analysis_result: dict) -> str:
         """
         Save the AI analysis as a PDF report in output-files/ and return its filename.
         The PDF includes: title, result status, detailed explanation, and timestamp.
+
+        With REPORT_MODE=lazy only the filename is reserved: the report is
+        built from the stored Check on first download.
         """
         filename = f"report_{self._generate_token()}.pdf"
-        output_path = OUTPUT_DIR / filename
-        
-        # Extract data safely
-        result_text = analysis_result.get("result", "Non conforme")
-        detail_text = self._render_markdown(analysis_result.get("detail", "Aucun détail fourni."))
-        timestamp = datetime.now().strftime("%d/%m/%Y à %H:%M")
-
-        # PDF document setup
-        doc = SimpleDocTemplate(str(output_path), pagesize=A4)
-        styles = getSampleStyleSheet()
-        story = []
-
-        # Path to your logo
-        logo_path = "static/images/logo-header.png"
-
-        try:
-            logo = Image(logo_path, width=2.2*cm, height=2.2*cm)  # adjust size as needed
-        except Exception:
-            logo = Spacer(1, 2.2*cm)  # fallback if image missing
-
-        # Title paragraph
-        title = Paragraph("<b>Rapport d’analyse - CheckTonContrat</b>", styles["Title"])
-
-        # Create a two-column layout: [logo | title]
-        header_table = Table(
-            [[logo, title]],
-            colWidths=[2.5*cm, None]  # left column fixed, right auto-expands
-        )
-
-        header_table.setStyle(TableStyle([
-            ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-            ("LEFTPADDING", (0, 0), (-1, -1), 0),
-            ("RIGHTPADDING", (0, 0), (-1, -1), 0),
-            ("BOTTOMPADDING", (0, 0), (-1, -1), 6),
-        ]))
-
-        # Add header to story
-        story.append(header_table)
-        story.append(Spacer(1, 0.5 * cm))
-
-        # Result section
-        color = colors.green if "conforme" in result_text.lower() else colors.red
-        result_html = f"<font color='{color.hexval()}'><b>Résultat :</b> {result_text}</font>"
-        story.append(Paragraph(result_html, styles["Heading2"]))
-        story.append(Spacer(1, 0.3 * cm))
-
-        # Detail section
-        story.append(Paragraph("<b>Détails de l’analyse :</b>", styles["Heading3"]))
-        story.append(Paragraph(detail_text.replace("\n", "<br/>"), styles["BodyText"]))
-        story.append(Spacer(1, 0.5 * cm))
-
-        # Timestamp
-        story.append(Paragraph(f"<font size='9' color='gray'>Généré le {timestamp} par CheckTonContrat.fr</font>", styles["Normal"]))
-
-        # Build PDF
-        doc.build(story)
-
+        if self.report_mode != "lazy":
+            get_report_cache().put(filename, self.render_report(analysis_result))
         return filename
 
+    def render_report(self, analysis_result: dict) -> bytes:
+        """PDF bytes of a report, rendered in the render process pool when enabled."""
+        if self.render_service is not None:
+            return self.render_service.render(analysis_result)
+        return render_report(analysis_result)
 
-    def _analyse_text(self, prompt: str, text: str) -> dict:
-        """
-        Send prompt + text to the OpenAI model and parse the structured response.
-        """
-        response = client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": "Tu es un expert juridique spécialisé en droit du travail français."},
+
+    def _build_request(self, prompt: str, text: str) -> dict:
+        """Build the chat completion parameters for prompt + document text."""
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": self.SYSTEM_PROMPT},
                 {"role": "user", "content": f"{prompt}\n\n---\n\n{text}"}
             ],
-            temperature=0.3
-        )
-
-        ai_message = response.choices[0].message.content.strip()
+            "temperature": 0.3,
+        }
 
+    def _parse_message(self, ai_message: str) -> dict:
+        """Parse the model answer into a {"result", "detail"} dict."""
         # Try to parse JSON structure if model returns structured data
         try:
             result_data = json.loads(ai_message)
@@ -162,15 +179,105 @@ class OpenaiAnalyse:
 
         return result_data
 
+    def _analyse_text(self, prompt: str, text: str, use_cache: bool = True,
+                      on_text: Optional[Callable[[str], None]] = None) -> dict:
+        """
+        Send prompt + text to the OpenAI model and parse the structured response.
+        Identical requests are answered from the response cache unless
+        `use_cache` is False. In streaming mode `on_text` receives the answer
+        generated so far as it arrives (a cached answer is passed at once).
+        """
+        request = self._build_request(prompt, text)
+
+        ai_message = self.response_cache.get(request) if use_cache else None
+        if ai_message is not None:
+            if on_text is not None:
+                on_text(ai_message)
+        else:
+            if self.stream and on_text is not None:
+                ai_message = self._stream_completion(request, on_text)
+            else:
+                response = self.call_policy.call(request, lambda: self.client.chat.completions.create(**request))
+                ai_message = response.choices[0].message.content.strip()
+            self.response_cache.set(request, ai_message)
+
+        return self._parse_message(ai_message)
+
+    def _stream_completion(self, request: dict, on_text: Callable[[str], None]) -> str:
+        """
+        Send `request` with stream=True and return the whole answer, calling
+        `on_text(text_so_far)` on every delta. The stream is consumed inside
+        the call policy, so a retried attempt starts over from empty text.
+        """
+        def consume():
+            answer = ""
+            for chunk in self.client.chat.completions.create(**request, stream=True):
+                if chunk.choices and chunk.choices[0].delta.content:
+                    answer += chunk.choices[0].delta.content
+                    on_text(answer)
+            return answer
+
+        return self.call_policy.call(request, consume).strip()
+
+    def _analyse_chunks(self, prompt: str, text: str, use_cache: bool = True, context: str = "") -> dict:
+        """
+        Map-reduce analysis of a long document: `text` is split on
+        article/clause boundaries, chunks are analysed concurrently (each
+        with the shared `context` appended) and partial verdicts are merged.
+        """
+        chunks = chunking.chunk_text(text, self.chunk_tokens)
+        total = len(chunks)
+
+        def analyse(indexed_chunk):
+            index, chunk = indexed_chunk
+            chunk_prompt, chunk_text = self._chunk_request(prompt, chunk, index, total, context)
+            return self._analyse_text(chunk_prompt, chunk_text, use_cache=use_cache)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(total, CHUNK_WORKERS))) as pool:
+            results = list(pool.map(analyse, enumerate(chunks, start=1)))
+
+        return chunking.merge_verdicts(results)
+
+    def _chunk_request(self, prompt: str, chunk: str, index: int, total: int, context: str = "") -> tuple:
+        """Prompt and text sent for chunk `index` of `total`."""
+        chunk_prompt = (
+            f"{prompt}\n\nLe document étant long, il est analysé en {total} parties. "
+            f"Voici la partie {index}/{total} : limite ton analyse à cette partie."
+        )
+        chunk_text = f"{chunk}\n\n{context}" if context else chunk
+        return chunk_prompt, chunk_text
+
+    def _needs_chunking(self, text: str) -> bool:
+        return extraction.estimate_tokens(text) > self.chunk_tokens
+
+    def _fiche_parts(self, fiche_text: str, contrat_text: str, hours: int = None) -> tuple:
+        """
+        Return (combined text, contract part, payslip part) for a fiche check.
+        The payslip part (with the declared hours) is the per-chunk context
+        when the contract has to be split.
+        """
+        contrat_part = f"Contrat de travail:\n{contrat_text}"
+        fiche_part = f"Fiche de paie:\n{fiche_text}"
+        if hours is not None:
+            fiche_part += f"\n\nNombre d'heures travaillées déclarées: {hours}"
+        return f"{contrat_part}\n\n{fiche_part}", contrat_part, fiche_part
+
     # ------------------------
     # MODULE 1 — CONTRAT
     # ------------------------
-    def analyse_contract(self, file: str, prompt: str) -> dict:
+    def analyse_contract(self, file: str, prompt: str, use_cache: bool = True,
+                         on_text: Optional[Callable[[str], None]] = None) -> dict:
         """
-        Analyse a single contract file using OpenAI.
+        Analyse a single contract file using OpenAI. `on_text` follows the
+        answer as it is generated (documents analysed in chunks are not
+        streamed: their verdict only exists once the chunks are merged).
         """
-        text = self._read_file(file)
-        ai_result = self._analyse_text(prompt, text)
+        # Not cut to the request budget: a long contract is chunked instead
+        text = self._read_file(file, max_tokens=self.document_tokens)
+        if self._needs_chunking(text):
+            ai_result = self._analyse_chunks(prompt, text, use_cache=use_cache)
+        else:
+            ai_result = self._analyse_text(prompt, text, use_cache=use_cache, on_text=on_text)
 
         report_file = self._generate_report_file(ai_result)
         return {
@@ -182,18 +289,18 @@ class OpenaiAnalyse:
     # ------------------------
     # MODULE 2 — FICHE DE PAIE
     # ------------------------
-    def analyse_fiche(self, fiche_file: str, contrat_file: str, prompt: str, hours: int = None) -> dict:
+    def analyse_fiche(self, fiche_file: str, contrat_file: str, prompt: str, hours: int = None,
+                      use_cache: bool = True, on_text: Optional[Callable[[str], None]] = None) -> dict:
         """
         Analyse a payslip and contract pair using OpenAI.
         """
-        fiche_text = self._read_file(fiche_file)
-        contrat_text = self._read_file(contrat_file)
+        # The payslip goes with every contract chunk, so it gets half of a request;
+        # the contract is chunked rather than cut
+        fiche_text = self._read_file(fiche_file, max_tokens=self.token_budget // 2)
+        contrat_text = self._read_file(contrat_file, max_tokens=self.document_tokens)
 
-        combined_text = f"Contrat de travail:\n{contrat_text}\n\nFiche de paie:\n{fiche_text}"
-        if hours is not None:
-            combined_text += f"\n\nNombre d'heures travaillées déclarées: {hours}"
-
-        ai_result = self._analyse_text(prompt, combined_text)
+        ai_result = self._analyse_fiche_texts(fiche_text, contrat_text, prompt, hours, use_cache=use_cache,
+                                              on_text=on_text)
         report_file = self._generate_report_file(ai_result)
 
         return {
@@ -201,3 +308,95 @@ class OpenaiAnalyse:
             "detail": ai_result.get("detail", ""),
             "report_file": report_file,
         }
+
+    def _analyse_fiche_texts(self, fiche_text: str, contrat_text: str, prompt: str, hours: int = None,
+                             use_cache: bool = True, on_text: Optional[Callable[[str], None]] = None) -> dict:
+        """Verdict for an already extracted payslip/contract pair (local rules, then the model)."""
+        verdict, prompt = self._precheck_fiche(fiche_text, contrat_text, prompt, hours)
+        if verdict is not None:
+            if on_text is not None:
+                on_text(verdict["detail"])
+            return verdict
+
+        combined_text, contrat_part, fiche_part = self._fiche_parts(fiche_text, contrat_text, hours)
+
+        if self._needs_chunking(combined_text):
+            # Split the contract only: every chunk is checked against the whole payslip
+            return self._analyse_chunks(prompt, contrat_part, use_cache=use_cache, context=fiche_part)
+        return self._analyse_text(prompt, combined_text, use_cache=use_cache, on_text=on_text)
+
+    def _precheck_fiche(self, fiche_text: str, contrat_text: str, prompt: str, hours: int = None) -> tuple:
+        """
+        Run the local payslip rules. Returns (verdict, prompt): `verdict` is
+        set when the arithmetic alone settles the check, and `prompt` carries
+        the findings so the model does not redo them.
+        """
+        if not self.payslip_precheck:
+            return None, prompt
+        report = payslip_rules.check_payslip(fiche_text, contrat_text, hours)
+        return report.verdict, report.prompt(prompt)
+
+    def _fiche_requests(self, fiche_text: str, contrat_text: str, prompt: str, hours: int = None) -> list:
+        """
+        Chat completion requests needed for a payslip/contract pair, without
+        sending them (one per contract chunk when it has to be split). The
+        Batch API keeps one answer per payslip, so the local rules only
+        contribute their findings to the prompt here.
+        """
+        _, prompt = self._precheck_fiche(fiche_text, contrat_text, prompt, hours)
+        combined_text, contrat_part, fiche_part = self._fiche_parts(fiche_text, contrat_text, hours)
+        if not self._needs_chunking(combined_text):
+            return [self._build_request(prompt, combined_text)]
+
+        chunks = chunking.chunk_text(contrat_part, self.chunk_tokens)
+        return [
+            self._build_request(*self._chunk_request(prompt, chunk, index, len(chunks), fiche_part))
+            for index, chunk in enumerate(chunks, start=1)
+        ]
+
+    def _verdict_from_messages(self, messages: list) -> dict:
+        """Verdict from the answers to the requests of `_fiche_requests`."""
+        results = [self._parse_message(m) for m in messages]
+        return results[0] if len(results) == 1 else chunking.merge_verdicts(results)
+
+    # ------------------------
+    # MODULE 3 — LOT DE FICHES DE PAIE
+    # ------------------------
+    def analyse_batch(self, contrat_file: str, fiche_files: list, prompt: str, hours: int = None,
+                      max_in_flight: int = BATCH_IN_FLIGHT, progress=None, use_cache: bool = True) -> list:
+        """
+        Analyse many payslips against one contract.
+
+        The contract is extracted once; payslips are processed concurrently
+        with at most `max_in_flight` in progress. `progress(done, total)` is
+        called from the calling thread after each payslip. A failing payslip
+        does not stop the batch: every item of the returned list (in input
+        order) has a "status" of "ok" (with result/detail/report_file) or
+        "error" (with the error message).
+        """
+        contrat_text = self._read_file(contrat_file, max_tokens=self.document_tokens)
+
+        def analyse_one(fiche_file):
+            fiche_text = self._read_file(fiche_file, max_tokens=self.token_budget // 2)
+            ai_result = self._analyse_fiche_texts(fiche_text, contrat_text, prompt, hours, use_cache=use_cache)
+            return {
+                "fiche_file": fiche_file,
+                "status": "ok",
+                "result": ai_result.get("result", "Non conforme"),
+                "detail": ai_result.get("detail", ""),
+                "report_file": self._generate_report_file(ai_result),
+            }
+
+        results = [None] * len(fiche_files)
+        with ThreadPoolExecutor(max_workers=max(1, max_in_flight)) as pool:
+            futures = {pool.submit(analyse_one, f): i for i, f in enumerate(fiche_files)}
+            for done, future in enumerate(as_completed(futures), start=1):
+                index = futures[future]
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    results[index] = {"fiche_file": fiche_files[index], "status": "error", "error": str(e)}
+                if progress is not None:
+                    progress(done, len(fiche_files))
+
+        return results
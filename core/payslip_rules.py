@@ -0,0 +1,280 @@
+from dataclasses import dataclass, field
+import os
+import re
+from typing import Callable, List, Optional
+
+# Run the local payslip checks before asking the model
+PAYSLIP_PRECHECK = os.getenv("PAYSLIP_PRECHECK", "1") == "1"
+# Gross hourly minimum wage (SMIC) in euros
+SMIC_HOURLY = float(os.getenv("SMIC_HOURLY", 11.88))
+# Usual net/gross range; outside of it the model is asked to look closer
+NET_RATIO_MIN = float(os.getenv("PAYSLIP_NET_RATIO_MIN", 0.60))
+NET_RATIO_MAX = float(os.getenv("PAYSLIP_NET_RATIO_MAX", 0.90))
+# Paid hours may differ from the declared hours by this much (rounding of 151,67 h...)
+HOURS_TOLERANCE = float(os.getenv("PAYSLIP_HOURS_TOLERANCE", 1))
+# Weeks per month, to compare weekly declared hours with monthly paid hours
+WEEKS_PER_MONTH = 52 / 12
+
+ANOMALY = "anomaly"
+WARNING = "warning"
+OK = "ok"
+SEVERITY_LABELS = {ANOMALY: "Anomalie", WARNING: "À vérifier", OK: "Vérifié"}
+
+# French amounts: "1 801,84", "1.801,84", "151,67", "11.88". A thousands
+# group is one separator and exactly three digits.
+AMOUNT_RE = re.compile(r"\d{1,3}(?:[ \u00a0\u202f.]\d{3}(?!\d))+(?:,\d+)?|\d+(?:[.,]\d+)?")
+# Hours and rates never reach a thousand: no grouping, so the columns of
+# "35 151,67" stay apart. Percentages ("25 %") are skipped.
+QUANTITY_RE = re.compile(r"\d+(?:[.,]\d+)?(?![\d.,]|\s*%)")
+BASE_RE = re.compile(r"salaire\s+de\s+base", re.IGNORECASE)
+GROSS_RE = re.compile(r"(?:salaire|total|r[ée]mun[ée]ration)\s+brut", re.IGNORECASE)
+NET_RE = re.compile(r"net\s+[àa]\s+payer|net\s+pay[ée]", re.IGNORECASE)
+RATE_RE = re.compile(r"taux\s+horaire", re.IGNORECASE)
+HOURS_RE = re.compile(r"heures\s+(?:travaill[ée]es|pay[ée]es|r[ée]mun[ée]r[ée]es)|horaire\s+mensuel"
+                      r"|(?:nombre|nb)\s+d['’]heures", re.IGNORECASE)
+OVERTIME_RE = re.compile(r"heures\s+(?:suppl[ée]mentaires|compl[ée]mentaires|sup\b)|\bh\.?\s*sup\b|\bHS\b",
+                         re.IGNORECASE)
+# Contracts paid a percentage of the SMIC
+REDUCED_MINIMUM_RE = re.compile(r"apprenti|contrat\s+de\s+professionnalisation", re.IGNORECASE)
+
+
+def parse_number(token: str) -> float:
+    token = re.sub(r"[ \u00a0\u202f]", "", token)
+    if "," in token:
+        token = token.replace(".", "").replace(",", ".")
+    elif re.fullmatch(r"\d{1,3}(?:\.\d{3})+", token):
+        token = token.replace(".", "")
+    return float(token)
+
+
+def _line_rests(text: str, label: re.Pattern):
+    """Rest of every line labelled `label`, after the label."""
+    for match in label.finditer(text):
+        end = text.find("\n", match.end())
+        yield text[match.end():end if end != -1 else len(text)]
+
+
+def _numbers(rest: str, pattern: re.Pattern = AMOUNT_RE) -> List[float]:
+    return [parse_number(token) for token in pattern.findall(rest)]
+
+
+def _first_number(text: str, label: re.Pattern, pattern: re.Pattern = AMOUNT_RE) -> Optional[float]:
+    """
+    First number of the first line labelled `label` that has any: the
+    current period column, before the year-to-date (cumul) one.
+    """
+    for rest in _line_rests(text, label):
+        numbers = _numbers(rest, pattern)
+        if numbers:
+            return numbers[0]
+    return None
+
+
+def _close(a: float, b: float) -> bool:
+    return abs(a - b) <= max(1.0, 0.01 * abs(b))
+
+
+def _fmt(value: float) -> str:
+    return f"{value:,.2f}".replace(",", " ").replace(".", ",")
+
+
+@dataclass
+class PayslipFigures:
+    """Figures read from the payslip text; None when not found."""
+    gross: Optional[float] = None
+    net: Optional[float] = None
+    base_hours: Optional[float] = None
+    base_rate: Optional[float] = None
+    base_amount: Optional[float] = None
+    hourly_rate: Optional[float] = None
+    hours: Optional[float] = None
+    overtime_hours: float = 0.0
+
+    @classmethod
+    def parse(cls, text: str) -> "PayslipFigures":
+        figures = cls()
+        figures._parse_base(text)
+
+        figures.gross = _first_number(text, GROSS_RE)
+        figures.net = _first_number(text, NET_RE)
+        rate = _first_number(text, RATE_RE, QUANTITY_RE)
+        hours = _first_number(text, HOURS_RE, QUANTITY_RE)
+        # The base line only stands in for the rate and hours when it adds up
+        consistent = figures.base_rate is not None and _close(figures.base_hours * figures.base_rate,
+                                                               figures.base_amount)
+        figures.hourly_rate = rate if rate is not None else figures.base_rate if consistent else None
+        figures.hours = figures.base_hours if consistent else hours
+        # "Heures supplémentaires 25 % <base> <taux> <montant>": the hours come first
+        for rest in _line_rests(text, OVERTIME_RE):
+            quantities = _numbers(rest, QUANTITY_RE)
+            if quantities:
+                figures.overtime_hours += quantities[0]
+        return figures
+
+    def _parse_base(self, text: str) -> None:
+        """
+        "Salaire de base  <base> <taux> <montant> [<cumul>]": the first
+        hours and rate whose product is the amount that follows them.
+        """
+        for rest in _line_rests(text, BASE_RE):
+            quantities = list(QUANTITY_RE.finditer(rest))
+            if not quantities:
+                continue
+            triples = []
+            for hours, rate in zip(quantities, quantities[1:]):
+                amounts = _numbers(rest[rate.end():])
+                if amounts:
+                    triples.append((parse_number(hours.group()), parse_number(rate.group()), amounts[0]))
+            for triple in triples:
+                if _close(triple[0] * triple[1], triple[2]):
+                    self.base_hours, self.base_rate, self.base_amount = triple
+                    return
+            if triples:
+                # Left to check_base_amount to report
+                self.base_hours, self.base_rate, self.base_amount = triples[0]
+            else:
+                self.base_amount = _numbers(rest)[0]
+            return
+
+
+@dataclass
+class Finding:
+    rule: str
+    severity: str
+    message: str
+
+
+@dataclass
+class RuleContext:
+    declared_hours: Optional[float] = None
+    smic_hourly: float = SMIC_HOURLY
+    # Apprentices and professionalisation contracts may be paid below the SMIC
+    reduced_minimum: bool = False
+
+
+def check_net_below_gross(figures: PayslipFigures, context: RuleContext) -> Optional[Finding]:
+    if figures.gross is None or figures.net is None:
+        return None
+    if figures.net > figures.gross:
+        # As likely a label the parser matched on the wrong line: a hint for the model
+        return Finding("net_brut", WARNING, f"Le net à payer ({_fmt(figures.net)} €) semble supérieur "
+                                            f"au salaire brut ({_fmt(figures.gross)} €).")
+    return Finding("net_brut", OK, "Net à payer inférieur au salaire brut.")
+
+
+def check_net_ratio(figures: PayslipFigures, context: RuleContext) -> Optional[Finding]:
+    if not figures.gross or figures.net is None or figures.net > figures.gross:
+        return None
+    ratio = figures.net / figures.gross
+    if not NET_RATIO_MIN <= ratio <= NET_RATIO_MAX:
+        return Finding("ratio_net_brut", WARNING,
+                       f"Le net représente {ratio:.0%} du brut, hors de la fourchette habituelle "
+                       f"({NET_RATIO_MIN:.0%} - {NET_RATIO_MAX:.0%}) : vérifier les cotisations et retenues.")
+    return Finding("ratio_net_brut", OK, f"Rapport net/brut de {ratio:.0%}.")
+
+
+def check_minimum_wage(figures: PayslipFigures, context: RuleContext) -> Optional[Finding]:
+    # Only an explicit rate (its own line, or a base line that adds up) is compared
+    rate = figures.hourly_rate
+    if rate is None:
+        return None
+    if rate < context.smic_hourly - 0.005:
+        message = f"Le taux horaire ({_fmt(rate)} €) est inférieur au SMIC ({_fmt(context.smic_hourly)} €)."
+        if context.reduced_minimum:
+            return Finding("smic", WARNING, message + " Le contrat semble ouvrir droit à un salaire minimum "
+                                                      "réduit (apprentissage / professionnalisation).")
+        return Finding("smic", ANOMALY, message)
+    return Finding("smic", OK, f"Taux horaire de {_fmt(rate)} € au moins égal au SMIC.")
+
+
+def _hours_match(paid: float, declared: float) -> bool:
+    # The declared hours have no unit: monthly, or weekly like the contract
+    return any(abs(paid - hours) <= HOURS_TOLERANCE
+               for hours in (declared, declared * WEEKS_PER_MONTH, declared / WEEKS_PER_MONTH))
+
+
+def check_declared_hours(figures: PayslipFigures, context: RuleContext) -> Optional[Finding]:
+    if figures.hours is None or context.declared_hours is None:
+        return None
+    total = figures.hours + figures.overtime_hours
+    if _hours_match(figures.hours, context.declared_hours) or _hours_match(total, context.declared_hours):
+        return Finding("heures", OK, "Heures payées cohérentes avec les heures déclarées.")
+    paid = f"{_fmt(figures.hours)} h"
+    if figures.overtime_hours:
+        paid += f" et {_fmt(figures.overtime_hours)} h supplémentaires"
+    return Finding("heures", WARNING, f"La fiche rémunère {paid} pour {_fmt(context.declared_hours)} h "
+                                      f"déclarées : vérifier la période de référence des heures.")
+
+
+def check_base_amount(figures: PayslipFigures, context: RuleContext) -> Optional[Finding]:
+    if None in (figures.base_hours, figures.base_rate, figures.base_amount):
+        return None
+    expected = figures.base_hours * figures.base_rate
+    if not _close(expected, figures.base_amount):
+        # Usually a layout the parser misread rather than a wrong payslip: left to the model
+        return Finding("salaire_base", WARNING,
+                       f"Le salaire de base ({_fmt(figures.base_amount)} €) ne correspond pas à "
+                       f"{_fmt(figures.base_hours)} h × {_fmt(figures.base_rate)} € = {_fmt(expected)} €.")
+    return Finding("salaire_base", OK, "Salaire de base égal au taux horaire × heures.")
+
+
+RULES: List[Callable[[PayslipFigures, RuleContext], Optional[Finding]]] = [
+    check_net_below_gross,
+    check_net_ratio,
+    check_minimum_wage,
+    check_declared_hours,
+    check_base_amount,
+]
+
+
+@dataclass
+class PayslipReport:
+    figures: PayslipFigures
+    findings: List[Finding] = field(default_factory=list)
+
+    @property
+    def anomalies(self) -> List[Finding]:
+        return [f for f in self.findings if f.severity == ANOMALY]
+
+    @property
+    def verdict(self) -> Optional[dict]:
+        """
+        {"result", "detail"} when an unambiguous finding (an explicit hourly
+        rate below the SMIC) makes the payslip non conforme, None otherwise.
+        Findings that may come from a misread layout (hours, net/gross) are
+        only warnings, passed to the model by `prompt`. A clean payslip is
+        never declared conforme here: the comparison with the contract is
+        left to the model.
+        """
+        if not self.anomalies:
+            return None
+        lines = [f"- {f.message}" for f in self.anomalies]
+        lines += [f"- {SEVERITY_LABELS[WARNING]} : {f.message}" for f in self.findings if f.severity == WARNING]
+        detail = (
+            "## Contrôles automatiques de la fiche de paie\n\n"
+            "La fiche de paie présente des anomalies de calcul :\n\n" + "\n".join(lines)
+        )
+        return {"result": "Non conforme", "detail": detail}
+
+    def prompt(self, prompt: str) -> str:
+        """`prompt` with the findings, so the model does not redo the arithmetic."""
+        if not self.findings:
+            return prompt
+        lines = [f"- {SEVERITY_LABELS[f.severity]} : {f.message}" for f in self.findings]
+        return (
+            f"{prompt}\n\nContrôles arithmétiques déjà effectués sur la fiche de paie "
+            "(inutile de les refaire, tiens-en compte) :\n" + "\n".join(lines)
+        )
+
+
+def check_payslip(fiche_text: str, contrat_text: str = "", declared_hours: float = None,
+                  smic_hourly: float = SMIC_HOURLY) -> PayslipReport:
+    """Parse the payslip figures and run every rule of RULES."""
+    figures = PayslipFigures.parse(fiche_text)
+    context = RuleContext(
+        declared_hours=float(declared_hours) if declared_hours is not None else None,
+        smic_hourly=smic_hourly,
+        reduced_minimum=bool(REDUCED_MINIMUM_RE.search(contrat_text or "")),
+    )
+    findings = [finding for rule in RULES if (finding := rule(figures, context)) is not None]
+    return PayslipReport(figures=figures, findings=findings)
@@ -0,0 +1,120 @@
+from dataclasses import dataclass
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Stripe price of each module; modules without their own price use the default
+DEFAULT_PRICE_ID = os.getenv("STRIPE_PRICE_DEFAULT", "price_1SNWSaDlaxMT86N3tTdU28Be")
+MODULE_PRICE_IDS = {
+    "contrat": os.getenv("STRIPE_PRICE_CONTRAT", DEFAULT_PRICE_ID),
+    "fiche": os.getenv("STRIPE_PRICE_FICHE", DEFAULT_PRICE_ID),
+    "batch": os.getenv("STRIPE_PRICE_BATCH", DEFAULT_PRICE_ID),
+}
+# Prices are re-read from Stripe in the background after this many seconds
+PRICE_REFRESH_SECONDS = float(os.getenv("PRICE_REFRESH_SECONDS", 3600))
+
+
+class PriceUnavailable(Exception):
+    """Raised when neither the module's price nor the default price is active."""
+    pass
+
+
+@dataclass(frozen=True)
+class Price:
+    id: str
+    unit_amount: Optional[int]
+    currency: Optional[str]
+    active: bool = True
+
+
+class PriceCatalogue:
+    """
+    Stripe prices of the analysis modules, loaded once and refreshed by a
+    background thread every `ttl` seconds.
+
+    `line_items` only reads memory: checkout never waits on a Price
+    lookup. Until the first load completes (or if Stripe is unreachable)
+    the configured price ids are used as they are.
+    """
+
+    def __init__(self, stripe_factory: Callable, price_ids: Dict[str, str] = None,
+                 ttl: float = PRICE_REFRESH_SECONDS):
+        self.stripe_factory = stripe_factory
+        self.price_ids = dict(price_ids or MODULE_PRICE_IDS)
+        self.ttl = ttl
+        self.prices: Dict[str, Price] = {}
+        self.loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def refresh(self) -> List[str]:
+        """
+        Fetch every configured price and the default one (one call per
+        distinct price id). A price that fails to load keeps its previous
+        entry; returns the ids that failed.
+        """
+        stripe = self.stripe_factory()
+        price_ids = set(self.price_ids.values()) | {DEFAULT_PRICE_ID}
+        with self._lock:
+            prices = {price_id: price for price_id, price in self.prices.items() if price_id in price_ids}
+        failed = []
+        for price_id in sorted(price_ids):
+            try:
+                obj = stripe.Price.retrieve(price_id)
+            except Exception:
+                logger.warning("Failed to load Stripe price %s", price_id, exc_info=True)
+                failed.append(price_id)
+                continue
+            prices[price_id] = Price(id=obj.id, unit_amount=obj.unit_amount, currency=obj.currency,
+                                     active=bool(obj.active))
+        with self._lock:
+            self.prices = prices
+            self.loaded_at = time.time()
+        return failed
+
+    def start(self) -> None:
+        """Load the prices and keep them fresh from a daemon thread."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._refresh_loop, name="price-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _refresh_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                # retry sooner while some price could not be loaded
+                delay = min(self.ttl, 60) if self.refresh() else self.ttl
+            except Exception:
+                logger.exception("Failed to refresh the Stripe price catalogue")
+                delay = min(self.ttl, 60)
+            self._stop.wait(delay)
+
+    def price(self, module: str) -> Optional[Price]:
+        """Cached price of `module`, None until loaded."""
+        with self._lock:
+            return self.prices.get(self.price_ids.get(module, DEFAULT_PRICE_ID))
+
+    def line_items(self, module: str, quantity: int = 1) -> List[dict]:
+        """
+        Ready-made `line_items` for stripe.checkout.Session.create, from the
+        cached prices. A price archived in Stripe is replaced by the default
+        price; PriceUnavailable is raised when that one is inactive too.
+        """
+        price_id = self.price_ids.get(module, DEFAULT_PRICE_ID)
+        price = self.price(module)
+        if price is not None and not price.active:
+            with self._lock:
+                default = self.prices.get(DEFAULT_PRICE_ID)
+            if default is None or not default.active:
+                raise PriceUnavailable(f"Aucun tarif actif pour le module {module}.")
+            logger.warning("Stripe price %s of module %s is inactive, using the default price", price.id, module)
+            price = default
+        return [{"price": price.id if price is not None else price_id, "quantity": quantity}]
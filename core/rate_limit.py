@@ -0,0 +1,342 @@
+from abc import ABC, abstractmethod
+from pathlib import Path
+from contextlib import contextmanager
+import asyncio
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from core.extraction import estimate_tokens
+from core.text_cache import CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+# Organisation limits per model: (requests per minute, tokens per minute).
+# OPENAI_RPM / OPENAI_TPM override them for every model.
+MODEL_RATE_LIMITS = {
+    "gpt-4o-mini": (500, 200_000),
+    "gpt-4o": (500, 30_000),
+}
+DEFAULT_RATE_LIMITS = (500, 30_000)
+OPENAI_RPM = os.getenv("OPENAI_RPM")
+OPENAI_TPM = os.getenv("OPENAI_TPM")
+# "sqlite" (shared by every worker of the host), "memory" (per process) or "none"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "sqlite")
+# Completion tokens assumed when a request sets no max_tokens
+OUTPUT_TOKEN_ESTIMATE = int(os.getenv("OUTPUT_TOKEN_ESTIMATE", 1000))
+
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", 120))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", 5))
+RETRY_BASE = float(os.getenv("OPENAI_RETRY_BASE", 1.0))
+RETRY_CAP = float(os.getenv("OPENAI_RETRY_CAP", 60.0))
+
+# Adaptive concurrency (per process): calls in flight start at the initial
+# value, grow by one per window of successes and are halved on 429s or when
+# latency (per 1k estimated tokens) jumps above LATENCY_SPIKE x its moving
+# average.
+CONCURRENCY_INITIAL = int(os.getenv("OPENAI_CONCURRENCY", 8))
+CONCURRENCY_MIN = int(os.getenv("OPENAI_CONCURRENCY_MIN", 1))
+CONCURRENCY_MAX = int(os.getenv("OPENAI_CONCURRENCY_MAX", 32))
+LATENCY_SPIKE = float(os.getenv("OPENAI_LATENCY_SPIKE", 3.0))
+
+# (key, amount, capacity, refill per second)
+BucketRequest = Tuple[str, float, float, float]
+
+
+def limits_for(model: str) -> Tuple[int, int]:
+    rpm, tpm = MODEL_RATE_LIMITS.get(model, DEFAULT_RATE_LIMITS)
+    return int(OPENAI_RPM or rpm), int(OPENAI_TPM or tpm)
+
+
+def estimate_request_tokens(request: dict) -> int:
+    """Prompt estimate plus the completion budget of a chat request."""
+    prompt = sum(estimate_tokens(m.get("content") or "") for m in request.get("messages", []))
+    return prompt + int(request.get("max_tokens") or OUTPUT_TOKEN_ESTIMATE)
+
+
+def _take(state: Dict[str, Tuple[float, float]], requests: List[BucketRequest], now: float) -> float:
+    """
+    Refill the buckets in `state` ({key: (tokens, updated_at)}) and take
+    every amount if all are available. Returns 0 when granted, otherwise the
+    seconds until the scarcest bucket holds enough (nothing is taken).
+    """
+    levels = {}
+    wait = 0.0
+    for key, amount, capacity, rate in requests:
+        tokens, updated_at = state.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated_at) * rate)
+        amount = min(amount, capacity)
+        if tokens < amount:
+            wait = max(wait, (amount - tokens) / rate)
+        levels[key] = (tokens, amount)
+
+    for key, (tokens, amount) in levels.items():
+        state[key] = (tokens - amount if wait == 0 else tokens, now)
+    return wait
+
+
+class BucketBackend(ABC):
+    """Storage of the token buckets used by RateLimiter."""
+
+    @abstractmethod
+    def take(self, requests: List[BucketRequest]) -> float:
+        """Atomically take from every bucket; 0 if granted, else seconds to wait."""
+
+
+class MemoryBucketBackend(BucketBackend):
+    """Buckets local to this process."""
+
+    def __init__(self):
+        self._state = {}
+        self._lock = threading.Lock()
+
+    def take(self, requests):
+        with self._lock:
+            return _take(self._state, requests, time.time())
+
+
+class SQLiteBucketBackend(BucketBackend):
+    """
+    Default backend: buckets in a local SQLite file, so every worker process
+    of the host draws from the same budget. BEGIN IMMEDIATE holds the file
+    write lock for the read-refill-write of one acquisition.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path) if path else CACHE_DIR / "rate-limit.sqlite3"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS buckets (
+                    key TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+        finally:
+            conn.close()
+
+    def take(self, requests):
+        keys = [r[0] for r in requests]
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                placeholders = ",".join("?" * len(keys))
+                state = {
+                    key: (tokens, updated_at)
+                    for key, tokens, updated_at in conn.execute(
+                        f"SELECT key, tokens, updated_at FROM buckets WHERE key IN ({placeholders})", keys
+                    )
+                }
+                wait = _take(state, requests, time.time())
+                conn.executemany(
+                    "INSERT OR REPLACE INTO buckets (key, tokens, updated_at) VALUES (?, ?, ?)",
+                    [(key, *state[key]) for key in keys],
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return wait
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter keyed by model: each call takes one request from
+    the model's RPM bucket and its estimated tokens from the TPM bucket.
+    """
+
+    def __init__(self, backend: BucketBackend):
+        self.backend = backend
+
+    @staticmethod
+    def _requests(model: str, tokens: int) -> List[BucketRequest]:
+        rpm, tpm = limits_for(model)
+        return [
+            (f"{model}:requests", 1, rpm, rpm / 60),
+            (f"{model}:tokens", tokens, tpm, tpm / 60),
+        ]
+
+    def acquire(self, model: str, tokens: int) -> float:
+        """Block until the budget allows the call; returns the time waited."""
+        waited = 0.0
+        while True:
+            wait = self.backend.take(self._requests(model, tokens))
+            if wait == 0:
+                return waited
+            wait += random.uniform(0, wait * 0.1)  # spread out workers waking together
+            time.sleep(wait)
+            waited += wait
+
+    async def acquire_async(self, model: str, tokens: int) -> float:
+        waited = 0.0
+        while True:
+            wait = await asyncio.to_thread(self.backend.take, self._requests(model, tokens))
+            if wait == 0:
+                return waited
+            wait += random.uniform(0, wait * 0.1)
+            await asyncio.sleep(wait)
+            waited += wait
+
+
+class AdaptiveConcurrency:
+    """AIMD limit on the calls in flight in this process."""
+
+    def __init__(self, initial: int = CONCURRENCY_INITIAL, minimum: int = CONCURRENCY_MIN,
+                 maximum: int = CONCURRENCY_MAX, latency_spike: float = LATENCY_SPIKE):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_spike = latency_spike
+        self.in_flight = 0
+        self.latency = None  # moving average, seconds
+        self._cond = threading.Condition()
+
+    def try_acquire(self) -> bool:
+        with self._cond:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    async def acquire_async(self) -> None:
+        while not self.try_acquire():
+            await asyncio.sleep(0.05)
+
+    def release(self, latency: Optional[float] = None, overloaded: bool = False) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            if latency is not None and self.latency is not None and latency > self.latency * self.latency_spike:
+                overloaded = True
+            if latency is not None:
+                self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+
+            if overloaded:
+                self.limit = max(self.minimum, self.limit / 2)
+                logger.info("OpenAI concurrency reduced to %d", int(self.limit))
+            elif latency is not None:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+def _is_rate_limit(exc: BaseException) -> bool:
+    import openai
+    return isinstance(exc, openai.RateLimitError)
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    import openai
+    return isinstance(exc, (openai.RateLimitError, openai.APITimeoutError,
+                            openai.APIConnectionError, openai.InternalServerError))
+
+
+def _retry_delay(exc: BaseException, attempt: int) -> float:
+    """Full-jitter exponential backoff, or the server's Retry-After when given."""
+    response = getattr(exc, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(retry_after) + random.uniform(0, 1)
+    except (TypeError, ValueError):
+        return random.uniform(0, min(RETRY_CAP, RETRY_BASE * 2 ** attempt))
+
+
+class CallPolicy:
+    """
+    Wraps an OpenAI call with the shared rate limiter, the adaptive
+    concurrency limit and jittered retries of 429, timeout, connection and
+    5xx errors (the SDK's own retries are disabled, see `client_options`).
+    """
+
+    def __init__(self, limiter: Optional[RateLimiter], concurrency: AdaptiveConcurrency,
+                 max_retries: int = OPENAI_MAX_RETRIES):
+        self.limiter = limiter
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+
+    def call(self, request: dict, func: Callable):
+        tokens = estimate_request_tokens(request)
+        for attempt in range(self.max_retries + 1):
+            if self.limiter is not None:
+                self.limiter.acquire(request["model"], tokens)
+            self.concurrency.acquire()
+            started = time.monotonic()
+            try:
+                response = func()
+            except Exception as e:
+                self.concurrency.release(overloaded=_is_rate_limit(e))
+                if attempt == self.max_retries or not _is_retryable(e):
+                    raise
+                delay = _retry_delay(e, attempt)
+                logger.warning("OpenAI call failed (%s), retry %d in %.1fs", type(e).__name__, attempt + 1, delay)
+                time.sleep(delay)
+                continue
+            elapsed = time.monotonic() - started
+            self.concurrency.release(latency=elapsed * 1000 / max(tokens, 1))
+            return response
+
+    async def call_async(self, request: dict, func: Callable[[], Awaitable]):
+        tokens = estimate_request_tokens(request)
+        for attempt in range(self.max_retries + 1):
+            if self.limiter is not None:
+                await self.limiter.acquire_async(request["model"], tokens)
+            await self.concurrency.acquire_async()
+            started = time.monotonic()
+            try:
+                response = await func()
+            except Exception as e:
+                self.concurrency.release(overloaded=_is_rate_limit(e))
+                if attempt == self.max_retries or not _is_retryable(e):
+                    raise
+                delay = _retry_delay(e, attempt)
+                logger.warning("OpenAI call failed (%s), retry %d in %.1fs", type(e).__name__, attempt + 1, delay)
+                await asyncio.sleep(delay)
+                continue
+            elapsed = time.monotonic() - started
+            self.concurrency.release(latency=elapsed * 1000 / max(tokens, 1))
+            return response
+
+
+def client_options() -> dict:
+    """OpenAI client settings: bounded requests, retries left to CallPolicy."""
+    return {"timeout": OPENAI_TIMEOUT, "max_retries": 0}
+
+
+def _make_backend() -> Optional[BucketBackend]:
+    if RATE_LIMIT_BACKEND == "none":
+        return None
+    if RATE_LIMIT_BACKEND == "memory":
+        return MemoryBucketBackend()
+    return SQLiteBucketBackend()
+
+
+_policy = None
+_policy_lock = threading.Lock()
+
+
+def get_call_policy() -> CallPolicy:
+    """The process-wide CallPolicy (one concurrency limit per process)."""
+    global _policy
+    with _policy_lock:
+        if _policy is None:
+            backend = _make_backend()
+            _policy = CallPolicy(RateLimiter(backend) if backend else None, AdaptiveConcurrency())
+        return _policy
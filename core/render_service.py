@@ -0,0 +1,159 @@
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+from core.extraction import pool_context
+from core.report import get_renderer
+
+logger = logging.getLogger(__name__)
+
+# 0 disables the pool: reports are then rendered in the calling thread
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", 2))
+# Reports queued or rendering at once; further submissions wait for a slot
+RENDER_MAX_PENDING = int(os.getenv("RENDER_MAX_PENDING", 32))
+RENDER_SUBMIT_TIMEOUT = float(os.getenv("RENDER_SUBMIT_TIMEOUT", 30))
+RENDER_JOB_TIMEOUT = float(os.getenv("RENDER_JOB_TIMEOUT", 120))
+
+
+class RenderBusy(Exception):
+    """Raised when no render slot frees up within the submit timeout."""
+    pass
+
+
+def _render_in_worker(analysis_result: dict) -> tuple:
+    """Runs in a pool process (markdown + ReportLab build); returns (pdf, started, finished)."""
+    started = time.time()
+    pdf = get_renderer().render_bytes(analysis_result)
+    return pdf, started, time.time()
+
+
+class RenderService:
+    """
+    Renders PDF reports in a dedicated process pool, so the CPU-bound
+    markdown conversion and `doc.build` do not hold the GIL of the web
+    worker.
+
+    At most `max_pending` reports are queued or in progress: `submit`
+    blocks up to `submit_timeout` for a slot and then raises RenderBusy
+    (back-pressure). Queue wait and render time of the last jobs are kept
+    for `stats()`.
+    """
+
+    def __init__(self, workers: int = RENDER_WORKERS, max_pending: int = RENDER_MAX_PENDING,
+                 submit_timeout: float = RENDER_SUBMIT_TIMEOUT, history: int = 1000):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.submit_timeout = submit_timeout
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._in_flight = 0
+        self._metrics_lock = threading.Lock()
+        self._timings = deque(maxlen=history)
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                # Not forked: get_renderer's lock may be held by another thread of this process
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=pool_context())
+            return self._executor
+
+    def submit(self, analysis_result: dict) -> Future:
+        """Queue a report; the future resolves to the PDF bytes."""
+        if not self._slots.acquire(timeout=self.submit_timeout):
+            with self._metrics_lock:
+                self.rejected += 1
+            raise RenderBusy(f"{self.max_pending} reports already pending")
+
+        submitted = time.time()
+        with self._metrics_lock:
+            self._in_flight += 1
+
+        result = Future()
+        try:
+            inner = self._get_executor().submit(_render_in_worker, analysis_result)
+        except Exception:
+            self._done(None)
+            raise
+
+        def on_done(inner_future):
+            try:
+                pdf, started, finished = inner_future.result()
+            except BaseException as e:
+                self._done(None)
+                result.set_exception(e)
+                return
+            self._done((started - submitted, finished - started))
+            logger.debug("Report rendered: waited %.3fs, rendered in %.3fs",
+                         started - submitted, finished - started)
+            result.set_result(pdf)
+
+        inner.add_done_callback(on_done)
+        return result
+
+    def _done(self, timing: Optional[tuple]) -> None:
+        self._slots.release()
+        with self._metrics_lock:
+            self._in_flight -= 1
+            if timing is None:
+                self.failed += 1
+            else:
+                self.completed += 1
+                self._timings.append(timing)
+
+    def render(self, analysis_result: dict, timeout: float = RENDER_JOB_TIMEOUT) -> bytes:
+        """Render a report in the pool and wait for the PDF bytes."""
+        return self.submit(analysis_result).result(timeout=timeout)
+
+    def stats(self) -> dict:
+        """Counters plus mean / p95 queue wait and render time in seconds."""
+        with self._metrics_lock:
+            timings = list(self._timings)
+            stats = {
+                "in_flight": self._in_flight,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+            }
+
+        for index, name in ((0, "queue_wait"), (1, "render")):
+            values = sorted(t[index] for t in timings)
+            stats[f"{name}_mean"] = sum(values) / len(values) if values else 0.0
+            stats[f"{name}_p95"] = values[min(len(values) - 1, int(len(values) * 0.95))] if values else 0.0
+        return stats
+
+    def shutdown(self) -> None:
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_render_service() -> Optional[RenderService]:
+    """The process-wide RenderService, or None when RENDER_WORKERS is 0."""
+    global _service
+    if RENDER_WORKERS <= 0:
+        return None
+    with _service_lock:
+        if _service is None:
+            _service = RenderService()
+        return _service
+
+
+def render_report(analysis_result: dict) -> bytes:
+    """Render through the pool when enabled, in the calling thread otherwise."""
+    service = get_render_service()
+    if service is None:
+        return get_renderer().render_bytes(analysis_result)
+    return service.render(analysis_result)
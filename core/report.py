@@ -0,0 +1,213 @@
+from pathlib import Path
+from datetime import datetime
+from io import BytesIO
+import os
+import threading
+from typing import BinaryIO, Optional, Union
+
+# markdown and ReportLab are imported by ReportRenderer on first use, so
+# importing this module (report cache, settings) stays cheap.
+BASE_DIR = Path(__file__).resolve().parent
+OUTPUT_DIR = BASE_DIR / "output-files"
+LOGO_PATH = BASE_DIR.parent / "static" / "images" / "logo-header.png"
+
+# "eager": render the PDF when the analysis finishes (default).
+# "lazy": only keep the structured result, the PDF is built on first download.
+REPORT_MODE = os.getenv("REPORT_MODE", "eager")
+
+# Bounds of the on-disk report cache (output-files/report_*.pdf)
+REPORT_CACHE_MAX_FILES = int(os.getenv("REPORT_CACHE_MAX_FILES", 5000))
+REPORT_CACHE_MAX_BYTES = int(os.getenv("REPORT_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+
+HEADER_STYLE = [
+    ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+    ("LEFTPADDING", (0, 0), (-1, -1), 0),
+    ("RIGHTPADDING", (0, 0), (-1, -1), 0),
+    ("BOTTOMPADDING", (0, 0), (-1, -1), 6),
+]
+
+
+class ReportRenderer:
+    """
+    Builds the PDF analysis reports.
+
+    The stylesheet, the logo bytes and the header flowables (logo + title
+    table) are prepared once and reused; only the result, details and
+    timestamp are built per report. Header flowables keep layout state, so
+    each thread gets its own copy.
+    """
+
+    def __init__(self, logo_path: Union[str, Path] = LOGO_PATH):
+        from reportlab.lib.styles import getSampleStyleSheet
+        from reportlab.platypus import TableStyle
+
+        self.styles = getSampleStyleSheet()
+        self.header_style = TableStyle(HEADER_STYLE)
+        try:
+            self._logo_bytes = Path(logo_path).read_bytes()
+        except OSError:
+            self._logo_bytes = None  # fallback to a spacer if image missing
+        self._local = threading.local()
+
+    def _header(self) -> list:
+        header = getattr(self._local, "header", None)
+        if header is None:
+            from reportlab.lib.units import cm
+            from reportlab.platypus import Image, Paragraph, Spacer, Table
+
+            if self._logo_bytes is not None:
+                # decoded on first draw, then kept by the flowable
+                logo = Image(BytesIO(self._logo_bytes), width=2.2*cm, height=2.2*cm)
+            else:
+                logo = Spacer(1, 2.2*cm)
+
+            # Title paragraph
+            title = Paragraph("<b>Rapport d’analyse - CheckTonContrat</b>", self.styles["Title"])
+
+            # Create a two-column layout: [logo | title]
+            header_table = Table(
+                [[logo, title]],
+                colWidths=[2.5*cm, None]  # left column fixed, right auto-expands
+            )
+            header_table.setStyle(self.header_style)
+
+            header = [header_table, Spacer(1, 0.5 * cm)]
+            self._local.header = header
+        return header
+
+    @staticmethod
+    def render_markdown(text: str) -> str:
+        if not text:
+            return ""
+        import markdown
+        return markdown.markdown(text, extensions=['fenced_code', 'tables'])
+
+    def render(self, analysis_result: dict, output: Union[str, Path, BinaryIO]) -> None:
+        """
+        Render the report of `analysis_result` into `output` (a path or a
+        binary file-like object). The PDF includes: title, result status,
+        detailed explanation, and timestamp.
+        """
+        from reportlab.lib import colors
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib.units import cm
+        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+
+        styles = self.styles
+
+        # Extract data safely
+        result_text = analysis_result.get("result", "Non conforme")
+        detail_text = self.render_markdown(analysis_result.get("detail", "Aucun détail fourni."))
+        timestamp = datetime.now().strftime("%d/%m/%Y à %H:%M")
+
+        # PDF document setup
+        target = str(output) if isinstance(output, (str, Path)) else output
+        doc = SimpleDocTemplate(target, pagesize=A4)
+        story = list(self._header())
+
+        # Result section
+        color = colors.green if "conforme" in result_text.lower() else colors.red
+        result_html = f"<font color='{color.hexval()}'><b>Résultat :</b> {result_text}</font>"
+        story.append(Paragraph(result_html, styles["Heading2"]))
+        story.append(Spacer(1, 0.3 * cm))
+
+        # Detail section
+        story.append(Paragraph("<b>Détails de l’analyse :</b>", styles["Heading3"]))
+        story.append(Paragraph(detail_text.replace("\n", "<br/>"), styles["BodyText"]))
+        story.append(Spacer(1, 0.5 * cm))
+
+        # Timestamp
+        story.append(Paragraph(f"<font size='9' color='gray'>Généré le {timestamp} par CheckTonContrat.fr</font>", styles["Normal"]))
+
+        # Build PDF
+        doc.build(story)
+
+    def render_bytes(self, analysis_result: dict) -> bytes:
+        """Render the report into memory and return the PDF bytes."""
+        buffer = BytesIO()
+        self.render(analysis_result, buffer)
+        return buffer.getvalue()
+
+
+class ReportCache:
+    """
+    Rendered reports on disk, bounded in file count and total size.
+
+    Reports can always be rebuilt from the Check they belong to, so the
+    least recently used files are simply deleted when a bound is exceeded;
+    `get` refreshes the access time of a file.
+    """
+
+    def __init__(self, directory: Path = OUTPUT_DIR, max_files: int = REPORT_CACHE_MAX_FILES,
+                 max_bytes: int = REPORT_CACHE_MAX_BYTES):
+        self.directory = Path(directory)
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def path(self, filename: str) -> Path:
+        return self.directory / Path(filename).name
+
+    def get(self, filename: str) -> Optional[Path]:
+        """Path of a cached report, or None if it is not (or no longer) on disk."""
+        path = self.path(filename)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, filename: str, data: bytes) -> Path:
+        """Atomically write a report then evict old ones above the bounds."""
+        path = self.path(filename)
+        tmp = path.with_suffix(".part")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        self.evict()
+        return path
+
+    def evict(self) -> None:
+        with self._lock:
+            entries = []
+            for path in self.directory.glob("report_*.pdf"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+            entries.sort()
+            count = len(entries)
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if count <= self.max_files and total <= self.max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                count -= 1
+                total -= size
+
+
+_renderer = None
+_renderer_lock = threading.Lock()
+
+
+def get_renderer() -> ReportRenderer:
+    """The process-wide ReportRenderer, built on first use."""
+    global _renderer
+    with _renderer_lock:
+        if _renderer is None:
+            _renderer = ReportRenderer()
+        return _renderer
+
+
+_report_cache = None
+
+
+def get_report_cache() -> ReportCache:
+    """The process-wide ReportCache."""
+    global _report_cache
+    with _renderer_lock:
+        if _report_cache is None:
+            _report_cache = ReportCache()
+        return _report_cache
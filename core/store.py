@@ -0,0 +1,239 @@
+from pathlib import Path
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from typing import BinaryIO, Callable, Union
+
+# Uploads are stored once per content digest under input-files/blobs/,
+# user-facing names ({user_id}_{digest prefix}.ext) are aliases to the blob.
+BASE_DIR = Path(__file__).resolve().parent
+INPUT_DIR = BASE_DIR / "input-files"
+BLOB_DIR = INPUT_DIR / "blobs"
+
+HASH_ALGORITHM = "sha256"
+CHUNK_SIZE = 64 * 1024
+ALIAS_DIGEST_LENGTH = 16
+
+
+class StoreError(Exception):
+    """Raised when a blob cannot be written or an alias cannot be resolved."""
+    pass
+
+
+def _blob_path(digest: str, ext: str) -> Path:
+    """Return the sharded path of a blob: blobs/ab/abcdef....ext"""
+    return BLOB_DIR / digest[:2] / f"{digest}{ext}"
+
+
+def _alias_name(user_id: Union[int, str], digest: str, ext: str) -> str:
+    """Same user + same content always maps to the same alias."""
+    return f"{user_id}_{digest[:ALIAS_DIGEST_LENGTH]}{ext}"
+
+
+def write_blob(stream: BinaryIO, ext: str) -> str:
+    """
+    Stream `stream` to disk while hashing it and store it once by digest.
+
+    The content is written to a temporary file inside BLOB_DIR (same
+    filesystem, so the final rename is atomic). If a blob with the same
+    digest already exists the temporary file is simply discarded.
+
+    Returns
+    -------
+    str
+        The hex digest of the content.
+    """
+    BLOB_DIR.mkdir(parents=True, exist_ok=True)
+    hasher = hashlib.new(HASH_ALGORITHM)
+
+    fd, tmp_name = tempfile.mkstemp(dir=BLOB_DIR, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                tmp.write(chunk)
+
+        digest = hasher.hexdigest()
+        target = _blob_path(digest, ext)
+        if target.exists():
+            os.unlink(tmp_name)
+        else:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp_name, target)
+    except Exception as e:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+        raise StoreError(f"Failed to store blob: {e}") from e
+
+    return digest
+
+
+def _link(target: Path, alias_path: Path) -> None:
+    """
+    Create `alias_path` pointing at `target` (symlink, hardlink, then copy).
+    Raises FileExistsError if `alias_path` already exists: only the other
+    failures (links not supported...) fall back to the next method.
+    """
+    try:
+        alias_path.symlink_to(os.path.relpath(target, alias_path.parent))
+        return
+    except FileExistsError:
+        raise
+    except (OSError, NotImplementedError):
+        pass
+    try:
+        os.link(target, alias_path)
+        return
+    except FileExistsError:
+        raise
+    except OSError:
+        pass
+    # "xb" never overwrites an alias created in the meantime
+    with open(target, "rb") as src, open(alias_path, "xb") as dst:
+        shutil.copyfileobj(src, dst, CHUNK_SIZE)
+
+
+def link_alias(user_id: Union[int, str], digest: str, ext: str) -> str:
+    """Create (if needed) the per-user alias of a blob and return its filename."""
+    alias = _alias_name(user_id, digest, ext)
+    alias_path = INPUT_DIR / alias
+
+    if not alias_path.exists():
+        if alias_path.is_symlink():
+            alias_path.unlink()  # dangling link to a removed blob
+        try:
+            _link(_blob_path(digest, ext), alias_path)
+        except FileExistsError:
+            pass  # a concurrent upload of the same content already linked it
+
+    return alias
+
+
+def put(stream: BinaryIO, user_id: Union[int, str], ext: str) -> str:
+    """Store the content of `stream` and return the user's alias filename."""
+    digest = write_blob(stream, ext)
+    return link_alias(user_id, digest, ext)
+
+
+def resolve(filename: str) -> Path:
+    """
+    Resolve a filename stored in `Check.input_files` to a readable path.
+    Works for store aliases as well as legacy {user_id}_{token}.ext files.
+    """
+    safe_name = Path(filename).name
+    path = INPUT_DIR / safe_name
+    if not path.exists():
+        raise FileNotFoundError(f"File not found: {path}")
+    return path
+
+
+def digest_for(filename: str) -> str:
+    """
+    Return the content digest of a stored file. For symlinked aliases the
+    digest is read from the blob name; other files are hashed.
+    """
+    path = resolve(filename)
+    if path.is_symlink():
+        return Path(os.readlink(path)).stem
+    return file_digest(path)
+
+
+def file_digest(path: Union[str, Path]) -> str:
+    """Hash a file on disk in chunks."""
+    hasher = hashlib.new(HASH_ALGORITHM)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def migrate_legacy_files() -> int:
+    """
+    Move regular files of INPUT_DIR into the blob store and replace them by
+    aliases under their original name, so existing `Check.input_files`
+    values keep resolving. Returns the number of files migrated.
+    """
+    migrated = 0
+    if not INPUT_DIR.exists():
+        return migrated
+    for path in INPUT_DIR.iterdir():
+        if not path.is_file() or path.is_symlink() or path.name.endswith(".migrating"):
+            continue
+        if path.stat().st_nlink > 1:
+            continue  # already a hardlinked alias
+        ext = path.suffix.lower()
+        with open(path, "rb") as f:
+            digest = write_blob(f, ext)
+        # The original name is replaced in one rename, never left missing
+        staged = path.with_name(path.name + ".migrating")
+        staged.unlink(missing_ok=True)
+        _link(_blob_path(digest, ext), staged)
+        os.replace(staged, path)
+        migrated += 1
+    return migrated
+
+
+def _batches(items: list, size: int = 500):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def cleanup(referenced_names: Callable[[list], set], referenced_digests: Callable[[list], set],
+            older_than: float = 24 * 3600, dry_run: bool = False) -> dict:
+    """
+    Delete aliases and blobs that no check refers to.
+
+    `referenced_names(names)` / `referenced_digests(digests)` return the
+    subset of their argument still in use (indexed lookups, called in
+    batches). Files modified less than `older_than` seconds ago are kept,
+    since an upload is only attached to a check once it has been paid for.
+    A blob stays while any remaining alias points at it.
+
+    Returns
+    -------
+    dict
+        {"aliases": n, "blobs": n} removed (or that would be removed).
+    """
+    cutoff = time.time() - older_than
+    removed = {"aliases": 0, "blobs": 0}
+    if not INPUT_DIR.exists():
+        return removed
+
+    def is_old(path: Path) -> bool:
+        return path.lstat().st_mtime < cutoff
+
+    aliases = [p for p in INPUT_DIR.iterdir() if (p.is_file() or p.is_symlink()) and is_old(p)]
+    unused = set()
+    for batch in _batches(aliases):
+        used = referenced_names([p.name for p in batch])
+        for path in batch:
+            if path.name in used:
+                continue
+            unused.add(path.name)
+            if not dry_run:
+                path.unlink(missing_ok=True)
+    removed["aliases"] = len(unused)
+
+    # digests still reachable through a remaining symlinked alias
+    kept_targets = {
+        Path(os.readlink(path)).stem
+        for path in INPUT_DIR.iterdir()
+        if path.is_symlink() and path.name not in unused
+    }
+
+    blobs = [p for p in BLOB_DIR.glob("*/*") if p.suffix != ".part" and is_old(p)] if BLOB_DIR.exists() else []
+    for batch in _batches(blobs):
+        used = referenced_digests([p.stem for p in batch])
+        for path in batch:
+            # hardlinked aliases share the inode with the blob
+            if path.stem in used or path.stem in kept_targets or path.stat().st_nlink > 1:
+                continue
+            removed["blobs"] += 1
+            if not dry_run:
+                path.unlink(missing_ok=True)
+    return removed
@@ -0,0 +1,151 @@
+from contextlib import contextmanager
+from functools import partial
+import json
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, Hashable, Optional
+
+# Longest a single SSE response stays open (the browser reconnects after it);
+# kept under gunicorn's 30 s worker timeout in case sync workers serve it
+STREAM_MAX_SECONDS = float(os.getenv("STREAM_MAX_SECONDS", 25))
+# Idle delay before the SSE endpoint looks at the database / sends a keepalive
+STREAM_POLL_SECONDS = float(os.getenv("STREAM_POLL_SECONDS", 2))
+# Streams without subscribers are forgotten after this many seconds
+STREAM_RETENTION = float(os.getenv("STREAM_RETENTION", 300))
+# The text generated so far is saved for other processes at most this often
+STREAM_PERSIST_SECONDS = float(os.getenv("STREAM_PERSIST_SECONDS", 1))
+
+
+def format_event(event: str, data) -> str:
+    """One Server-Sent Event, `data` JSON encoded so it fits on one line."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class _Stream:
+    __slots__ = ("text", "finished", "subscribers", "updated")
+
+    def __init__(self):
+        self.text = ""
+        self.finished = False
+        self.subscribers = []
+        self.updated = time.monotonic()
+
+
+class _Throttled:
+    """Publisher that also hands the text to `persist`, at most every `interval` seconds."""
+
+    def __init__(self, publish: Callable[[str], None], persist: Callable[[str], None], interval: float):
+        self.publish = publish
+        self.persist = persist
+        self.interval = interval
+        self._last = float("-inf")
+        self._lock = threading.Lock()
+
+    def __call__(self, text: str) -> None:
+        self.publish(text)
+        # Held while persisting, so the saved text never goes back to an older value
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last >= self.interval:
+                self._last = now
+                self.persist(text)
+
+
+class StreamHub:
+    """
+    In-process fan-out of the analysis text being generated, keyed by check id.
+
+    Producers publish the text generated so far; each subscriber (an SSE
+    response) reads (event, data) tuples from its queue: "delta" with the
+    new suffix, "reset" with the whole text (first message of a
+    subscription, or a retried request starting over) and finally "done".
+
+    Only analyses running in this process are visible here. Producers
+    given a `persist` callback also save the text (throttled) where every
+    process can read it: the SSE endpoint polls it from the job row when
+    the analysis runs in another web worker or a `flask run-jobs` process.
+    """
+
+    def __init__(self, retention: float = STREAM_RETENTION):
+        self.retention = retention
+        self._streams: Dict[Hashable, _Stream] = {}
+        self._lock = threading.Lock()
+
+    def publish(self, key: Hashable, text: str) -> None:
+        with self._lock:
+            stream = self._streams.setdefault(key, _Stream())
+            if text.startswith(stream.text):
+                if len(text) == len(stream.text):
+                    return
+                message = ("delta", text[len(stream.text):])
+            else:
+                message = ("reset", text)
+            stream.text = text
+            stream.finished = False
+            stream.updated = time.monotonic()
+            for subscriber in stream.subscribers:
+                subscriber.put(message)
+
+    def finish(self, key: Hashable) -> None:
+        with self._lock:
+            stream = self._streams.get(key)
+            if stream is None:
+                return
+            stream.finished = True
+            stream.updated = time.monotonic()
+            for subscriber in stream.subscribers:
+                subscriber.put(("done", ""))
+            self._prune()
+
+    @contextmanager
+    def producer(self, key: Hashable, persist: Optional[Callable[[str], None]] = None,
+                 persist_every: float = STREAM_PERSIST_SECONDS):
+        """
+        Publisher of `key` for the duration of the block. The stream is
+        finished when the block exits normally and cleared if it raises,
+        so a retried job streams from scratch. `persist(text)` is called
+        with the text at most every `persist_every` seconds.
+        """
+        publish = partial(self.publish, key)
+        if persist is not None:
+            publish = _Throttled(publish, persist, persist_every)
+        try:
+            yield publish
+        except BaseException:
+            self.publish(key, "")
+            with self._lock:
+                self._prune()
+            raise
+        self.finish(key)
+
+    def subscribe(self, key: Hashable) -> queue.Queue:
+        subscriber = queue.Queue()
+        with self._lock:
+            stream = self._streams.setdefault(key, _Stream())
+            if stream.text:
+                subscriber.put(("reset", stream.text))
+            if stream.finished:
+                subscriber.put(("done", ""))
+            stream.subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, key: Hashable, subscriber: queue.Queue) -> None:
+        with self._lock:
+            stream = self._streams.get(key)
+            if stream is not None and subscriber in stream.subscribers:
+                stream.subscribers.remove(subscriber)
+            self._prune()
+
+    def _prune(self) -> None:
+        """Drop unobserved streams that are empty or stale (lock held)."""
+        now = time.monotonic()
+        for key, stream in list(self._streams.items()):
+            if stream.subscribers:
+                continue
+            if not stream.text or now - stream.updated > self.retention:
+                del self._streams[key]
+
+
+stream_hub = StreamHub()
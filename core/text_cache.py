@@ -0,0 +1,125 @@
+from pathlib import Path
+from contextlib import contextmanager
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+# On-disk cache of extracted document text, keyed by content digest
+BASE_DIR = Path(__file__).resolve().parent
+CACHE_DIR = BASE_DIR / "cache-files"
+
+# Bump whenever the extraction logic changes so stale text is never served
+EXTRACTOR_VERSION = "1"
+
+DEFAULT_MAX_BYTES = int(os.getenv("TEXT_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+
+class TextCache:
+    """
+    SQLite-backed text cache with size-bounded LRU eviction.
+
+    Entries are keyed by (document digest, extractor version). Every hit
+    refreshes the entry's access time; when the total stored size exceeds
+    `max_bytes`, the least recently used entries are evicted.
+    """
+
+    def __init__(self, path: Optional[Path] = None, max_bytes: int = DEFAULT_MAX_BYTES,
+                 version: str = EXTRACTOR_VERSION):
+        self.path = Path(path) if path else CACHE_DIR / "text-cache.sqlite3"
+        self.max_bytes = max_bytes
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS texts (
+                    digest TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    PRIMARY KEY (digest, version)
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_texts_accessed ON texts (accessed_at)")
+
+    @contextmanager
+    def _connect(self):
+        """Open a connection, commit on success and always close it."""
+        conn = sqlite3.connect(str(self.path), timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, digest: str) -> Optional[str]:
+        """Return the cached text for `digest`, or None on a miss."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT text FROM texts WHERE digest = ? AND version = ?",
+                (digest, self.version),
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE texts SET accessed_at = ? WHERE digest = ? AND version = ?",
+                    (time.time(), digest, self.version),
+                )
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return row[0] if row is not None else None
+
+    def put(self, digest: str, text: str) -> None:
+        """Store `text` for `digest` and evict LRU entries above the size bound."""
+        size = len(text.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO texts (digest, version, text, size, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (digest, self.version, text, size, time.time()),
+            )
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM texts").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        rows = conn.execute("SELECT digest, version, size FROM texts ORDER BY accessed_at ASC")
+        doomed = []
+        for digest, version, size in rows:
+            if total <= self.max_bytes:
+                break
+            doomed.append((digest, version))
+            total -= size
+        conn.executemany("DELETE FROM texts WHERE digest = ? AND version = ?", doomed)
+
+    def clear(self) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM texts")
+
+    def stats(self) -> dict:
+        """Hit/miss counters of this process plus the on-disk footprint."""
+        with self._connect() as conn:
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM texts").fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+        }
@@ -1,8 +1,9 @@
 from pathlib import Path
 from werkzeug.utils import secure_filename
 from werkzeug.datastructures import FileStorage
-import secrets
-from typing import Union
+import zipfile
+from typing import List, Union
+from core import store
 
 # Directory where uploaded input files are stored (relative to project root)
 BASE_DIR = Path(__file__).resolve().parent
@@ -11,6 +12,14 @@ INPUT_DIR = BASE_DIR / "input-files"
 # Allowed extensions
 ALLOWED_EXTENSIONS = {".pdf", ".docx"}
 
+# Maximum number of payslips in one batch (files or zip entries)
+BATCH_MAX_FILES = 500
+# Zip archives are checked against these before anything is extracted:
+# entries of any kind, uncompressed size of one PDF and of the whole batch
+ZIP_MAX_ENTRIES = 2000
+ZIP_MAX_ENTRY_BYTES = 50 * 1024 * 1024
+ZIP_MAX_TOTAL_BYTES = 1024 * 1024 * 1024
+
 
 class UploadError(Exception):
     """Generic upload error for caller to catch and handle."""
@@ -28,16 +37,11 @@ def _allowed_extension(filename: str) -> bool:
     return ext in ALLOWED_EXTENSIONS
 
 
-def _generate_token(nbytes: int = 8) -> str:
-    """Generate a short URL-safe token."""
-    # token_urlsafe with ~nbytes*4/3 chars, 8 bytes => ~11 chars
-    return secrets.token_urlsafe(nbytes)
-
-
 def save_upload(file: Union[FileStorage, object], user_id: Union[int, str]) -> str:
     """
-    Save an uploaded file in the `core/input-files/` directory, renaming it to
-    {user_id}_{token}.{ext}.
+    Save an uploaded file through the content-addressed store: the content is
+    hashed while streaming to `core/input-files/blobs/` and the user gets an
+    alias named {user_id}_{digest prefix}.{ext} pointing at the blob.
 
     Parameters
     ----------
@@ -49,7 +53,7 @@ def save_upload(file: Union[FileStorage, object], user_id: Union[int, str]) -> s
     Returns
     -------
     str
-        The new filename (e.g. "42_Lk3j8K_a7.pdf") saved inside input-files/
+        The alias filename (e.g. "42_9f86d081884c7d65.pdf") inside input-files/
 
     Raises
     ------
@@ -74,19 +78,73 @@ def save_upload(file: Union[FileStorage, object], user_id: Union[int, str]) -> s
     secure_name = secure_filename(original_filename)
     ext = Path(secure_name).suffix.lower()
 
-    # Build new filename
-    token = _generate_token()
-    new_filename = f"{user_id}_{token}{ext}"
-
     # Ensure directory exists
     _ensure_input_dir()
 
-    target_path = INPUT_DIR / new_filename
-
     try:
-        # Save file (FileStorage.save handles streaming)
-        file.save(str(target_path))
+        # Hash while streaming and store once by digest
+        stream = getattr(file, "stream", file)
+        new_filename = store.put(stream, user_id, ext)
     except Exception as e:
         raise UploadError(f"Failed to save uploaded file: {e}") from e
 
-    return new_filename
\ No newline at end of file
+    return new_filename
+
+
+def _check_zip_sizes(archive: zipfile.ZipFile, entries: list, name: str) -> None:
+    """Refuse an archive whose declared content is too large (zip bombs)."""
+    if len(archive.infolist()) > ZIP_MAX_ENTRIES:
+        raise UploadError(f"Too many entries in {name}, {ZIP_MAX_ENTRIES} maximum.")
+    for info in entries:
+        if info.file_size > ZIP_MAX_ENTRY_BYTES:
+            raise UploadError(f"{info.filename} is too large once uncompressed.")
+    if sum(info.file_size for info in entries) > ZIP_MAX_TOTAL_BYTES:
+        raise UploadError(f"{name} is too large once uncompressed.")
+
+
+def save_batch_uploads(files: List[Union[FileStorage, object]], user_id: Union[int, str]) -> List[str]:
+    """
+    Save a multi-file batch of payslips. Each file may be a PDF or a zip
+    archive of PDFs (other zip entries are ignored).
+
+    Returns
+    -------
+    list[str]
+        The stored filenames, in upload order.
+
+    Raises
+    ------
+    UploadError
+        If no PDF is found, the batch is too large or a file is invalid.
+    """
+    filenames = []
+
+    for file in files or []:
+        original_filename = getattr(file, "filename", "") or ""
+        ext = Path(original_filename).suffix.lower()
+
+        if ext == ".zip":
+            try:
+                with zipfile.ZipFile(getattr(file, "stream", file)) as archive:
+                    entries = [info for info in archive.infolist()
+                               if not info.is_dir() and Path(info.filename).suffix.lower() == ".pdf"]
+                    _check_zip_sizes(archive, entries, original_filename)
+                    for info in entries:
+                        if len(filenames) >= BATCH_MAX_FILES:
+                            raise UploadError(f"Too many files, {BATCH_MAX_FILES} maximum per batch.")
+                        # Reads stop at info.file_size, checked above
+                        with archive.open(info) as entry:
+                            filenames.append(store.put(entry, user_id, ".pdf"))
+            except zipfile.BadZipFile as e:
+                raise UploadError(f"Invalid zip archive: {original_filename}") from e
+        elif ext == ".pdf":
+            if len(filenames) >= BATCH_MAX_FILES:
+                raise UploadError(f"Too many files, {BATCH_MAX_FILES} maximum per batch.")
+            filenames.append(save_upload(file, user_id))
+        else:
+            raise UploadError("Extension not allowed. Only PDF and ZIP are accepted.")
+
+    if not filenames:
+        raise UploadError("No PDF file found in the batch.")
+
+    return filenames
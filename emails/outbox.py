@@ -0,0 +1,257 @@
+from datetime import datetime, timedelta
+import hashlib
+import logging
+import os
+import random
+import smtplib
+import threading
+import time
+from typing import List, Optional
+
+from flask import current_app
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from emails.registry import MessageSkeleton, RenderedEmail
+from models.models import db, OutgoingEmail
+
+logger = logging.getLogger(__name__)
+
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") == "1"
+SMTP_USER = os.getenv("SMTP_USER", os.getenv("APP_MAIL"))
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", os.getenv("APP_MAIL_PASSWORD"))
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", 30))
+# An idle connection is closed after this many seconds
+SMTP_IDLE_TIMEOUT = float(os.getenv("SMTP_IDLE_TIMEOUT", 60))
+
+MAIL_FROM = os.getenv("APP_MAIL")
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", 6))
+MAIL_RETRY_BASE = float(os.getenv("MAIL_RETRY_BASE", 30))
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", 50))
+MAIL_POLL_INTERVAL = float(os.getenv("MAIL_POLL_INTERVAL", 5.0))
+# The same message (recipient, subject, body) enqueued again within this
+# window is dropped; explicit dedup keys never expire
+MAIL_DEDUP_WINDOW = timedelta(seconds=int(os.getenv("MAIL_DEDUP_WINDOW", 600)))
+# A message still "sending" after this delay is considered lost (crashed sender)
+MAIL_STALE_AFTER = timedelta(seconds=int(os.getenv("MAIL_STALE_AFTER", 10 * 60)))
+
+
+def content_key(recipient: str, subject: str, html: str, at: Optional[datetime] = None) -> str:
+    """
+    Dedup key of a message without an explicit one: its content and the
+    MAIL_DEDUP_WINDOW period it was enqueued in, so the same content can be
+    sent again once the window has passed.
+    """
+    digest = hashlib.sha256("\0".join((recipient, subject, html)).encode()).hexdigest()
+    period = int((at or datetime.now()).timestamp() // MAIL_DEDUP_WINDOW.total_seconds())
+    return f"sha256:{digest}@{period}"
+
+
+def build_message(email: OutgoingEmail, skeleton: MessageSkeleton) -> bytes:
+    return skeleton.build(email.recipient, email.subject, email.html, email.text)
+
+
+class SMTPSender:
+    """
+    One authenticated SMTP connection reused across messages; reconnects
+    when the server dropped it and closes it after SMTP_IDLE_TIMEOUT.
+    """
+
+    def __init__(self, host: str = SMTP_HOST, port: int = SMTP_PORT, starttls: bool = SMTP_STARTTLS,
+                 user: Optional[str] = SMTP_USER, password: Optional[str] = SMTP_PASSWORD):
+        self.host = host
+        self.port = port
+        self.starttls = starttls
+        self.user = user
+        self.password = password
+        self._server = None
+        self._last_used = 0.0
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.host, self.port, timeout=SMTP_TIMEOUT)
+        if self.starttls:
+            server.starttls()
+        if self.user and self.password:
+            server.login(self.user, self.password)
+        return server
+
+    def send(self, recipient: str, raw: bytes) -> None:
+        if self._server is not None and time.monotonic() - self._last_used > SMTP_IDLE_TIMEOUT:
+            self.close()
+        if self._server is None:
+            self._server = self._connect()
+        try:
+            self._server.sendmail(MAIL_FROM, [recipient], raw)
+        except smtplib.SMTPServerDisconnected:
+            # connection dropped between two messages: reconnect once
+            self._server = self._connect()
+            self._server.sendmail(MAIL_FROM, [recipient], raw)
+        self._last_used = time.monotonic()
+
+    def close(self) -> None:
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._server = None
+
+
+class Outbox:
+    """
+    Persisted mail queue backed by the `outgoing_emails` table.
+
+    `enqueue` only inserts a row, so requests and jobs never wait on SMTP.
+    A sender thread claims due messages in batches (atomic UPDATE, safe
+    across processes), delivers them over one reused connection and
+    reschedules failures with exponential backoff.
+    """
+
+    def __init__(self, app=None, poll_interval: float = MAIL_POLL_INTERVAL):
+        self.app = None
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._skeleton = MessageSkeleton(MAIL_FROM)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        self.app = app
+        app.extensions["outbox"] = self
+
+    def enqueue(self, recipient: str, message: RenderedEmail, dedup_key: Optional[str] = None) -> Optional[OutgoingEmail]:
+        """
+        Persist a rendered message (committing the current session) and wake
+        the sender. Returns None when it duplicates an earlier message.
+        """
+        subject, html, text = message
+        now = datetime.now()
+        key = dedup_key or content_key(recipient, subject, html, now)
+        previous_key = content_key(recipient, subject, html, now - MAIL_DEDUP_WINDOW) if dedup_key is None else None
+        if self._is_duplicate(key, previous_key):
+            logger.info("Skipping duplicate email %s to %s", key, recipient)
+            return None
+
+        # The caller's changes are committed on their own, so losing the
+        # race below only rolls back the message
+        db.session.commit()
+        email = OutgoingEmail(dedup_key=key, recipient=recipient, subject=subject, html=html, text=text)
+        db.session.add(email)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Enqueued concurrently by another request or process
+            db.session.rollback()
+            logger.info("Skipping duplicate email %s to %s", key, recipient)
+            return None
+        self._wakeup.set()
+        return email
+
+    def _is_duplicate(self, key: str, previous_key: Optional[str] = None) -> bool:
+        """Fast path before the insert; the unique dedup_key has the last word."""
+        condition = OutgoingEmail.dedup_key == key
+        if previous_key is not None:
+            # Content keys: the same message late in the previous period
+            condition = condition | ((OutgoingEmail.dedup_key == previous_key)
+                                     & (OutgoingEmail.created_at > datetime.now() - MAIL_DEDUP_WINDOW))
+        return db.session.execute(db.select(OutgoingEmail.id).where(condition).limit(1)).scalar() is not None
+
+    def start(self) -> None:
+        """Start the sender thread of this process."""
+        if self._thread is not None:
+            return
+        self._requeue_stale()
+        self._thread = threading.Thread(target=self._sender_loop, name="mail-sender", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wakeup.set()
+
+    def _requeue_stale(self) -> None:
+        with self.app.app_context():
+            db.session.execute(
+                update(OutgoingEmail)
+                .where(OutgoingEmail.status == "sending", OutgoingEmail.next_attempt_at < datetime.now() - MAIL_STALE_AFTER)
+                .values(status="pending")
+            )
+            db.session.commit()
+
+    def _sender_loop(self) -> None:
+        sender = SMTPSender()
+        try:
+            while not self._stop.is_set():
+                try:
+                    sent = self.send_due(sender)
+                except Exception:
+                    logger.exception("Mail sender failed")
+                    sent = 0
+
+                if not sent:
+                    self._wakeup.wait(self.poll_interval)
+                    self._wakeup.clear()
+        finally:
+            sender.close()
+
+    def _claim_due(self, limit: int) -> List[int]:
+        """Atomically move due pending messages to `sending` and return their ids."""
+        claimed = []
+        with self.app.app_context():
+            ids = db.session.scalars(
+                db.select(OutgoingEmail.id)
+                .where(OutgoingEmail.status == "pending", OutgoingEmail.next_attempt_at <= datetime.now())
+                .order_by(OutgoingEmail.next_attempt_at)
+                .limit(limit)
+            ).all()
+            for email_id in ids:
+                result = db.session.execute(
+                    update(OutgoingEmail)
+                    .where(OutgoingEmail.id == email_id, OutgoingEmail.status == "pending")
+                    .values(status="sending", next_attempt_at=datetime.now(), attempts=OutgoingEmail.attempts + 1)
+                )
+                if result.rowcount == 1:
+                    claimed.append(email_id)
+            db.session.commit()
+        return claimed
+
+    def send_due(self, sender: SMTPSender, limit: int = MAIL_BATCH_SIZE) -> int:
+        """Deliver one batch of due messages over `sender`; returns how many were claimed."""
+        ids = self._claim_due(limit)
+        with self.app.app_context():
+            for email_id in ids:
+                email = db.session.get(OutgoingEmail, email_id)
+                try:
+                    sender.send(email.recipient, build_message(email, self._skeleton))
+                except Exception as e:
+                    sender.close()
+                    logger.warning("Email %s to %s failed (attempt %s): %s", email_id, email.recipient, email.attempts, e)
+                    email.error = str(e)
+                    if email.attempts >= MAIL_MAX_ATTEMPTS:
+                        email.status = "failed"
+                    else:
+                        delay = MAIL_RETRY_BASE * 2 ** (email.attempts - 1)
+                        email.status = "pending"
+                        email.next_attempt_at = datetime.now() + timedelta(seconds=delay * random.uniform(0.8, 1.2))
+                else:
+                    email.status = "sent"
+                    email.error = None
+                    email.sent_at = datetime.now()
+                db.session.commit()
+        return len(ids)
+
+    def run_forever(self) -> None:
+        """Run the sender in the foreground (dedicated mail process)."""
+        self.start()
+        try:
+            self._thread.join()
+        except KeyboardInterrupt:
+            self.stop()
+
+
+def get_outbox() -> Outbox:
+    """Outbox of the current app (registered by `Outbox.init_app`)."""
+    return current_app.extensions["outbox"]
@@ -0,0 +1,114 @@
+from base64 import encodebytes
+from email.header import Header
+from email.utils import formatdate, make_msgid
+from pathlib import Path
+import secrets
+import threading
+from typing import NamedTuple, Optional
+
+from jinja2 import Environment, FileSystemLoader, StrictUndefined
+
+TEMPLATE_DIR = Path(__file__).resolve().parent / "templates"
+
+
+class RenderedEmail(NamedTuple):
+    subject: str
+    html: str
+    text: str
+
+
+class TemplateRegistry:
+    """
+    Email templates of emails/templates, compiled once.
+
+    Each `<name>.j2` file defines a `subject`, a `text` and an `html` block
+    (the html block is autoescaped); `render` runs the three compiled blocks
+    against one context.
+    """
+
+    def __init__(self, directory: Path = TEMPLATE_DIR):
+        self.env = Environment(
+            loader=FileSystemLoader(str(directory)),
+            undefined=StrictUndefined,
+            auto_reload=False,
+            keep_trailing_newline=False,
+        )
+        self.templates = {
+            path.stem: self.env.get_template(path.name)
+            for path in sorted(Path(directory).glob("*.j2"))
+        }
+
+    def render(self, name: str, **context) -> RenderedEmail:
+        template = self.templates[name]
+        ctx = template.new_context(context)
+
+        def block(block_name):
+            return "".join(template.blocks[block_name](ctx)).strip()
+
+        return RenderedEmail(block("subject"), block("html"), block("text"))
+
+
+class MessageSkeleton:
+    """
+    Prebuilt multipart/alternative layout for one sender.
+
+    The constant headers, boundary and part headers are assembled once; a
+    message only adds its Subject/To/Date/Message-ID and the base64 bodies
+    (base64 lines never start with "--", so one boundary fits every message).
+    """
+
+    def __init__(self, sender: Optional[str], domain: Optional[str] = None):
+        self.sender = sender or ""
+        self.domain = domain or (self.sender.rpartition("@")[2] or "localhost")
+        boundary = f"==={secrets.token_hex(12)}=="
+        self._head = (
+            f"From: {self.sender}\r\n"
+            "MIME-Version: 1.0\r\n"
+            f'Content-Type: multipart/alternative; boundary="{boundary}"\r\n'
+        )
+        part = '--{b}\r\nContent-Type: text/{kind}; charset="utf-8"\r\nContent-Transfer-Encoding: base64\r\n\r\n'
+        self._text_part = part.format(b=boundary, kind="plain")
+        self._html_part = part.format(b=boundary, kind="html")
+        self._end = f"--{boundary}--\r\n"
+
+    @staticmethod
+    def _header(value: str) -> str:
+        if value.isascii():
+            return value
+        return Header(value, "utf-8").encode(linesep="\r\n")
+
+    @staticmethod
+    def _body(value: str) -> str:
+        return encodebytes(value.encode("utf-8")).decode("ascii").replace("\n", "\r\n")
+
+    def build(self, recipient: str, subject: str, html: str, text: Optional[str] = None) -> bytes:
+        """Raw RFC 5322 message, ready for `smtplib.SMTP.sendmail`."""
+        parts = [
+            self._head,
+            f"To: {recipient}\r\n",
+            f"Subject: {self._header(subject)}\r\n",
+            f"Date: {formatdate(localtime=True)}\r\n",
+            f"Message-ID: {make_msgid(domain=self.domain)}\r\n",
+            "\r\n",
+        ]
+        if text:
+            parts += [self._text_part, self._body(text)]
+        parts += [self._html_part, self._body(html), self._end]
+        return "".join(parts).encode("ascii")
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> TemplateRegistry:
+    """The process-wide TemplateRegistry (templates compiled on first use)."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = TemplateRegistry()
+        return _registry
+
+
+def render(name: str, **context) -> RenderedEmail:
+    return get_registry().render(name, **context)
@@ -1,7 +1,7 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, EmailField, PasswordField, SubmitField, HiddenField, BooleanField, IntegerField, SelectField, TextAreaField
 from wtforms.validators import InputRequired, DataRequired, Email, Length, EqualTo, ValidationError
-from flask_wtf.file import FileField, FileAllowed, FileRequired
+from flask_wtf.file import FileField, FileAllowed, FileRequired, MultipleFileField
 
 def validate_specific_choice(form, field):
     if field.data == 'select':
@@ -83,3 +83,18 @@ class FicheContract(FlaskForm):
     ])
   nombre_heure = IntegerField("Nombre d'heures de travail", validators=[DataRequired()])
   submit = SubmitField("Lancer l'analyse")
+
+
+# ToDo: BatchFicheContract
+class BatchFicheContract(FlaskForm):
+  fiche_files = MultipleFileField("Fiches de paie (PDF ou archive ZIP)", validators=[
+        FileRequired(message='Sélectionner au moins un fichier.'),
+        FileAllowed(['pdf', 'zip'], 'Seulement des Documents PDF ou des archives ZIP sont autorisés !')
+    ])
+  contract_file = FileField("Contrat de travail", validators=[
+        FileRequired(message='Sélectionner un fichier.'),
+        FileAllowed(['docx', 'pdf'], 'Seulement des Documents PDF/DOCX sont autorisés !')
+    ])
+  nombre_heure = IntegerField("Nombre d'heures de travail", validators=[DataRequired()])
+  deferred = BooleanField("Analyse différée (résultats sous 24h)")
+  submit = SubmitField("Lancer l'analyse")
@@ -0,0 +1,15 @@
+"""
+Gunicorn settings, read by `gunicorn wsgi:app` from the project directory.
+
+Threaded workers: an open analysis stream (SSE) occupies a thread, not the
+whole worker, and the worker timeout only watches the worker's main loop.
+With sync workers a stream longer than `timeout` gets the worker killed,
+together with the job threads it runs.
+"""
+import os
+
+worker_class = "gthread"
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+# Concurrent requests per worker, open streams included
+threads = int(os.getenv("GUNICORN_THREADS", 16))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
@@ -1,16 +1,32 @@
-from flask import Flask, abort, render_template, redirect, url_for, flash, request, send_from_directory, session
+from flask import Flask, Blueprint, abort, current_app, render_template, redirect, url_for, flash, request, send_file, jsonify, Response, stream_with_context
 from flask_bootstrap import Bootstrap
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import login_user, login_required, LoginManager, current_user, logout_user
-import stripe
-from models.models import db, User, Check
+from models.models import db, User, Check, CheckFile, Job, ProcessedSession
 from models.config import CheckDataBase
-from forms.forms import RegisterForm, LoginForm, ProfileForm, ContractForm, FicheContract, RequestPasswordForm, ResetPasswordForm
-from core.upload import UploadError, save_upload
-from core.openai_engine import OpenaiAnalyse
+from models import stats as check_stats
+from models.pagination import keyset_paginate
+from sqlalchemy.orm import defer
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from forms.forms import RegisterForm, LoginForm, ProfileForm, ContractForm, FicheContract, BatchFicheContract, RequestPasswordForm, ResetPasswordForm
+from core.upload import UploadError, save_upload, save_batch_uploads
+from core import store
+from core.async_engine import AsyncOpenaiAnalyse
+from core.jobs import JobQueue
+from core import batch_api
+from core.report import get_report_cache
+from core.pricing import PriceCatalogue, PriceUnavailable
+from core.streaming import stream_hub, format_event, STREAM_MAX_SECONDS, STREAM_POLL_SECONDS
+from emails.outbox import Outbox
+from emails.registry import get_registry as get_email_templates
 from emails.email_utils import confirm_token, send_confirmation_email, generate_confirmation_token, send_reset_email, send_payment_success_email, send_contact_email
 import os
+import json
+import click
+import queue
 import threading
+import time
+from io import BytesIO
 from pathlib import Path
 from datetime import datetime, date
 from dotenv import load_dotenv
@@ -19,89 +35,243 @@ load_dotenv()
 
 SECRET_KEY = os.getenv('APP_SECRET_KEY')
 SECURITY_PASSWORD_SALT = os.getenv('SECURITY_PASSWORD_SALT')
-
-app = Flask(__name__)
-app.config['SECRET_KEY'] = SECRET_KEY
-app.config['SECURITY_PASSWORD_SALT'] = SECURITY_PASSWORD_SALT
-Bootstrap(app=app)
+STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY')
+STRIPE_WEBHOOK_SECRET = os.getenv('STRIPE_WEBHOOK_SECRET')
+# Largest request body (uploads), larger ones get a 413
+MAX_CONTENT_LENGTH = int(os.getenv('MAX_CONTENT_LENGTH', 256 * 1024 * 1024))
 
 # Flask Login Manager
 login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = "login"
+login_manager.login_view = "main.login"
 login_manager.login_message_category = "warning"
 
+# Routes and CLI commands (`flask --app main <command>` finds create_app)
+bp = Blueprint('main', __name__, cli_group=None)
+
+def create_app(config=None, engine=None):
+  """
+  Application factory: configuration and extensions only. Nothing here
+  opens a connection or a cache file; the schema and background workers
+  are started by `start_services` on the first request (or by the CLI
+  commands) and the Openai engine is built on first use (see get_engine).
+  `config` overrides the settings read from the environment.
+  """
+  app = Flask(__name__)
+  app.config['SECRET_KEY'] = SECRET_KEY
+  app.config['SECURITY_PASSWORD_SALT'] = SECURITY_PASSWORD_SALT
+  app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
+  app.config.update(config or {})
+  Bootstrap(app=app)
+
+  login_manager.init_app(app)
+
+  # DataBase configuration
+  CheckDataBase(app=app)
+
+  # Background analysis jobs
+  jobs = JobQueue()
+  jobs.init_app(app)
+  for module, handler in JOB_HANDLERS.items():
+    jobs.handler(module)(handler)
+
+  # Mail outbox (delivered by a background sender)
+  Outbox(app)
+  get_email_templates()  # compile the email templates once
+
+  # Module prices, refreshed in the background (no Price lookup at checkout)
+  app.extensions['pricing'] = PriceCatalogue(get_stripe)
+
+  # Openai engine, None until the first analysis
+  app.extensions['engine'] = engine
+  app.extensions['engine_lock'] = threading.Lock()
+
+  app.register_blueprint(bp)
+  return app
+
+# Per-app services registered by create_app
+def get_engine():
+  """The app's Openai engine, built on first use (it opens its cache files)"""
+  extensions = current_app.extensions
+  if extensions['engine'] is None:
+    with extensions['engine_lock']:
+      if extensions['engine'] is None:
+        extensions['engine'] = AsyncOpenaiAnalyse()
+  return extensions['engine']
+
+def get_jobs():
+  return current_app.extensions['jobs']
+
+def get_database():
+  return current_app.extensions['check_database']
+
 # user loader callback
 @login_manager.user_loader
 def load_user(user_id):
   return db.get_or_404(User, user_id)
 
-# DataBase configuration
-database = CheckDataBase(app=app)
+# Stripe module (imported on first payment)
+def get_stripe():
+   import stripe
+   stripe.api_key = STRIPE_SECRET_KEY
+   return stripe
 
-# Openai engine
-engine = OpenaiAnalyse()
+# Prompt shared by the fiche and batch modules
+FICHE_PROMPT = "Vérifie si la fiche de paie correspond bien au contrat et identifie toute anomalie, conformement au droit du travail français."
 
-# Stripe module
-stripe.api_key = os.getenv('STRIPE_SECRET_KEY')
+# Digest of an uploaded input file, recorded on its CheckFile row
+def input_digest(filename):
+   try:
+      return store.digest_for(filename)
+   except FileNotFoundError:
+      return None
 
 # current year
 current_year = datetime.now().year
 current_date = date.today()
 
 # Stripe checkout methode
-def stripe_checkout(endpoint):
-   """Implements stripe choukout"""
-
-   price_id = 'price_1SNWSaDlaxMT86N3tTdU28Be'  
-   price_obj = stripe.Price.retrieve(price_id)
-   unit_amount = price_obj.unit_amount
-
-   checkout_session = stripe.checkout.Session.create(
-      line_items= [
-         {
-            'price': price_id,
-            'quantity': 1
-         }
-      ],
+def stripe_checkout(endpoint, job, quantity=1):
+   """Implements stripe choukout for a job awaiting payment (its id travels in the session metadata)"""
+
+   checkout_session = get_stripe().checkout.Session.create(
+      line_items=current_app.extensions['pricing'].line_items(job.module, quantity),
       mode= 'payment',
+      client_reference_id=str(job.id),
+      metadata={'job_id': str(job.id)},
       success_url = url_for(endpoint, _external=True) + '?session_id={CHECKOUT_SESSION_ID}',
-      cancel_url= url_for('cancel', _external=True)
+      cancel_url= url_for('main.cancel', _external=True)
    )
 
    return checkout_session
-   
+
+
+def confirm_payment(session_id, job_id):
+   """
+   Record a paid checkout session and release its job, exactly once per
+   session: the webhook and the success redirect may both call this, the
+   processed_sessions primary key lets only the first one through.
+   Returns the job (None if it does not exist).
+   """
+   processed = db.session.get(ProcessedSession, session_id)
+   if processed is not None:
+      return processed.job
+
+   job = db.session.get(Job, job_id)
+   if job is None:
+      return None
+
+   try:
+      db.session.add(ProcessedSession(session_id=session_id, job_id=job.id))
+      db.session.flush()
+   except IntegrityError:
+      # the concurrent call won the race
+      db.session.rollback()
+      return db.session.get(ProcessedSession, session_id).job
+
+   if job.status != 'awaiting_payment':
+      db.session.commit()
+      return job
+
+   data = json.loads(job.payload)
+
+   # create the pending check, filled in by the job worker
+   if job.module == 'contrat':
+      check = Check(module='contrat', input_files=data['filename'], has_paid=True, user_id=job.user_id)
+      check.add_file('contract', data['filename'], input_digest(data['filename']))
+      job.check = check
+   elif job.module == 'fiche':
+      check = Check(module='fiche', input_files=f"{data['fiche_name']};{data['contract_name']}", has_paid=True, user_id=job.user_id)
+      check.add_file('fiche', data['fiche_name'], input_digest(data['fiche_name']))
+      check.add_file('contract', data['contract_name'], input_digest(data['contract_name']))
+      job.check = check
+   elif job.module == 'batch':
+      job.total = len(data['fiche_names'])
+
+   if data.get('deferred'):
+      # Picked up by `flask batch-submit` instead of the job workers
+      job.status = 'deferred'
+      db.session.commit()
+   else:
+      get_jobs().release(job)
+   return job
+
+
+def paid_job(session_id):
+   """
+   Job of a paid checkout session for the success redirects. The ledger is
+   read first; Stripe is only asked when the webhook has not landed yet.
+   """
+   if not session_id:
+      return None
+
+   processed = db.session.get(ProcessedSession, session_id)
+   if processed is not None:
+      job = processed.job
+   else:
+      stripe_session = get_stripe().checkout.Session.retrieve(session_id)
+      job_id = (stripe_session.metadata or {}).get('job_id')
+      if stripe_session.payment_status != 'paid' or not job_id:
+         return None
+      job = confirm_payment(session_id, int(job_id))
+
+   if job is None or job.user_id != current_user.id:
+      return None
+   return job
+
+
+# ToDo: Stripe Webhook Route
+@bp.route('/stripe/webhook', methods=['POST'])
+def stripe_webhook():
+   """Releases the job of every paid checkout session (signature verified)"""
+   payload = request.get_data(as_text=True)
+   stripe = get_stripe()
+   try:
+      # Also rejects events signed more than 5 minutes ago (replays)
+      event = stripe.Webhook.construct_event(payload, request.headers.get('Stripe-Signature', ''), STRIPE_WEBHOOK_SECRET)
+   except (stripe.SignatureVerificationError, TypeError, ValueError):
+      abort(400)
+
+   if event['type'] in ('checkout.session.completed', 'checkout.session.async_payment_succeeded'):
+      checkout = event['data']['object']
+      job_id = (checkout.get('metadata') or {}).get('job_id')
+      if checkout.get('payment_status') == 'paid' and job_id:
+         confirm_payment(checkout['id'], int(job_id))
+
+   return jsonify(received=True)
+
 
 # ToDo: Index Route
-@app.route('/', methods=['GET'])
+@bp.route('/', methods=['GET'])
 def index():
   return render_template('index.html', current_year=current_year)
 
 # ToDo: Dashboard Home Route
-@app.route('/dashboard', methods = ['GET', 'POST'])
+@bp.route('/dashboard', methods = ['GET', 'POST'])
 def dashboard():
   """Returns all the record in the db"""
 
   if not current_user.is_authenticated:
-    return redirect(url_for('login'))  # Send user to login page
+    return redirect(url_for('main.login'))  # Send user to login page
   
-  # Get current page from query string (?page=2), default = 1
-  page = request.args.get('page', 1, type=int)
+  # Cursors from the query string (?after=... / ?before=...), none = first page
   per_page = 8  # number of analyses per page
 
-  # Query user’s checks
-  pagination = (
+  # Query user’s checks (the large detail/report columns are not needed here)
+  query = (
       db.session.query(Check)
+      .options(defer(Check.detail), defer(Check.output_files))
       .filter_by(user_id=current_user.id)
-      .order_by(Check.created_at.desc())
-      .paginate(page=page, per_page=per_page, error_out=False)
+  )
+  pagination = keyset_paginate(
+      query, Check, per_page,
+      after=request.args.get('after'),
+      before=request.args.get('before')
   )
 
   checks = pagination.items
 
-  # Stats
-  total_conforme = sum(1 for c in checks if c.result and c.result.lower() == "conforme")
-  total_non_conforme = sum(1 for c in checks if c.result and c.result.lower() == "non conforme")
+  # Stats over all the user's checks (SQL aggregates, cached per user)
+  stats = check_stats.user_check_stats(current_user.id)
 
   return render_template(
       'dashboard/index.html',
@@ -110,12 +280,13 @@ def dashboard():
       current_date=current_date,
       checks=checks,
       pagination=pagination,
-      total_conforme=total_conforme,
-      total_non_conforme=total_non_conforme
+      stats=stats,
+      total_conforme=stats['conforme'],
+      total_non_conforme=stats['non_conforme']
   )
 
 # ToDo: CheckContract Route
-@app.route('/contrat-de-travail', methods=['GET', 'POST'])
+@bp.route('/contrat-de-travail', methods=['GET', 'POST'])
 @login_required
 def module_contract():
   # Initialize Contract form
@@ -130,22 +301,23 @@ def module_contract():
         type
         filename = save_upload(uploaded, current_user.id)
         
-        data = {
-           'type_contract': type_contract,
-           'filename': filename
-        }
-        session['contrat_data'] = data  # store in session
-
         # Run Stripe checkout
         if filename:
-          checkout_session = stripe_checkout(endpoint='analyse_contract')
+          # the job waits for the payment, its id goes in the checkout metadata
+          job = get_jobs().submit('contrat', {
+             'type_contract': type_contract,
+             'filename': filename,
+             'base_url': request.url_root,
+          }, user_id=current_user.id, status='awaiting_payment')
+
+          checkout_session = stripe_checkout(endpoint='main.analyse_contract', job=job)
           return redirect(checkout_session.url, code=303)
         else:
           flash("Aucun fichier sélectionné !", "info")
 
-      except UploadError as e:
+      except (UploadError, PriceUnavailable) as e:
         flash(str(e), "danger")
-        return redirect(url_for("module_contrat"))
+        return redirect(url_for("main.module_contract"))
 
       flash("Fichier uploadé avec succès.", "success")
       # return redirect(url_for("dashboard.index"))
@@ -154,55 +326,62 @@ def module_contract():
   return render_template('dashboard/module_contrat.html', contract_form=contract_form, current_year=current_year)
 
 # ToDo: Analyse Contract route
-@app.route('/analyse-contrat', methods=['GET', 'POST'])
+@bp.route('/analyse-contrat', methods=['GET', 'POST'])
 @login_required
 def analyse_contract():
-   session_id = request.args.get('session_id')
-   stripe_session = stripe.checkout.Session.retrieve(session_id)
+   # The analysis is queued once per paid session (webhook or here);
+   # refreshing this page only looks the check up again
+   try:
+      job = paid_job(request.args.get('session_id'))
+   except Exception as e:
+      flash(f'Une erreure est survenue', 'info')
+      return redirect(url_for('main.module_contract'))
+
+   if job is None:
+      return redirect(url_for('main.cancel'))
+
+   # head user to view detail route
+   return redirect(url_for('main.view', id=job.check_id))
 
-   # Run Openai engine if payment is success
-   if stripe_session.payment_status == 'paid':
+
+# Text generated so far, saved for SSE endpoints of other processes
+def partial_text_writer(job):
+   """persist(text) for stream_hub.producer: writes Job.partial on its own connection"""
+   engine, logger, job_id = db.engine, current_app.logger, job.id
+
+   def persist(text):
+      # Called from the engine's threads: no app context, no session
       try:
-         data = session.get('contrat_data')
+         with engine.begin() as connection:
+            connection.execute(db.update(Job).where(Job.id == job_id).values(partial=text))
+      except SQLAlchemyError as e:
+         logger.warning('Could not save the partial text of job %s: %s', job_id, e)
+   return persist
 
-         prompt = f"Analyse ce contrat {data['type_contract']} et indique s'il est conforme au droit du travail français."
-         
-         result = engine.analyse_contract(file=data['filename'], prompt=prompt) # Openai engine
-         
-         # create new check
-         new_check = Check(
-            module='contrat',
-            input_files=data['filename'],
-            output_files=result['report_file'],
-            result=result['result'],
-            detail=result['detail'],
-            has_paid=True,
-            user_id=current_user.id,
-          )
-         
-         # insert new_check in db
-         db.session.add(new_check)
-         db.session.flush()
-         db.session.commit()
 
-         print(prompt)
+# ToDo: Contract analysis job
+def run_contract_job(job, data):
+   """Runs the Openai engine for a paid contract check"""
+   prompt = f"Analyse ce contrat {data['type_contract']} et indique s'il est conforme au droit du travail français."
 
-         # Send payment email
-         send_payment_success_email(user=current_user, module_type='contrat')
+   check = job.check
 
-         session.pop('contrat_data', None)  # clean up
-         
-         # head user to view detail route
-         return redirect(url_for('view', id=new_check.id))
-      except Exception as e:
-         flash(f'Une erreure est survenue', 'info')
-         return redirect(url_for('module_contract'))
-   else:
-      return redirect(url_for('cancel'))
+   # The answer is streamed to the result page while it is generated
+   with stream_hub.producer(check.id, persist=partial_text_writer(job)) as on_text:
+      result = get_engine().analyse_contract(file=data['filename'], prompt=prompt, on_text=on_text) # Openai engine
+
+      check.output_files = result['report_file']
+      check.add_file('report', result['report_file'])
+      check.result = result['result']
+      check.detail = result['detail']
+      db.session.commit()
+
+   # Send payment email
+   send_payment_success_email(user=check.user, module_type='contrat', dedup_key=f'payment-check-{check.id}')
 
 
 # ToDo: FicheContract Route
-@app.route('/fiche-de-paie', methods=['GET', 'POST'])
+@bp.route('/fiche-de-paie', methods=['GET', 'POST'])
 @login_required
 def module_fiche():
   # Initialize Contract form
@@ -221,22 +400,22 @@ def module_fiche():
 
       # Run Stripe checkout
       if fiche_name and contract_name:
-        data = {
+        # the job waits for the payment, its id goes in the checkout metadata
+        job = get_jobs().submit('fiche', {
            'fiche_name': fiche_name,
            'contract_name': contract_name,
-           'hours': hours
-        }
-        # Store data in session for later use
-        session['fiche_data'] = data
+           'hours': hours,
+           'base_url': request.url_root,
+        }, user_id=current_user.id, status='awaiting_payment')
 
-        checkout_session = stripe_checkout(endpoint='analyse_fiche')
+        checkout_session = stripe_checkout(endpoint='main.analyse_fiche', job=job)
         return redirect(checkout_session.url, code=303)
 
       else:
         flash('Aucun fichier sélectionné !', 'info')
-    except UploadError as e:
+    except (UploadError, PriceUnavailable) as e:
       flash(str(e), "danger")
-      return redirect(url_for("module_fiche"))
+      return redirect(url_for("main.module_fiche"))
 
     flash("Fichier uploadé avec succès.", "success")
     # return redirect(url_for("dashboard.index"))
@@ -244,64 +423,263 @@ def module_fiche():
   return render_template('dashboard/module_fiche.html', fiche_form=fiche_form, current_year=current_year)
 
 # ToDo: Analyse Fiche Route
-@app.route('/analyse-fiche', methods=['GET', 'POST'])
+@bp.route('/analyse-fiche', methods=['GET', 'POST'])
 @login_required
 def analyse_fiche():
-   session_id = request.args.get('session_id')
-   stripe_session = stripe.checkout.Session.retrieve(session_id)
+   # The analysis is queued once per paid session (webhook or here);
+   # refreshing this page only looks the check up again
+   try:
+      job = paid_job(request.args.get('session_id'))
+   except Exception as e:
+      flash(f'Une erreur est survenue: {e}', 'info')
+      return redirect(url_for('main.module_fiche'))
 
-   if stripe_session.payment_status == 'paid':
-      try:
-        data = session.get('fiche_data')
-        if not data:
-            flash("Aucune donnée d'analyse trouvée.", "danger")
-            return redirect(url_for("module_fiche"))
-        
-        prompt = "Vérifie si la fiche de paie correspond bien au contrat et identifie toute anomalie, conformement au droit du travail français."
-        
-        result = engine.analyse_fiche(fiche_file=data['fiche_name'], contrat_file=data['contract_name'], hours=data['hours'], prompt=prompt)
-        
-        # create new check
-        new_check = Check(
-            module='fiche',
-            input_files=f"{data['fiche_name']};{data['contract_name']}",
-            output_files=result['report_file'],
-            result=result['result'],
-            detail=result['detail'],
-            has_paid=True,
-            user_id=current_user.id,
-          )
-        
-        # insert new_check
-        db.session.add(new_check)
-        db.session.flush()
-        db.session.commit()
+   if job is None:
+      return redirect(url_for('main.cancel'))
 
-        # Send payment email
-        send_payment_success_email(user=current_user, module_type='fiche')
-        threading.Thread(target=send_payment_success_email, args=(current_user, 'fiche')).start()
+   # head user to view detail route
+   return redirect(url_for('main.view', id=job.check_id))
 
-        # clean saved session fiche_data
-        session.pop('fiche_data', None)
-        
-        # head user to view detail route
-        return redirect(url_for('view', id=new_check.id))
-      except Exception as e:
-         flash(f'Une erreur est survenue: {e}', 'info')
-         return redirect(url_for('module_fiche'))
-   else:
-      return redirect(url_for('cancel'))
+
+# ToDo: Fiche analysis job
+def run_fiche_job(job, data):
+   """Runs the Openai engine for a paid payslip check"""
+   prompt = FICHE_PROMPT
+
+   check = job.check
+
+   def save_result(ai_result):
+      # Runs while the PDF report is being rendered
+      check.result = ai_result.get('result', 'Non conforme')
+      check.detail = ai_result.get('detail', '')
+      db.session.commit()
+
+      # Send payment email
+      send_payment_success_email(user=check.user, module_type='fiche', dedup_key=f'payment-check-{check.id}')
+
+   # The answer is streamed to the result page while it is generated
+   with stream_hub.producer(check.id, persist=partial_text_writer(job)) as on_text:
+      result = get_engine().analyse_fiche(fiche_file=data['fiche_name'], contrat_file=data['contract_name'], hours=data['hours'], prompt=prompt, on_result=save_result, on_text=on_text)
+
+      check.output_files = result['report_file']
+      check.add_file('report', result['report_file'])
+      db.session.commit()
    
 
+# ToDo: BatchFiche Route
+@bp.route('/fiches-de-paie-en-lot', methods=['GET', 'POST'])
+@login_required
+def module_batch():
+  batch_form = BatchFicheContract()
+
+  if batch_form.validate_on_submit():
+    try:
+      fiche_names = save_batch_uploads(batch_form.fiche_files.data, current_user.id)
+      contract_name = save_upload(batch_form.contract_file.data, current_user.id)
+
+      # The file list can be too large for the session cookie: keep it in a job awaiting payment
+      job = get_jobs().submit('batch', {
+          'contract_name': contract_name,
+          'fiche_names': fiche_names,
+          'hours': batch_form.nombre_heure.data,
+          'deferred': bool(batch_form.deferred.data),
+          'base_url': request.url_root,
+      }, user_id=current_user.id, status='awaiting_payment')
+
+      checkout_session = stripe_checkout(endpoint='main.analyse_batch', job=job, quantity=len(fiche_names))
+      return redirect(checkout_session.url, code=303)
+    except (UploadError, PriceUnavailable) as e:
+      flash(str(e), "danger")
+      return redirect(url_for("main.module_batch"))
+
+  return render_template('dashboard/module_batch.html', batch_form=batch_form, current_year=current_year)
+
+# ToDo: Analyse Batch Route
+@bp.route('/analyse-lot', methods=['GET', 'POST'])
+@login_required
+def analyse_batch():
+   try:
+      job = paid_job(request.args.get('session_id'))
+   except Exception as e:
+      flash(f'Une erreur est survenue: {e}', 'info')
+      return redirect(url_for('main.module_batch'))
+
+   if job is None:
+      return redirect(url_for('main.cancel'))
+   return redirect(url_for('main.batch_view', id=job.id))
+
+
+# ToDo: Batch analysis job
+def run_batch_job(job, data):
+   """Runs the Openai engine over every payslip of a paid batch"""
+   prompt = FICHE_PROMPT
+
+   def report_progress(done, total):
+      job.progress = done
+      job.total = total
+      job.heartbeat_at = datetime.now()  # a long batch is still alive
+      db.session.commit()
+
+   results = get_engine().analyse_batch(contrat_file=data['contract_name'], fiche_files=data['fiche_names'], hours=data['hours'], prompt=prompt, progress=report_progress)
+   save_batch_results(job, data, results)
+
+
+def save_batch_results(job, data, results):
+   """Bulk-insert the checks of a batch, record per-item results and notify the user"""
+   # One bulk insert for every successful payslip, then one for their files
+   ok_items = [item for item in results if item['status'] == 'ok']
+   rows = [
+      {
+         'module': 'fiche',
+         'input_files': f"{item['fiche_file']};{data['contract_name']}",
+         'output_files': item['report_file'],
+         'result': item['result'],
+         'detail': item['detail'],
+         'has_paid': True,
+         'user_id': job.user_id,
+         'created_at': datetime.now(),
+      }
+      for item in ok_items
+   ]
+   if rows:
+      check_ids = db.session.scalars(
+         db.insert(Check).returning(Check.id, sort_by_parameter_order=True), rows
+      ).all()
+      contract_digest = input_digest(data['contract_name'])
+      file_rows = []
+      for check_id, item in zip(check_ids, ok_items):
+         file_rows += [
+            {'check_id': check_id, 'role': 'fiche', 'filename': item['fiche_file'], 'digest': input_digest(item['fiche_file'])},
+            {'check_id': check_id, 'role': 'contract', 'filename': data['contract_name'], 'digest': contract_digest},
+            {'check_id': check_id, 'role': 'report', 'filename': item['report_file'], 'digest': None},
+         ]
+      db.session.execute(db.insert(CheckFile), file_rows)
+      check_stats.invalidate(job.user_id)  # bulk inserts skip ORM events
+
+   job.result = json.dumps([
+      {k: item.get(k) for k in ('fiche_file', 'status', 'result', 'report_file', 'error')}
+      for item in results
+   ])
+   db.session.commit()
+
+   send_payment_success_email(user=db.session.get(User, job.user_id), module_type='lot', dedup_key=f'payment-job-{job.id}')
+
+
+# ToDo: Batch Result Route
+@bp.route('/lot/<int:id>', methods=['GET'])
+@login_required
+def batch_view(id):
+  job = db.get_or_404(Job, id)
+  if job.user_id != current_user.id:
+    abort(403)
+
+  results = json.loads(job.result) if job.result else []
+  return render_template('dashboard/batch.html', job=job, results=results, current_year=current_year)
+
+# ToDo: Job Status Route (polled by batch.html)
+@bp.route('/jobs/<int:id>', methods=['GET'])
+@login_required
+def job_status(id):
+  job = db.get_or_404(Job, id)
+  if job.user_id != current_user.id:
+    abort(403)
+
+  return jsonify({
+    'status': job.status,
+    'progress': job.progress,
+    'total': job.total,
+    'error': job.error if job.status == 'failed' else None,
+  })
+
 # ToDo: View Check Result Route
-@app.route('/check-result/<int:id>', methods=['GET', 'POST'])
+@bp.route('/check-result/<int:id>', methods=['GET', 'POST'])
 @login_required
 def view(id):
   check = db.get_or_404(Check, id)
   return render_template('dashboard/view.html', check=check)
 
+# ToDo: Check Status Route (polled by view.html)
+@bp.route('/check-result/<int:id>/status', methods=['GET'])
+@login_required
+def check_status(id):
+  check = db.get_or_404(Check, id)
+  if check.user_id != current_user.id:
+    abort(403)
+
+  status, error = check_job_status(check)
+  return jsonify({
+    'status': status,
+    'result': check.result,
+    'error': error,
+  })
+
+def check_job_status(check):
+  """Status of the analysis of `check` and the job error if it failed"""
+  job = db.session.execute(
+    db.select(Job).where(Job.check_id == check.id).order_by(Job.id.desc()).limit(1)
+  ).scalar()
+
+  # The result may be saved before the job (report rendering) is finished
+  if job:
+    return job.status, job.error if job.status == 'failed' else None
+  return ('done' if check.result else 'pending'), None
+
+# ToDo: Check Stream Route (Server-Sent Events read by view.html)
+@bp.route('/check-result/<int:id>/stream', methods=['GET'])
+@login_required
+def check_stream(id):
+  check = db.get_or_404(Check, id)
+  if check.user_id != current_user.id:
+    abort(403)
+  check_id = check.id
+
+  def poll_database():
+    # Jobs run by another process never reach the stream hub: read their status and text so far
+    status, error = check_job_status(db.session.get(Check, check_id))
+    partial = db.session.execute(
+      db.select(Job.partial).where(Job.check_id == check_id).order_by(Job.id.desc()).limit(1)
+    ).scalar()
+    db.session.close()  # do not hold a connection (or a stale snapshot) between polls
+    if status in ('done', 'failed'):
+      return format_event(status, error or ''), None
+    return None, partial or ''
+
+  def events():
+    updates = stream_hub.subscribe(check_id)
+    text = ''   # what the browser has so far
+    local = False  # the job streams through the hub of this process
+    poll_now = True  # look at the database before waiting on the hub
+    try:
+      deadline = time.monotonic() + STREAM_MAX_SECONDS
+      while time.monotonic() < deadline:
+        try:
+          event, data = updates.get(timeout=0 if poll_now else STREAM_POLL_SECONDS)
+          local = True
+        except queue.Empty:
+          poll_now = False
+          final, partial = poll_database()
+          if final:
+            yield final
+            return
+          if local or partial == text:
+            yield ': keepalive\n\n'
+            continue
+          # the saved text lags behind the hub: only used for jobs of other processes
+          event, data = ('delta', partial[len(text):]) if partial.startswith(text) else ('reset', partial)
+
+        text = text + data if event == 'delta' else data if event == 'reset' else text
+        yield format_event(event, data)
+        if event == 'done':
+          return
+      # past the deadline the browser reconnects and gets the text so far
+    finally:
+      stream_hub.unsubscribe(check_id, updates)
+
+  return Response(stream_with_context(events()), mimetype='text/event-stream',
+                  headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 # ToDo: Register Route
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
 def register():
   register_form = RegisterForm()
 
@@ -340,7 +718,7 @@ def register():
          flash('Vous aviez déja un compte avec cet email. Veuillez vous connecter !', 'warning')
          
          # head user to login page
-         return redirect(url_for('login'))
+         return redirect(url_for('main.login'))
      else:
        flash('Vos mots de passe doivent être égaux', 'error')
   except Exception as e:
@@ -349,7 +727,7 @@ def register():
   return render_template('register.html', register_form=register_form)
 
 # ToDo: Login Route
-@app.route('/login', methods = ['GET', 'POST'])
+@bp.route('/login', methods = ['GET', 'POST'])
 def login():
   # Initialize login form
   login_form = LoginForm()
@@ -371,7 +749,7 @@ def login():
           login_user(user=user)
 
           # head user to dashboard page
-          return redirect(url_for('dashboard', logged_in=current_user.is_authenticated))
+          return redirect(url_for('main.dashboard', logged_in=current_user.is_authenticated))
         else:
           flash('Mot de passe incorrect ! Veuillez réessayer.', 'warning')
       else:
@@ -383,12 +761,12 @@ def login():
 
 
 # ToDo: Confirm Email Route
-@app.route('/confirm/<token>')
+@bp.route('/confirm/<token>')
 def confirm_email(token):
     email = confirm_token(token)
     if not email:
         flash('Le lien de confirmation est invalide ou déja expiré.', 'danger')
-        return redirect(url_for('register'))
+        return redirect(url_for('main.register'))
 
     user = User.query.filter_by(email=email).first_or_404()
 
@@ -399,51 +777,180 @@ def confirm_email(token):
         db.session.commit()
         flash('Votre email a été confirmé ! Veuillez vous connecter.', 'success')
 
-    return redirect(url_for('login'))
-
-# Define absolute paths
-CORE_DIR = Path(__file__).resolve().parent / "core"
-INPUT_DIR = CORE_DIR / "input-files"
-OUTPUT_DIR = CORE_DIR / "output-files"
+    return redirect(url_for('main.login'))
 
-@app.route("/download/<path:filename>")
+@bp.route("/download/<path:filename>")
 @login_required
 def download_file(filename):
   """
-  Allow a logged-in user to download one of their input or output files.
-  The filename must exist in either input-files or output-files.
+  Allow a logged-in user to download one of their input files or reports.
+  Reports are looked up through the user's checks and rendered on demand
+  when they are not (or no longer) on disk.
   """
   # Normalize filename
   safe_filename = Path(filename).name  # removes any path traversal like ../../
 
-  # Check both directories
-  input_path = INPUT_DIR / safe_filename
-  output_path = OUTPUT_DIR / safe_filename
-
-  if input_path.exists():
-      directory = INPUT_DIR
-  elif output_path.exists():
-      directory = OUTPUT_DIR
-  else:
+  # Ownership: indexed lookup of the file among the user's checks
+  check_file = db.session.execute(
+      db.select(CheckFile)
+      .join(CheckFile.check)
+      .where(CheckFile.filename == safe_filename, Check.user_id == current_user.id)
+      .limit(1)
+  ).scalar()
+  if check_file is None:
       abort(404, description="File not found")
 
-  # Optionally, verify the file belongs to current_user
-  # (if filenames start with user_id, like '12_abC123.pdf')
-  if not safe_filename.startswith(f"{current_user.id}_") and not safe_filename.startswith("report_"):
-      abort(403, description="Accèss non autorisé a ce fichier")
+  # Reports: served from the report cache, rebuilt from the check when missing
+  if check_file.role == 'report':
+      check = check_file.check
+
+      cached_path = get_report_cache().get(safe_filename)
+      if cached_path is not None:
+          return send_file(cached_path, as_attachment=True, download_name=safe_filename)
+
+      pdf = get_engine().render_report({'result': check.result or 'Non conforme', 'detail': check.detail or ''})
+      get_report_cache().put(safe_filename, pdf)
+      return send_file(BytesIO(pdf), mimetype='application/pdf', as_attachment=True, download_name=safe_filename)
+
+  # Input files resolve through the content-addressed store
+  try:
+      input_path = store.resolve(safe_filename)
+  except FileNotFoundError:
+      abort(404, description="File not found")
 
   # Serve file
-  return send_from_directory(directory, safe_filename, as_attachment=True)
+  return send_file(input_path, as_attachment=True, download_name=safe_filename)
+
+# ToDo: Standalone job worker (`flask --app main run-jobs`)
+@bp.cli.command('run-jobs')
+@click.option('--workers', type=int, default=None, help='Number of worker threads (default: JOB_WORKERS).')
+def run_jobs(workers):
+  """Run analysis job workers in the foreground."""
+  get_database().ensure_schema()
+  get_jobs().run_forever(workers=workers)
+
+# ToDo: Standalone mail sender (`flask --app main send-mail`)
+@bp.cli.command('send-mail')
+def send_mail():
+  """Deliver queued emails in the foreground."""
+  get_database().ensure_schema()
+  current_app.extensions['outbox'].run_forever()
+
+# ToDo: Legacy upload migration (`flask --app main migrate-files`)
+@bp.cli.command('migrate-files')
+def migrate_files():
+  """Move uploads stored before the blob store into it (identical files are kept once)."""
+  migrated = store.migrate_legacy_files()
+  click.echo(f'Migrated {migrated} files')
+
+# ToDo: Orphaned upload cleanup (`flask --app main cleanup-files`)
+@bp.cli.command('cleanup-files')
+@click.option('--older-than', type=float, default=24, help='Only remove files older than this many hours.')
+@click.option('--dry-run', is_flag=True, help='Only report what would be removed.')
+def cleanup_files(older_than, dry_run):
+  """Remove uploads and blobs that no check refers to."""
+  get_database().ensure_schema()
+  # Uploads of unfinished jobs have no CheckFile rows yet
+  in_jobs = set()
+  for payload in db.session.scalars(db.select(Job.payload).where(Job.status.not_in(('done', 'failed')))):
+    data = json.loads(payload)
+    in_jobs.update(name for key in ('filename', 'fiche_name', 'contract_name') if (name := data.get(key)))
+    in_jobs.update(data.get('fiche_names', []))
+
+  def referenced_names(names):
+    used = set(db.session.scalars(db.select(CheckFile.filename).where(CheckFile.filename.in_(names))))
+    return used | (in_jobs & set(names))
+
+  def referenced_digests(digests):
+    return set(db.session.scalars(db.select(CheckFile.digest).where(CheckFile.digest.in_(digests))))
+
+  removed = store.cleanup(referenced_names, referenced_digests, older_than=older_than * 3600, dry_run=dry_run)
+  click.echo(f"{'Would remove' if dry_run else 'Removed'} {removed['aliases']} aliases and {removed['blobs']} blobs")
+
+# ToDo: Offline OpenAI Batch API (`flask --app main batch-submit` / `batch-collect`)
+def _batch_client(local):
+  return batch_api.LocalBatchClient() if local else get_engine().client
+
+@bp.cli.command('batch-submit')
+@click.option('--local', is_flag=True, help='Use the offline LocalBatchClient stand-in.')
+def batch_submit(local):
+  """Submit every deferred batch job as one OpenAI batch."""
+  get_database().ensure_schema()
+  deferred = db.session.execute(db.select(Job).where(Job.module == 'batch', Job.status == 'deferred')).scalars().all()
+  if not deferred:
+    click.echo('No deferred job.')
+    return
+
+  lines = []
+  for job in deferred:
+    data = json.loads(job.payload)
+    lines += batch_api.prepare_fiche_batch(get_engine(), job.id, data['contract_name'], data['fiche_names'], FICHE_PROMPT, data['hours'])
+
+  client = _batch_client(local)
+  batch_id = batch_api.submit(client, batch_api.write_requests(lines))
+
+  for job in deferred:
+    data = json.loads(job.payload)
+    data['batch_id'] = batch_id
+    job.payload = json.dumps(data)
+    job.status = 'batched'
+  db.session.commit()
+
+  if local:
+    # The stand-in only lives in this process and only knows this batch: collect it right away
+    _collect_batches(client, batch_id)
+  click.echo(f'Submitted {batch_id}: {len(deferred)} job(s), {len(lines)} request(s).')
+
+@bp.cli.command('batch-collect')
+def batch_collect():
+  """Ingest the results of completed OpenAI batches."""
+  get_database().ensure_schema()
+  _collect_batches(_batch_client(local=False))
+
+def _collect_batches(client, only_batch_id=None):
+  """Ingest every batched job, or only those of `only_batch_id`"""
+  batched = db.session.execute(db.select(Job).where(Job.module == 'batch', Job.status == 'batched')).scalars().all()
+  answers, errors = {}, {}
+
+  for job in batched:
+    data = json.loads(job.payload)
+    batch_id = data['batch_id']
+    if only_batch_id is not None and batch_id != only_batch_id:
+      continue
+    if batch_id not in answers and batch_id not in errors:
+      try:
+        answers[batch_id] = batch_api.fetch(client, batch_id)
+      except batch_api.BatchError as e:
+        errors[batch_id] = str(e)
+
+    if batch_id in errors:
+      job.status = 'failed'
+      job.error = errors[batch_id]
+      db.session.commit()
+      continue
+
+    if answers[batch_id] is None:
+      click.echo(f'Job {job.id}: batch {batch_id} still running.')
+      continue
+
+    results = batch_api.collect_fiche_batch(get_engine(), job.id, data['fiche_names'], answers[batch_id])
+    with current_app.test_request_context(base_url=data.get('base_url', 'http://localhost/')):
+      job.progress = job.total = len(results)
+      save_batch_results(job, data, results)
+    job.status = 'done'
+    job.finished_at = datetime.now()
+    db.session.commit()
+    click.echo(f'Job {job.id}: {len(results)} result(s) ingested.')
 
 # Todo: Logout Route
-@app.route('/logout')
+@bp.route('/logout')
 @login_required
 def logout():
   logout_user()
-  return redirect(url_for('index'))
+  return redirect(url_for('main.index'))
 
 #ToDo: Profile Route
-@app.route('/profile', methods=['GET', 'POST'])
+@bp.route('/profile', methods=['GET', 'POST'])
 @login_required
 def profile():
   user = current_user
@@ -457,12 +964,12 @@ def profile():
       if profile_form.new_password.data:
         if len(profile_form.new_password.data) < 8:
           flash('Le mot de passe doit contenir au moins 8 caractères.', 'danger')
-          return redirect(url_for('profile'))
+          return redirect(url_for('main.profile'))
         user.password_hash = generate_password_hash(profile_form.new_password.data, salt_length=8)
 
       db.session.commit()
       flash('Modification sauvegardée avec succèss !', 'success')
-      return redirect(url_for('profile'))
+      return redirect(url_for('main.profile'))
 
     except Exception as e:
       flash(f'Une erreur est survenue: {e}', 'danger')
@@ -470,7 +977,7 @@ def profile():
   return render_template('dashboard/profile.html', form=profile_form, current_user=current_user, current_year=current_year)
 
 # ToDo: Request Password Route
-@app.route('/request-password', methods=['GET', 'POST'])
+@bp.route('/request-password', methods=['GET', 'POST'])
 def request_password():
     form = RequestPasswordForm()
     if form.validate_on_submit():
@@ -483,20 +990,20 @@ def request_password():
             flash("Aucun compte trouvé avec cette adresse e-mail.", "danger")
     return render_template('auth/request_password.html', form=form)
 
-@app.route('/reset-password/<token>', methods=['GET', 'POST'])
+@bp.route('/reset-password/<token>', methods=['GET', 'POST'])
 def reset_password(token):
     if current_user.is_authenticated:
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
 
     email = confirm_token(token)
     if not email:
         flash("Le lien de réinitialisation est invalide ou expiré.", "danger")
-        return redirect(url_for('request_password'))
+        return redirect(url_for('main.request_password'))
 
     user = User.query.filter_by(email=email).first()
     if not user:
         flash("Utilisateur introuvable.", "danger")
-        return redirect(url_for('request_password'))
+        return redirect(url_for('main.request_password'))
 
     form = ResetPasswordForm()
     if form.validate_on_submit():
@@ -504,25 +1011,25 @@ def reset_password(token):
             user.password_hash = generate_password_hash(form.password.data, salt_length=8)
             db.session.commit()
             flash("Votre mot de passe a été réinitialisé avec succès. Vous pouvez vous connecter.", "success")
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
         except Exception as e:
             db.session.rollback()
-            app.logger.exception("Error resetting password: %s", e)
+            current_app.logger.exception("Error resetting password: %s", e)
             flash("Une erreur est survenue. Réessayez plus tard.", "danger")
-            return redirect(url_for('request_password'))
+            return redirect(url_for('main.request_password'))
 
     return render_template('auth/reset_password.html', form=form)
 
 # ToDo Cancel Payment Route
-@app.route('/cancel')
+@bp.route('/cancel')
 @login_required
 def cancel():
     flash('Payement annulé. Veuillez réessayer !', 'info')
-    return redirect(url_for('dashboard'))
+    return redirect(url_for('main.dashboard'))
 
 
 # ToDo: Send Contact Message
-@app.route('/contact', methods=['GET', 'POST'])
+@bp.route('/contact', methods=['GET', 'POST'])
 def contact():
   if request.method == 'POST':
     if request.form['email'] != "" and request.form['message'] != "":
@@ -538,23 +1045,52 @@ def contact():
     else:
         flash('Veuillez remplir tous les champs', 'error')
 
-  return redirect(url_for('index'))
+  return redirect(url_for('main.index'))
 
 # ToDo: Mention Legales Route
-@app.route('/mentions-legales', methods=['GET'])
+@bp.route('/mentions-legales', methods=['GET'])
 def legal_mention():
   return render_template('mention-legales.html')
 
 # ToDo: Politque Confidentiel Route
-@app.route('/politique-de-confidentialite', methods=['GET'])
+@bp.route('/politique-de-confidentialite', methods=['GET'])
 def confidential_policies():
   return render_template('confidential-policies.html')
 
 # ToDo: CGU Route
-@app.route('/cgu')
+@bp.route('/cgu')
 def cgu():
   return render_template('cgu.html')
 
 
+# ToDo: Deferred startup (schema + background workers on the first request)
+_services_lock = threading.Lock()
+
+@bp.before_app_request
+def start_services():
+  """Runs once per process; a flag check on every later request"""
+  extensions = current_app.extensions
+  if extensions.get('services_started'):
+    return
+  with _services_lock:
+    if extensions.get('services_started'):
+      return
+    get_database().ensure_schema()
+    # In-process job workers (set JOB_WORKERS=0 to use `flask run-jobs` only)
+    get_jobs().start()
+    # In-process mail sender (set MAIL_SENDER=0 to use `flask send-mail` only)
+    if os.getenv('MAIL_SENDER', '1') == '1':
+      extensions['outbox'].start()
+    extensions['pricing'].start()
+    extensions['services_started'] = True
+
+
+# ToDo: Job handlers, registered on every app's JobQueue by create_app
+JOB_HANDLERS = {
+  'contrat': run_contract_job,
+  'fiche': run_fiche_job,
+  'batch': run_batch_job,
+}
+
 if __name__ == "__main__":
-  app.run(debug=True, port=5002)
\ No newline at end of file
+  create_app().run(debug=True, port=5002)
\ No newline at end of file
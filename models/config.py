@@ -1,15 +1,62 @@
 from models.models import db
+from models.migrations import run_migrations
+from models.instrumentation import init_query_stats
 import os
+import threading
+import click
+
+
+def engine_options(uri):
+  """Pool settings from the environment (DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_PRE_PING, DB_POOL_RECYCLE)"""
+  options = {
+      'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', '1') == '1',
+      'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+  }
+  # SQLite does not use a sized QueuePool
+  if not uri.startswith('sqlite'):
+    options['pool_size'] = int(os.getenv('DB_POOL_SIZE', 5))
+    options['max_overflow'] = int(os.getenv('DB_MAX_OVERFLOW', 10))
+    options['pool_timeout'] = int(os.getenv('DB_POOL_TIMEOUT', 30))
+  return options
+
 
 class CheckDataBase:
-  """Initiate db"""
+  """
+  Initiate db. The schema is not touched here (no I/O at import): it is
+  created by `flask init-db` or by `ensure_schema` on first use.
+  """
   def __init__(self, app):
     self.app = app
-    self.app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv(
-            'DATABASE_URL', 'sqlite:///controls.db'
-        )
+    uri = self.app.config.get('SQLALCHEMY_DATABASE_URI') or os.getenv('DATABASE_URL', 'sqlite:///controls.db')
+    self.app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    self.app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(uri)
     self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     db.init_app(self.app)
+    self.app.extensions['check_database'] = self
+
+    self._ready = False
+    self._lock = threading.Lock()
 
     with self.app.app_context():
-      db.create_all()
\ No newline at end of file
+      init_query_stats(self.app, db.engine)
+
+    @self.app.cli.command('init-db')
+    def init_db():
+      """Create the tables and apply pending migrations."""
+      applied = self.create_schema()
+      click.echo(f"Schema ready ({len(applied)} migration(s) applied)")
+
+  def create_schema(self):
+    with self.app.app_context():
+      db.create_all()
+      applied = run_migrations(db.engine)
+    self._ready = True
+    return applied
+
+  def ensure_schema(self):
+    """Create the schema once per process (cheap no-op afterwards)"""
+    if self._ready:
+      return
+    with self._lock:
+      if not self._ready:
+        self.create_schema()
@@ -0,0 +1,108 @@
+from collections import Counter
+import logging
+import os
+import re
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Count and time every statement issued while handling a request
+DB_QUERY_STATS = os.getenv("DB_QUERY_STATS", "1") == "1"
+# Expose the counters as X-DB-Queries / X-DB-Time-Ms response headers
+# (opt-in: they tell any client how much database work a page does)
+DB_QUERY_HEADERS = os.getenv("DB_QUERY_HEADERS", "0") == "1"
+# Log requests spending more than this in the database (0 disables)
+DB_SLOW_REQUEST_MS = float(os.getenv("DB_SLOW_REQUEST_MS", 500))
+# Opt-in N+1 detector: warn when one request runs the same statement more
+# than this many times (0 disables)
+DB_N_PLUS_ONE_THRESHOLD = int(os.getenv("DB_N_PLUS_ONE_THRESHOLD", 0))
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+_IN_LISTS = re.compile(r"\bIN\s*\([^)]*\)", re.IGNORECASE)
+_SPACES = re.compile(r"\s+")
+
+
+def _shape(statement: str) -> str:
+    """Statement with literals and IN lists collapsed, to group similar queries."""
+    statement = _IN_LISTS.sub("IN (...)", statement)
+    statement = _LITERALS.sub("?", statement)
+    return _SPACES.sub(" ", statement).strip()
+
+
+class QueryStats:
+    """Statement count and database time of the current request (kept on flask.g)."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+
+    def record(self, statement: str, seconds: float) -> None:
+        self.count += 1
+        self.seconds += seconds
+        if DB_N_PLUS_ONE_THRESHOLD:
+            self.shapes[_shape(statement)] += 1
+
+
+def current_stats():
+    """QueryStats of the request being handled, or None outside of a request."""
+    if not has_request_context():
+        return None
+    return g.get("query_stats")
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the execution context: a statement that raises leaves nothing behind
+    if context is not None and has_request_context() and "query_stats" in g:
+        context._query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_query_start", None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    stats = current_stats()
+    if stats is not None:
+        stats.record(statement, elapsed)
+
+
+def _start_request():
+    g.query_stats = QueryStats()
+
+
+def _finish_request(response):
+    stats = g.pop("query_stats", None)
+    if stats is None:
+        return response
+
+    elapsed_ms = stats.seconds * 1000
+    if DB_QUERY_HEADERS:
+        response.headers["X-DB-Queries"] = str(stats.count)
+        response.headers["X-DB-Time-Ms"] = f"{elapsed_ms:.1f}"
+
+    logger.debug("%s %s: %d queries, %.1f ms", request.method, request.path, stats.count, elapsed_ms)
+    if DB_SLOW_REQUEST_MS and elapsed_ms > DB_SLOW_REQUEST_MS:
+        logger.warning("Slow request %s %s: %d queries, %.1f ms in the database",
+                       request.method, request.path, stats.count, elapsed_ms)
+
+    if DB_N_PLUS_ONE_THRESHOLD:
+        for shape, count in stats.shapes.most_common():
+            if count <= DB_N_PLUS_ONE_THRESHOLD:
+                break
+            logger.warning("Possible N+1 on %s %s: %d x %s",
+                           request.method, request.path, count, shape[:300])
+    return response
+
+
+def init_query_stats(app, engine) -> None:
+    """Hook the statement timers on `engine` and the per-request bookkeeping on `app`."""
+    if not DB_QUERY_STATS:
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
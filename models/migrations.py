@@ -0,0 +1,101 @@
+from datetime import datetime
+import logging
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select
+
+from core import store
+from models.models import db, Check, CheckFile
+
+logger = logging.getLogger(__name__)
+
+# Schema changes for databases created before a table/index was declared.
+# `db.create_all()` only creates missing tables, so anything added to an
+# existing table (indexes, columns, backfills) goes here. Each migration runs
+# once and is recorded in `schema_migrations`; it must be safe on a fresh
+# database where create_all already built the final schema.
+_meta = MetaData()
+schema_migrations = Table(
+    "schema_migrations", _meta,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(120), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def _create_index(connection, table: str, name: str) -> None:
+    existing = {index["name"] for index in inspect(connection).get_indexes(table)}
+    if name in existing:
+        return
+    index = next(i for i in db.metadata.tables[table].indexes if i.name == name)
+    index.create(connection)
+
+
+def add_checks_user_created_index(connection) -> None:
+    _create_index(connection, "checks", "ix_checks_user_created_id")
+
+
+def check_file_rows(check_id: int, module: str, input_files: str, output_files: str) -> list:
+    """CheckFile rows of a check from its legacy 'fiche;contract' style columns."""
+    names = [name for name in (input_files or "").split(";") if name]
+    roles = ["fiche", "contract"] if module == "fiche" else ["contract"]
+    rows = [{"check_id": check_id, "role": role, "filename": name}
+            for role, name in zip(roles, names)]
+    if output_files:
+        rows.append({"check_id": check_id, "role": "report", "filename": output_files})
+
+    for row in rows:
+        row["digest"] = None
+        if row["role"] != "report":
+            try:
+                row["digest"] = store.digest_for(row["filename"])
+            except FileNotFoundError:
+                pass
+    return rows
+
+
+def backfill_check_files(connection, batch_size: int = 1000) -> None:
+    checks = Check.__table__
+    check_files = CheckFile.__table__
+    last_id = 0
+    while True:
+        batch = connection.execute(
+            select(checks.c.id, checks.c.module, checks.c.input_files, checks.c.output_files)
+            .where(checks.c.id > last_id)
+            .where(~select(check_files.c.id).where(check_files.c.check_id == checks.c.id).exists())
+            .order_by(checks.c.id)
+            .limit(batch_size)
+        ).all()
+        if not batch:
+            break
+        rows = [row for check in batch for row in check_file_rows(*check)]
+        if rows:
+            connection.execute(check_files.insert(), rows)
+        last_id = batch[-1].id
+
+
+# (version, migration); versions are never reused or reordered
+MIGRATIONS = [
+    (1, add_checks_user_created_index),
+    (2, backfill_check_files),
+]
+
+
+def run_migrations(engine) -> list:
+    """Apply pending migrations in order; returns the versions applied."""
+    _meta.create_all(engine)
+    applied = []
+
+    with engine.begin() as connection:
+        done = {row.version for row in connection.execute(schema_migrations.select())}
+
+    for version, migration in MIGRATIONS:
+        if version in done:
+            continue
+        with engine.begin() as connection:
+            migration(connection)
+            connection.execute(schema_migrations.insert().values(
+                version=version, name=migration.__name__, applied_at=datetime.now(),
+            ))
+        logger.info("Applied migration %s (%s)", version, migration.__name__)
+        applied.append(version)
+    return applied
@@ -1,6 +1,6 @@
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import relationship, DeclarativeBase, Mapped, mapped_column
-from sqlalchemy import Integer, String, Text, ForeignKey, Boolean, DateTime
+from sqlalchemy import Integer, String, Text, ForeignKey, Boolean, DateTime, Index
 from flask_login import UserMixin
 from datetime import datetime
 
@@ -38,4 +38,91 @@ class Check(db.Model):
   has_paid: Mapped[bool] = mapped_column(Boolean, default=False)
   result: Mapped[str] = mapped_column(Text, nullable=True)
   detail: Mapped[str] = mapped_column(Text, nullable=True)
-  created_at: Mapped[str] = mapped_column(DateTime, default=datetime.now)
\ No newline at end of file
+  created_at: Mapped[str] = mapped_column(DateTime, default=datetime.now)
+  files = relationship("CheckFile", back_populates="check", cascade="all, delete-orphan")
+
+  def add_file(self, role, filename, digest=None):
+    """Attach an input file or report to the check (see CheckFile roles)"""
+    self.files.append(CheckFile(role=role, filename=filename, digest=digest))
+
+
+# Dashboard listing: checks of one user, newest first (keyset pagination)
+Index("ix_checks_user_created_id", Check.user_id, Check.created_at.desc(), Check.id.desc())
+
+
+class CheckFile(db.Model):
+  __tablename__ = "check_files"
+
+  # Files used or produced by a check, one row per file
+  # (role: 'contract', 'fiche' or 'report')
+  id: Mapped[int] = mapped_column(Integer, primary_key=True)
+  check_id: Mapped[int] = mapped_column(Integer, db.ForeignKey("checks.id"), nullable=False, index=True)
+  check = relationship("Check", back_populates="files")
+  role: Mapped[str] = mapped_column(String(20), nullable=False)
+  filename: Mapped[str] = mapped_column(String(255), nullable=False)
+  digest: Mapped[str] = mapped_column(String(64), nullable=True)
+
+  __table_args__ = (
+      Index("ix_check_files_filename_role", "filename", "role"),
+      Index("ix_check_files_digest_role", "digest", "role"),
+  )
+
+
+class Job(db.Model):
+  __tablename__ = "jobs"
+
+  # Background analysis job, filled in by core.jobs workers
+  id: Mapped[int] = mapped_column(Integer, primary_key=True)
+  check_id: Mapped[int] = mapped_column(Integer, db.ForeignKey("checks.id"), nullable=True, index=True)
+  check = relationship("Check")
+  user_id: Mapped[int] = mapped_column(Integer, db.ForeignKey("users.id"), nullable=True, index=True)
+
+  module: Mapped[str] = mapped_column(String(30), nullable=False)
+  payload: Mapped[str] = mapped_column(Text, nullable=False, default="{}")
+  status: Mapped[str] = mapped_column(String(20), nullable=False, default="pending", index=True)
+  attempts: Mapped[int] = mapped_column(Integer, default=0)
+  error: Mapped[str] = mapped_column(Text, nullable=True)
+  progress: Mapped[int] = mapped_column(Integer, default=0)
+  total: Mapped[int] = mapped_column(Integer, default=0)
+  result: Mapped[str] = mapped_column(Text, nullable=True)
+  # Analysis text generated so far, read by the SSE endpoint of every process
+  partial: Mapped[str] = mapped_column(Text, nullable=True)
+  created_at: Mapped[str] = mapped_column(DateTime, default=datetime.now)
+  started_at: Mapped[str] = mapped_column(DateTime, nullable=True)
+  # Bumped while the job runs; a running job without recent heartbeat was lost
+  heartbeat_at: Mapped[str] = mapped_column(DateTime, nullable=True)
+  finished_at: Mapped[str] = mapped_column(DateTime, nullable=True)
+
+
+class OutgoingEmail(db.Model):
+  __tablename__ = "outgoing_emails"
+
+  # Mail outbox, delivered by emails.outbox senders
+  id: Mapped[int] = mapped_column(Integer, primary_key=True)
+  # Unique: concurrent enqueues of the same message insert it only once
+  dedup_key: Mapped[str] = mapped_column(String(128), nullable=False, index=True, unique=True)
+  recipient: Mapped[str] = mapped_column(String(255), nullable=False)
+  subject: Mapped[str] = mapped_column(String(255), nullable=False)
+  html: Mapped[str] = mapped_column(Text, nullable=False)
+  text: Mapped[str] = mapped_column(Text, nullable=True)
+  status: Mapped[str] = mapped_column(String(20), nullable=False, default="pending")
+  attempts: Mapped[int] = mapped_column(Integer, default=0)
+  error: Mapped[str] = mapped_column(Text, nullable=True)
+  next_attempt_at: Mapped[str] = mapped_column(DateTime, default=datetime.now)
+  created_at: Mapped[str] = mapped_column(DateTime, default=datetime.now)
+  sent_at: Mapped[str] = mapped_column(DateTime, nullable=True)
+
+  __table_args__ = (
+      Index("ix_outgoing_emails_status_next", "status", "next_attempt_at"),
+  )
+
+
+class ProcessedSession(db.Model):
+  __tablename__ = "processed_sessions"
+
+  # Ledger of paid Stripe checkout sessions: a row means the session's job
+  # was released, so a webhook retry or a page refresh never runs it again
+  session_id: Mapped[str] = mapped_column(String(255), primary_key=True)
+  job_id: Mapped[int] = mapped_column(Integer, db.ForeignKey("jobs.id"), nullable=False, index=True)
+  job = relationship("Job")
+  created_at: Mapped[str] = mapped_column(DateTime, default=datetime.now)
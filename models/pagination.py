@@ -0,0 +1,74 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import tuple_
+
+
+@dataclass
+class KeysetPage:
+    """One page of a keyset-paginated listing, with opaque cursors to its neighbours."""
+    items: list
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self) -> bool:
+        return self.prev_cursor is not None
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Optional[tuple]:
+    """(created_at, id) of a cursor, or None if it is malformed."""
+    try:
+        raw = urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.split("|")
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def keyset_paginate(query, model, per_page: int, after: str = None, before: str = None) -> KeysetPage:
+    """
+    Page through `query` newest first on (created_at, id).
+
+    `after` returns the rows following a cursor, `before` the rows preceding
+    it; with neither, the first page. Each page is one index range scan on
+    (user_id, created_at DESC, id), whatever its depth, unlike OFFSET which
+    reads and discards every row before the page.
+    """
+    key = tuple_(model.created_at, model.id)
+    after_key = decode_cursor(after) if after else None
+    before_key = decode_cursor(before) if before else None
+
+    if before_key:
+        rows = (query.filter(key > tuple_(*before_key))
+                .order_by(model.created_at.asc(), model.id.asc())
+                .limit(per_page + 1).all())
+        has_more = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        has_prev, has_next = has_more, True
+    else:
+        if after_key:
+            query = query.filter(key < tuple_(*after_key))
+        rows = (query.order_by(model.created_at.desc(), model.id.desc())
+                .limit(per_page + 1).all())
+        items = rows[:per_page]
+        has_prev, has_next = after_key is not None, len(rows) > per_page
+
+    page = KeysetPage(items=items)
+    if items:
+        if has_next:
+            page.next_cursor = encode_cursor(items[-1].created_at, items[-1].id)
+        if has_prev:
+            page.prev_cursor = encode_cursor(items[0].created_at, items[0].id)
+    return page
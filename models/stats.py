@@ -0,0 +1,62 @@
+from sqlalchemy import event, func, case
+import os
+import threading
+import time
+
+from models.models import db, Check
+
+# Per-user dashboard counters, computed in SQL and cached in process.
+# Inserts/updates of checks in this process invalidate the user's entry;
+# the TTL bounds staleness for writes made by other processes (job workers).
+STATS_TTL = float(os.getenv("DASHBOARD_STATS_TTL", 30))
+
+_cache = {}
+_lock = threading.Lock()
+
+
+def invalidate(user_id) -> None:
+    with _lock:
+        _cache.pop(user_id, None)
+
+
+def user_check_stats(user_id) -> dict:
+    """
+    Return {"total", "paid", "conforme", "non_conforme"} for every check
+    of `user_id` with one GROUP BY query.
+    """
+    now = time.monotonic()
+    with _lock:
+        cached = _cache.get(user_id)
+        if cached and cached[0] > now:
+            return cached[1]
+
+    result_key = func.lower(Check.result)
+    rows = db.session.execute(
+        db.select(
+            result_key,
+            func.count(Check.id),
+            func.sum(case((Check.has_paid.is_(True), 1), else_=0)),
+        )
+        .where(Check.user_id == user_id)
+        .group_by(result_key)
+    ).all()
+
+    stats = {"total": 0, "paid": 0, "conforme": 0, "non_conforme": 0}
+    for result, count, paid in rows:
+        stats["total"] += count
+        stats["paid"] += paid or 0
+        if result == "conforme":
+            stats["conforme"] += count
+        elif result == "non conforme":
+            stats["non_conforme"] += count
+
+    with _lock:
+        _cache[user_id] = (now + STATS_TTL, stats)
+    return stats
+
+
+@event.listens_for(Check, "after_insert")
+@event.listens_for(Check, "after_update")
+@event.listens_for(Check, "after_delete")
+def _invalidate_on_write(mapper, connection, target):
+    invalidate(target.user_id)
@@ -0,0 +1,72 @@
+import sys
+from pathlib import Path
+
+# Run from any directory: the application modules live at the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from types import SimpleNamespace
+
+import pytest
+
+
+class FakeCompletions:
+    """`chat.completions` of a fake OpenAI client answering `reply(request)`."""
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.requests = []
+
+    def create(self, stream=False, **request):
+        self.requests.append(request)
+        message = SimpleNamespace(content=self.reply(request))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+@pytest.fixture
+def store_dirs(tmp_path, monkeypatch):
+    """Blob store (core.store) rooted in a temporary directory."""
+    from core import store
+
+    input_dir = tmp_path / "input-files"
+    input_dir.mkdir()
+    monkeypatch.setattr(store, "INPUT_DIR", input_dir)
+    monkeypatch.setattr(store, "BLOB_DIR", input_dir / "blobs")
+    return input_dir
+
+
+@pytest.fixture
+def make_engine(tmp_path):
+    """OpenaiAnalyse on local caches and a fake client (`engine.client.chat.completions`)."""
+    from core.openai_engine import OpenaiAnalyse
+    from core.rate_limit import AdaptiveConcurrency, CallPolicy
+    from core.response_cache import MemoryBackend, ResponseCache
+    from core.text_cache import TextCache
+
+    def make_engine(reply=lambda request: "Conforme", cls=OpenaiAnalyse, **kwargs):
+        client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions(reply)))
+        return cls(
+            text_cache=TextCache(path=tmp_path / "text-cache.sqlite3"),
+            response_cache=ResponseCache(MemoryBackend()),
+            openai_client=client,
+            call_policy=CallPolicy(None, AdaptiveConcurrency()),
+            **kwargs,
+        )
+
+    return make_engine
+
+
+@pytest.fixture
+def app(tmp_path, make_engine):
+    """App on a temporary SQLite database; background services are not started."""
+    import main
+
+    app = main.create_app({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'app.db'}",
+        "SECRET_KEY": "test",
+        "SECURITY_PASSWORD_SALT": "test",
+    }, engine=make_engine())
+    app.extensions["services_started"] = True
+    app.extensions["check_database"].create_schema()
+    with app.app_context():
+        yield app
@@ -0,0 +1,45 @@
+import main
+
+
+def test_factory_builds_independent_apps_without_an_engine(tmp_path):
+    first = main.create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'a.db'}"})
+    second = main.create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'b.db'}"})
+
+    assert first.extensions["engine"] is None
+    assert first.extensions["jobs"] is not second.extensions["jobs"]
+    assert set(first.extensions["jobs"].handlers) == {"contrat", "fiche", "batch"}
+    assert first.config["SQLALCHEMY_DATABASE_URI"] != second.config["SQLALCHEMY_DATABASE_URI"]
+    assert not hasattr(main, "app")
+
+
+def test_engine_is_the_injected_one(app):
+    assert main.get_engine() is app.extensions["engine"]
+
+
+def test_public_pages_render(app):
+    client = app.test_client()
+    for url in ("/", "/login", "/register", "/cgu"):
+        assert client.get(url).status_code == 200
+    assert client.get("/dashboard").headers["Location"].endswith("/login")
+
+
+def test_lazy_report_is_rendered_through_the_engine(app, tmp_path, monkeypatch):
+    from core import report
+    from models.models import Check, User, db
+
+    monkeypatch.setattr(report, "_report_cache", report.ReportCache(tmp_path / "output-files"))
+    rendered = []
+    engine = app.extensions["engine"]
+    monkeypatch.setattr(engine, "render_report", lambda result: rendered.append(result) or b"%PDF-1.4")
+    user = User(username="u", email="u@example.com", password_hash="x", confirmed_email=True)
+    check = Check(module="contrat", input_files="c.pdf", has_paid=True, user=user, result="Conforme", detail="")
+    check.add_file("report", "report_abc.pdf")
+    db.session.add_all([user, check])
+    db.session.commit()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = str(user.id)
+
+    assert client.get("/download/report_abc.pdf").data == b"%PDF-1.4"
+    assert client.get("/download/report_abc.pdf").data == b"%PDF-1.4"  # from the report cache
+    assert rendered == [{"result": "Conforme", "detail": ""}]
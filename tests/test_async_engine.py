@@ -0,0 +1,110 @@
+import io
+import json
+import threading
+from types import SimpleNamespace
+
+from core import store
+from core.async_engine import AsyncOpenaiAnalyse
+
+
+class FakeAsyncCompletions:
+    def __init__(self, reply):
+        self.reply = reply
+        self.requests = []
+
+    async def create(self, stream=False, **request):
+        self.requests.append(request)
+        if stream:
+            return self._chunks(self.reply(request))
+        message = SimpleNamespace(content=self.reply(request))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    @staticmethod
+    async def _chunks(content):
+        for start in range(0, len(content), 8):
+            delta = SimpleNamespace(content=content[start:start + 8])
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+
+def _async_engine(make_engine, reply=lambda request: json.dumps({"result": "Conforme", "detail": "RAS"})):
+    client = SimpleNamespace(chat=SimpleNamespace(completions=FakeAsyncCompletions(reply)))
+    engine = make_engine(cls=AsyncOpenaiAnalyse, async_client=client)
+    engine.report_mode = "lazy"
+    engine.payslip_precheck = False
+    return engine
+
+
+def _stored(engine, text):
+    filename = store.put(io.BytesIO(text.encode()), 1, ".pdf")
+    engine.text_cache.put(store.digest_for(filename), text)
+    return filename
+
+
+def test_both_documents_are_read_concurrently(make_engine, store_dirs, monkeypatch):
+    engine = _async_engine(make_engine)
+    # Each read waits for the other one: a serial read would time out here
+    both_reading = threading.Barrier(2, timeout=5)
+    read = engine._read_file
+
+    def slow_read(filename, max_tokens=None):
+        both_reading.wait()
+        return read(filename, max_tokens)
+
+    monkeypatch.setattr(engine, "_read_file", slow_read)
+    result = engine.analyse_fiche(_stored(engine, "Fiche"), _stored(engine, "Contrat"), "Vérifie")
+
+    assert result["result"] == "Conforme"
+
+
+def test_report_is_rendered_while_on_result_runs(make_engine, store_dirs, monkeypatch):
+    engine = _async_engine(make_engine)
+    overlap = threading.Barrier(2, timeout=5)
+    render = engine._generate_report_file
+
+    def slow_render(ai_result):
+        overlap.wait()
+        return render(ai_result)
+
+    saved = []
+    monkeypatch.setattr(engine, "_generate_report_file", slow_render)
+    result = engine.analyse_fiche(_stored(engine, "Fiche"), _stored(engine, "Contrat"), "Vérifie",
+                                  on_result=lambda ai_result: (overlap.wait(), saved.append(ai_result["result"])))
+
+    assert saved == ["Conforme"]
+    assert result["report_file"].endswith(".pdf")
+
+
+def test_streamed_text_is_handled_off_the_event_loop(make_engine, store_dirs):
+    engine = _async_engine(make_engine)
+    engine.stream = True
+
+    async def current_thread():
+        return threading.get_ident()
+
+    loop_thread = engine._run(current_thread())
+    seen = []
+
+    result = engine.analyse_fiche(_stored(engine, "Fiche"), _stored(engine, "Contrat"), "Vérifie",
+                                  on_text=lambda text: seen.append((threading.get_ident(), text)))
+
+    assert result["result"] == "Conforme"
+    assert len(seen) > 1 and all(thread != loop_thread for thread, _ in seen)
+    assert json.loads(seen[-1][1]) == {"result": "Conforme", "detail": "RAS"}
+
+
+def test_batch_keeps_input_order_and_isolates_failures(make_engine, store_dirs):
+    engine = make_engine(reply=lambda request: json.dumps({"result": "Conforme", "detail": "RAS"}))
+    engine.report_mode = "lazy"
+    engine.payslip_precheck = False
+    contract = _stored(engine, "Contrat")
+    fiches = [_stored(engine, f"Fiche {month}") for month in ("janvier", "février", "mars")]
+    progress = []
+
+    results = engine.analyse_batch(contract, fiches[:2] + ["missing.pdf"] + fiches[2:], "Vérifie",
+                                   max_in_flight=2, progress=lambda done, total: progress.append((done, total)))
+
+    assert [r["fiche_file"] for r in results] == fiches[:2] + ["missing.pdf"] + fiches[2:]
+    assert [r["status"] for r in results] == ["ok", "ok", "error", "ok"]
+    assert progress == [(1, 4), (2, 4), (3, 4), (4, 4)]
+    # The contract is read once for the whole batch
+    assert engine.text_cache.stats()["hits"] == 4
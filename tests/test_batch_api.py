@@ -0,0 +1,74 @@
+import io
+import json
+
+import pytest
+
+from core import batch_api, store
+from models.models import Job, User, db
+
+
+def _stored_document(engine, text, ext=".pdf"):
+    filename = store.put(io.BytesIO(text.encode()), 1, ext)
+    engine.text_cache.put(store.digest_for(filename), text)
+    return filename
+
+
+@pytest.fixture
+def batch_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch_api, "BATCH_DIR", tmp_path / "batch-files")
+    return tmp_path / "batch-files"
+
+
+def test_local_batch_round_trip(make_engine, store_dirs, batch_dir):
+    engine = make_engine()
+    engine.report_mode = "lazy"
+    contract = _stored_document(engine, "Contrat de travail, 35 heures par semaine.")
+    fiches = [_stored_document(engine, f"Fiche de paie {month}") for month in ("janvier", "février")]
+
+    lines = batch_api.prepare_fiche_batch(engine, 7, contract, fiches, "Vérifie la fiche")
+    assert [batch_api.parse_custom_id(custom_id)[:2] for custom_id, _ in lines] == [(7, 0), (7, 1)]
+
+    client = batch_api.LocalBatchClient()
+    batch_id = batch_api.submit(client, batch_api.write_requests(lines))
+    messages = batch_api.fetch(client, batch_id)
+    results = batch_api.collect_fiche_batch(engine, 7, fiches, messages)
+
+    assert [r["fiche_file"] for r in results] == fiches
+    assert all(r["status"] == "ok" and r["result"] == "Conforme" for r in results)
+    assert not engine.client.chat.completions.requests  # answered by the batch, not the live API
+
+
+def test_missing_answer_is_a_per_item_error(make_engine, store_dirs, batch_dir):
+    engine = make_engine()
+    engine.report_mode = "lazy"
+    fiches = ["a.pdf", "b.pdf"]
+    messages = {batch_api.make_custom_id(7, 0, 1, 1): json.dumps({"result": "Conforme", "detail": ""}),
+                batch_api.make_custom_id(7, 1, 1, 1): None}
+
+    results = batch_api.collect_fiche_batch(engine, 7, fiches, messages)
+
+    assert [r["status"] for r in results] == ["ok", "error"]
+
+
+def test_submit_local_only_collects_its_own_batch(app, store_dirs, batch_dir):
+    engine = app.extensions["engine"]
+    engine.report_mode = "lazy"
+    user = User(username="u", email="u@example.com", password_hash="x", confirmed_email=True)
+    db.session.add(user)
+    db.session.commit()
+
+    contract = _stored_document(engine, "Contrat de travail")
+    fiche = _stored_document(engine, "Fiche de paie")
+    payload = {"contract_name": contract, "fiche_names": [fiche], "hours": None}
+    remote = Job(module="batch", status="batched", user_id=user.id,
+                 payload=json.dumps(dict(payload, batch_id="batch_remote123")))
+    deferred = Job(module="batch", status="deferred", user_id=user.id, payload=json.dumps(payload))
+    db.session.add_all([remote, deferred])
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=["batch-submit", "--local"])
+
+    assert result.exit_code == 0, result.output
+    db.session.expire_all()
+    assert db.session.get(Job, deferred.id).status == "done"
+    assert db.session.get(Job, remote.id).status == "batched"  # left to batch-collect
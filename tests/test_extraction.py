@@ -0,0 +1,32 @@
+from reportlab.pdfgen import canvas
+
+from core import extraction
+
+
+def _pdf(path, pages):
+    pdf = canvas.Canvas(str(path))
+    for page in range(1, pages + 1):
+        pdf.drawString(72, 720, f"Page {page}")
+        pdf.showPage()
+    pdf.save()
+    return path
+
+
+def test_pool_does_not_fork(monkeypatch):
+    monkeypatch.setattr(extraction, "_pool", None)
+    try:
+        pool = extraction._get_pool(1)
+        assert pool._mp_context.get_start_method() in ("forkserver", "spawn")
+    finally:
+        extraction.shutdown_pool()
+
+
+def test_parallel_extraction_keeps_page_order(tmp_path):
+    path = _pdf(tmp_path / "long.pdf", 10)
+    try:
+        pages = list(extraction.iter_pdf_pages(path, workers=2, threshold=1, batch_pages=3))
+    finally:
+        extraction.shutdown_pool()
+
+    assert [page.strip() for page in pages] == [f"Page {i}" for i in range(1, 11)]
+    assert pages == extraction.extract_pdf_pages(path, workers=1)
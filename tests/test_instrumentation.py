@@ -0,0 +1,44 @@
+from itertools import count
+from types import SimpleNamespace
+
+import pytest
+from flask import g
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from models import instrumentation
+from models.instrumentation import current_stats
+from models.models import db
+
+
+def test_failed_statement_does_not_skew_the_next_timing(app, monkeypatch):
+    # Every clock read is 100 s after the previous one
+    clock = count(step=100)
+    monkeypatch.setattr(instrumentation, "time", SimpleNamespace(perf_counter=lambda: next(clock)))
+    with app.test_request_context("/"):
+        app.preprocess_request()
+        with pytest.raises(OperationalError):
+            db.session.execute(text("SELECT * FROM no_such_table"))
+        db.session.rollback()
+        db.session.execute(text("SELECT 1"))
+
+        stats = current_stats()
+        # Timed from its own start, not from the start of the failed statement
+        assert stats.count == 1
+        assert stats.seconds == 100
+        g.pop("query_stats")
+
+
+def test_statements_outside_requests_are_not_counted(app):
+    db.session.execute(text("SELECT 1"))
+    assert current_stats() is None
+
+
+def test_query_headers_are_opt_in(app, monkeypatch):
+    client = app.test_client()
+    assert "X-DB-Queries" not in client.get("/login").headers
+
+    monkeypatch.setattr(instrumentation, "DB_QUERY_HEADERS", True)
+    response = client.get("/login")
+    assert int(response.headers["X-DB-Queries"]) >= 0
+    assert "X-DB-Time-Ms" in response.headers
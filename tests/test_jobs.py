@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+import time
+
+from core import jobs as jobs_module
+from models.models import Job, db
+
+
+def _running(started, heartbeat):
+    job = Job(module="batch", status="running", payload="{}", attempts=1,
+              started_at=datetime.now() - started, heartbeat_at=datetime.now() - heartbeat)
+    db.session.add(job)
+    db.session.commit()
+    return job.id
+
+
+def test_long_running_job_with_a_heartbeat_is_not_requeued(app):
+    jobs = app.extensions["jobs"]
+    alive = _running(started=timedelta(hours=2), heartbeat=timedelta(minutes=1))
+    lost = _running(started=timedelta(hours=2), heartbeat=timedelta(hours=1))
+
+    jobs._requeue_stale()
+
+    db.session.expire_all()
+    assert db.session.get(Job, alive).status == "running"
+    assert db.session.get(Job, lost).status == "pending"
+
+
+def test_running_handler_refreshes_its_heartbeat(app, monkeypatch):
+    monkeypatch.setattr(jobs_module, "JOB_HEARTBEAT_SECONDS", 0.05)
+    jobs = app.extensions["jobs"]
+    beats = []
+
+    def slow_handler(job, data):
+        claimed = db.session.scalar(db.select(Job.heartbeat_at).where(Job.id == job.id))
+        time.sleep(0.3)
+        db.session.expire_all()
+        beats.append((claimed, db.session.scalar(db.select(Job.heartbeat_at).where(Job.id == job.id))))
+
+    jobs.handler("slow")(slow_handler)
+    jobs.submit("slow", {})
+    job_id = jobs._claim_next()
+    jobs._run(job_id)
+
+    (claimed, during), = beats
+    assert during > claimed
+    assert db.session.get(Job, job_id).status == "done"
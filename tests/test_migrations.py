@@ -0,0 +1,34 @@
+from sqlalchemy import create_engine, insert, select
+
+from models.migrations import backfill_check_files
+from models.models import Check, CheckFile, db
+
+
+def test_backfill_splits_legacy_input_files_by_role(tmp_path, store_dirs):
+    (store_dirs / "fiche.pdf").write_bytes(b"fiche")
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    db.metadata.create_all(engine)
+    checks = Check.__table__
+    with engine.begin() as connection:
+        connection.execute(insert(checks), [
+            {"id": 1, "user_id": 1, "module": "fiche", "input_files": "fiche.pdf;contract.pdf", "output_files": "report_1.pdf"},
+            {"id": 2, "user_id": 1, "module": "contrat", "input_files": "contract.pdf", "output_files": None},
+        ])
+        backfill_check_files(connection, batch_size=1)
+
+    files = CheckFile.__table__
+    with engine.connect() as connection:
+        rows = connection.execute(
+            select(files.c.check_id, files.c.role, files.c.filename, files.c.digest).order_by(files.c.id)
+        ).all()
+    assert [tuple(row[:3]) for row in rows] == [
+        (1, "fiche", "fiche.pdf"), (1, "contract", "contract.pdf"), (1, "report", "report_1.pdf"),
+        (2, "contract", "contract.pdf"),
+    ]
+    assert rows[0].digest and rows[1].digest is None  # contract.pdf is not on disk
+
+    with engine.begin() as connection:
+        backfill_check_files(connection)  # checks that already have rows are skipped
+    with engine.connect() as connection:
+        assert len(connection.execute(select(files.c.id)).all()) == 4
+
@@ -0,0 +1,44 @@
+import io
+
+from core import store
+from core.extraction import TRUNCATION_MARKER
+
+
+def _stored_document(engine, text, ext=".pdf"):
+    """Store an upload whose extracted text is already in the engine's text cache."""
+    filename = store.put(io.BytesIO(text.encode()), 1, ext)
+    engine.text_cache.put(store.digest_for(filename), text)
+    return filename
+
+
+def _long_contract(articles):
+    return "\n\n".join(f"Article {i}\n" + f"Clause numéro {i}. " * 60 for i in range(1, articles + 1))
+
+
+def test_contract_above_the_request_budget_is_chunked_not_cut(make_engine, store_dirs):
+    engine = make_engine()
+    engine.report_mode = "lazy"
+    engine.token_budget, engine.chunk_tokens = 2000, 1000
+    completions = engine.client.chat.completions
+
+    filename = _stored_document(engine, _long_contract(40))  # ~12k tokens
+    result = engine.analyse_contract(filename, "Analyse ce contrat")
+
+    sent = "".join(r["messages"][-1]["content"] for r in completions.requests)
+    assert len(completions.requests) > 1
+    assert "Article 40" in sent
+    assert "tronqué" not in sent
+    assert result["result"] == "Conforme"
+
+
+def test_document_bound_caps_the_map_reduce_total(make_engine, store_dirs):
+    engine = make_engine()
+    engine.report_mode = "lazy"
+    engine.token_budget, engine.chunk_tokens, engine.document_tokens = 2000, 1000, 3000
+
+    filename = _stored_document(engine, _long_contract(40))
+    engine.analyse_contract(filename, "Analyse ce contrat")
+
+    sent = "".join(r["messages"][-1]["content"] for r in engine.client.chat.completions.requests)
+    assert TRUNCATION_MARKER.format(tokens=3000).strip() in sent
+    assert "Article 40" not in sent
@@ -0,0 +1,163 @@
+from datetime import datetime, timedelta
+
+import smtplib
+
+import pytest
+
+from emails import outbox as outbox_module
+from emails.registry import RenderedEmail
+from models.models import OutgoingEmail, db
+
+MESSAGE = RenderedEmail("Sujet", "<p>Bonjour</p>", "Bonjour")
+
+
+class FakeSender:
+    """SMTPSender stand-in failing the first `failures` sends."""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.sent = []
+
+    def send(self, recipient, raw):
+        if self.failures:
+            self.failures -= 1
+            raise OSError("connection refused")
+        self.sent.append(recipient)
+
+    def close(self):
+        pass
+
+
+class FakeSMTP:
+    """smtplib.SMTP stand-in recording connections; `drop` disconnects the next sendmail."""
+    connections = []
+
+    def __init__(self, host, port, timeout=None):
+        self.logins = []
+        self.sent = []
+        self.drop = False
+        self.quit_called = False
+        FakeSMTP.connections.append(self)
+
+    def starttls(self):
+        pass
+
+    def login(self, user, password):
+        self.logins.append(user)
+
+    def sendmail(self, sender, recipients, raw):
+        if self.drop:
+            raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+        self.sent.extend(recipients)
+
+    def quit(self):
+        self.quit_called = True
+
+
+@pytest.fixture
+def smtp(monkeypatch):
+    monkeypatch.setattr(FakeSMTP, "connections", [])
+    monkeypatch.setattr(outbox_module.smtplib, "SMTP", FakeSMTP)
+    return FakeSMTP.connections
+
+
+@pytest.fixture
+def outbox(app):
+    return app.extensions["outbox"]
+
+
+def _emails():
+    return db.session.scalars(db.select(OutgoingEmail).order_by(OutgoingEmail.id)).all()
+
+
+def test_explicit_dedup_key_is_sent_once(outbox):
+    assert outbox.enqueue("a@example.com", MESSAGE, dedup_key="payment-check-1") is not None
+    assert outbox.enqueue("a@example.com", MESSAGE, dedup_key="payment-check-1") is None
+    assert len(_emails()) == 1
+
+
+def test_concurrent_enqueue_is_inserted_once(outbox, monkeypatch):
+    outbox.enqueue("a@example.com", MESSAGE, dedup_key="payment-check-1")
+    # Both requests passed the check before either inserted
+    monkeypatch.setattr(outbox, "_is_duplicate", lambda key, previous_key=None: False)
+
+    assert outbox.enqueue("a@example.com", MESSAGE, dedup_key="payment-check-1") is None
+    assert len(_emails()) == 1
+
+
+def test_same_content_is_dropped_within_the_window_only(outbox):
+    assert outbox.enqueue("a@example.com", MESSAGE) is not None
+    assert outbox.enqueue("a@example.com", MESSAGE) is None
+    assert outbox.enqueue("b@example.com", MESSAGE) is not None
+
+    first = _emails()[0]
+    first.created_at = datetime.now() - outbox_module.MAIL_DEDUP_WINDOW * 2
+    first.dedup_key = outbox_module.content_key("a@example.com", *MESSAGE[:2], first.created_at)
+    db.session.commit()
+    assert outbox.enqueue("a@example.com", MESSAGE) is not None
+
+
+def test_failed_send_is_retried_with_backoff(outbox, monkeypatch):
+    monkeypatch.setattr(outbox_module, "MAIL_RETRY_BASE", 30)
+    email = outbox.enqueue("a@example.com", MESSAGE)
+    sender = FakeSender(failures=1)
+
+    assert outbox.send_due(sender) == 1
+    db.session.refresh(email)
+    assert (email.status, email.attempts, email.error) == ("pending", 1, "connection refused")
+    assert timedelta(seconds=20) < email.next_attempt_at - datetime.now() < timedelta(seconds=40)
+    assert outbox.send_due(sender) == 0  # not due yet
+
+    email.next_attempt_at = datetime.now()
+    db.session.commit()
+    assert outbox.send_due(sender) == 1
+    db.session.refresh(email)
+    assert (email.status, email.attempts, email.error) == ("sent", 2, None)
+    assert sender.sent == ["a@example.com"]
+
+
+def test_send_gives_up_after_max_attempts(outbox, monkeypatch):
+    monkeypatch.setattr(outbox_module, "MAIL_MAX_ATTEMPTS", 2)
+    email = outbox.enqueue("a@example.com", MESSAGE)
+    sender = FakeSender(failures=5)
+
+    for _ in range(2):
+        email.next_attempt_at = datetime.now()
+        db.session.commit()
+        outbox.send_due(sender)
+        db.session.refresh(email)
+
+    assert (email.status, email.attempts) == ("failed", 2)
+    assert sender.sent == []
+
+
+def test_smtp_connection_is_reused_across_messages(smtp):
+    sender = outbox_module.SMTPSender(host="smtp.test", port=587, user="u", password="p")
+
+    sender.send("a@example.com", b"1")
+    sender.send("b@example.com", b"2")
+
+    assert len(smtp) == 1
+    assert smtp[0].sent == ["a@example.com", "b@example.com"]
+    assert smtp[0].logins == ["u"]
+
+
+def test_smtp_reconnects_once_after_a_disconnect(smtp):
+    sender = outbox_module.SMTPSender(host="smtp.test", port=587, user="u", password="p")
+    sender.send("a@example.com", b"1")
+    smtp[0].drop = True
+
+    sender.send("b@example.com", b"2")
+
+    assert len(smtp) == 2
+    assert smtp[1].sent == ["b@example.com"] and smtp[1].logins == ["u"]
+
+
+def test_idle_smtp_connection_is_closed_before_the_next_message(smtp, monkeypatch):
+    monkeypatch.setattr(outbox_module, "SMTP_IDLE_TIMEOUT", -1)
+    sender = outbox_module.SMTPSender(host="smtp.test", port=587, user="u", password="p")
+
+    sender.send("a@example.com", b"1")
+    sender.send("b@example.com", b"2")
+
+    assert len(smtp) == 2 and smtp[0].quit_called
@@ -0,0 +1,56 @@
+from datetime import datetime
+
+import pytest
+
+from models.models import Check, User, db
+from models.pagination import decode_cursor, encode_cursor, keyset_paginate
+
+
+@pytest.fixture
+def user_id(app):
+    user = User(username="u", email="u@example.com", password_hash="x", confirmed_email=True)
+    db.session.add(user)
+    tie = datetime(2024, 1, 2, 12, 0)
+    # Seven checks, five of them created in the same instant
+    for created_at in [datetime(2024, 1, 3)] + [tie] * 5 + [datetime(2024, 1, 1)]:
+        db.session.add(Check(module="fiche", input_files="f.pdf", created_at=created_at, user=user))
+    db.session.commit()
+    return user.id
+
+
+def _query(user_id):
+    return db.session.query(Check).filter_by(user_id=user_id)
+
+
+def _walk_forward(user_id, per_page):
+    pages, cursor = [], None
+    while True:
+        page = keyset_paginate(_query(user_id), Check, per_page, after=cursor)
+        pages.append(page)
+        if not page.has_next:
+            return pages
+        cursor = page.next_cursor
+
+
+def test_pages_cross_created_at_ties_without_gaps_or_repeats(user_id):
+    expected = [c.id for c in _query(user_id).order_by(Check.created_at.desc(), Check.id.desc())]
+
+    pages = _walk_forward(user_id, per_page=2)
+
+    assert [c.id for page in pages for c in page.items] == expected
+    assert not pages[0].has_prev and all(page.has_prev for page in pages[1:])
+
+
+def test_previous_page_mirrors_the_next_one_inside_a_tie(user_id):
+    pages = _walk_forward(user_id, per_page=2)
+
+    for previous, page in zip(pages, pages[1:]):
+        back = keyset_paginate(_query(user_id), Check, 2, before=page.prev_cursor)
+        assert [c.id for c in back.items] == [c.id for c in previous.items]
+        assert back.has_next
+
+
+def test_cursor_round_trip_and_malformed_cursor():
+    created_at = datetime(2024, 1, 2, 12, 0, 30, 5)
+    assert decode_cursor(encode_cursor(created_at, 42)) == (created_at, 42)
+    assert decode_cursor("not-a-cursor") is None
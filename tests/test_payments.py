@@ -0,0 +1,133 @@
+import hashlib
+import hmac
+import json
+import time
+
+import pytest
+
+import main
+from models.models import Check, Job, ProcessedSession, User, db
+
+
+@pytest.fixture
+def awaiting_job(app):
+    user = User(username="u", email="u@example.com", password_hash="x", confirmed_email=True)
+    db.session.add(user)
+    db.session.commit()
+    job = Job(module="contrat", status="awaiting_payment", user_id=user.id,
+              payload=json.dumps({"filename": "contrat.pdf"}))
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def _count(model):
+    return db.session.scalar(db.select(db.func.count()).select_from(model))
+
+
+def test_replayed_session_releases_the_job_once(awaiting_job):
+    first = main.confirm_payment("cs_test_1", awaiting_job.id)
+    check_id = first.check_id
+    # Webhook retry, then the success redirect
+    assert main.confirm_payment("cs_test_1", awaiting_job.id) is first
+    assert main.confirm_payment("cs_test_1", awaiting_job.id) is first
+
+    assert first.status == "pending"
+    assert first.check_id == check_id
+    assert _count(Check) == 1
+    assert _count(ProcessedSession) == 1
+
+
+def test_replay_after_the_job_ran_does_not_requeue_it(awaiting_job):
+    job = main.confirm_payment("cs_test_1", awaiting_job.id)
+    job.status = "done"
+    db.session.commit()
+
+    assert main.confirm_payment("cs_test_1", awaiting_job.id).status == "done"
+    assert _count(Check) == 1
+
+
+def test_concurrent_confirmation_loses_to_the_ledger(awaiting_job, monkeypatch):
+    # The other call recorded the session between our ledger read and insert
+    db.session.add(ProcessedSession(session_id="cs_test_1", job_id=awaiting_job.id))
+    db.session.commit()
+    get = db.session.get
+    missed = []
+
+    def racing_get(model, key):
+        if model is ProcessedSession and not missed:
+            missed.append(key)
+            return None
+        return get(model, key)
+
+    monkeypatch.setattr(db.session, "get", racing_get)
+    job = main.confirm_payment("cs_test_1", awaiting_job.id)
+
+    assert missed == ["cs_test_1"]
+    assert job.id == awaiting_job.id and job.status == "awaiting_payment"
+    assert _count(Check) == 0
+    assert _count(ProcessedSession) == 1
+
+
+WEBHOOK_SECRET = "whsec_test"
+
+
+def _post_event(app, event, secret=WEBHOOK_SECRET, signed_at=None):
+    payload = json.dumps(dict(event, object="event"))
+    signed_at = int(time.time()) if signed_at is None else signed_at
+    signature = hmac.new(secret.encode(), f"{signed_at}.{payload}".encode(), hashlib.sha256).hexdigest()
+    return app.test_client().post("/stripe/webhook", data=payload, content_type="application/json",
+                                  headers={"Stripe-Signature": f"t={signed_at},v1={signature}"})
+
+
+def _checkout_event(job, event_type="checkout.session.completed", payment_status="paid"):
+    return {"id": "evt_1", "type": event_type, "data": {"object": {
+        "id": "cs_test_1", "object": "checkout.session", "payment_status": payment_status,
+        "metadata": {"job_id": str(job.id)},
+    }}}
+
+
+@pytest.fixture
+def webhook(app, monkeypatch):
+    monkeypatch.setattr(main, "STRIPE_WEBHOOK_SECRET", WEBHOOK_SECRET)
+    return app
+
+
+def test_webhook_rejects_a_bad_signature(webhook, awaiting_job):
+    response = _post_event(webhook, _checkout_event(awaiting_job), secret="whsec_other")
+
+    assert response.status_code == 400
+    assert _count(ProcessedSession) == 0
+
+
+def test_webhook_rejects_an_old_signature(webhook, awaiting_job):
+    response = _post_event(webhook, _checkout_event(awaiting_job), signed_at=int(time.time()) - 3600)
+
+    assert response.status_code == 400
+    assert _count(ProcessedSession) == 0
+
+
+def test_paid_checkout_releases_the_job_once(webhook, awaiting_job):
+    event = _checkout_event(awaiting_job)
+
+    assert _post_event(webhook, event).status_code == 200
+    assert _post_event(webhook, event).status_code == 200  # Stripe retry
+
+    db.session.expire_all()
+    assert db.session.get(Job, awaiting_job.id).status == "pending"
+    assert _count(Check) == 1
+    assert _count(ProcessedSession) == 1
+
+
+@pytest.mark.parametrize("event_type, payment_status", [
+    ("checkout.session.completed", "unpaid"),
+    ("checkout.session.expired", "unpaid"),
+    ("payment_intent.succeeded", "paid"),
+])
+def test_unpaid_or_other_events_change_nothing(webhook, awaiting_job, event_type, payment_status):
+    response = _post_event(webhook, _checkout_event(awaiting_job, event_type, payment_status))
+
+    assert response.status_code == 200
+    db.session.expire_all()
+    assert db.session.get(Job, awaiting_job.id).status == "awaiting_payment"
+    assert _count(ProcessedSession) == 0
@@ -0,0 +1,78 @@
+import pytest
+
+from core.payslip_rules import ANOMALY, OK, WARNING, PayslipFigures, check_payslip, parse_number
+
+# Current period column first, then the year-to-date (cumul) column
+FICHE = """BULLETIN DE SALAIRE
+Salaire de base 151,67 11,88 1 801,84 21 622,08
+Heures supplémentaires 25 % 8,67 14,85 128,75 1 545,00
+Salaire brut 1 930,59 23 167,08
+Net à payer avant impôt sur le revenu 1 420,50 17 046,00
+Net payé 1 380,20 16 562,40
+"""
+
+
+def _severities(report):
+    return {finding.rule: finding.severity for finding in report.findings}
+
+
+@pytest.mark.parametrize("token, value", [
+    ("1 801,84", 1801.84), ("1.801,84", 1801.84), ("1 801,84", 1801.84),
+    ("151,67", 151.67), ("11.88", 11.88), ("1.801", 1801),
+])
+def test_parse_number(token, value):
+    assert parse_number(token) == pytest.approx(value)
+
+
+def test_amounts_are_read_from_the_period_column_not_the_cumul():
+    figures = PayslipFigures.parse(FICHE)
+
+    assert figures.gross == pytest.approx(1930.59)
+    assert figures.net == pytest.approx(1420.50)
+    assert (figures.base_hours, figures.base_rate, figures.base_amount) == pytest.approx((151.67, 11.88, 1801.84))
+
+
+def test_hours_columns_are_not_merged_as_thousands():
+    figures = PayslipFigures.parse("Heures travaillées 35 151,67\nTaux horaire 12,50\n")
+
+    assert figures.hours == 35
+    assert figures.hourly_rate == pytest.approx(12.50)
+
+
+def test_overtime_hours_are_added_to_the_base_hours():
+    figures = PayslipFigures.parse(FICHE)
+    assert figures.overtime_hours == pytest.approx(8.67)
+
+    report = check_payslip(FICHE, declared_hours=160)
+    assert _severities(report)["heures"] == OK
+    assert report.verdict is None
+
+
+@pytest.mark.parametrize("declared", [151, 35])
+def test_declared_hours_without_unit_match_monthly_or_weekly(declared):
+    assert _severities(check_payslip(FICHE, declared_hours=declared))["heures"] == OK
+
+
+def test_hours_discrepancy_is_a_hint_for_the_model():
+    report = check_payslip(FICHE, declared_hours=120)
+
+    assert _severities(report)["heures"] == WARNING
+    assert report.verdict is None
+    assert "8,67 h supplémentaires" in report.prompt("Vérifie la fiche")
+
+
+def test_net_above_gross_is_a_hint_for_the_model():
+    report = check_payslip("Salaire brut 1 200,00\nNet à payer 1 500,00\n")
+
+    assert _severities(report)["net_brut"] == WARNING
+    assert report.verdict is None
+
+
+def test_explicit_rate_below_the_smic_settles_the_check():
+    fiche = "Salaire de base 151,67 10,00 1 516,70 18 200,40\nSalaire brut 1 516,70\nNet à payer 1 180,00\n"
+    report = check_payslip(fiche, smic_hourly=11.88)
+
+    assert _severities(report)["smic"] == ANOMALY
+    assert report.verdict["result"] == "Non conforme"
+    # Apprentices may be paid below it: only a hint then
+    assert check_payslip(fiche, "Contrat d'apprentissage", smic_hourly=11.88).verdict is None
@@ -0,0 +1,69 @@
+from types import SimpleNamespace
+
+import pytest
+
+from core.pricing import DEFAULT_PRICE_ID, PriceCatalogue, PriceUnavailable
+
+
+def _catalogue(active, price_ids=None):
+    """
+    Catalogue over a fake Stripe whose prices are active per `active`;
+    retrieving a price missing from `active` raises.
+    """
+    def retrieve(price_id):
+        if price_id not in active:
+            raise ConnectionError(f"cannot load {price_id}")
+        return SimpleNamespace(id=price_id, unit_amount=990, currency="eur", active=active[price_id])
+
+    stripe = SimpleNamespace(Price=SimpleNamespace(retrieve=retrieve))
+    return PriceCatalogue(lambda: stripe, price_ids=price_ids or {"contrat": "price_contrat", "fiche": DEFAULT_PRICE_ID})
+
+
+def test_line_items_use_the_configured_ids_until_loaded():
+    catalogue = _catalogue({})
+    assert catalogue.line_items("contrat", 2) == [{"price": "price_contrat", "quantity": 2}]
+
+
+def test_line_items_come_from_the_cached_prices():
+    catalogue = _catalogue({"price_contrat": True, DEFAULT_PRICE_ID: True})
+    catalogue.refresh()
+    assert catalogue.line_items("contrat") == [{"price": "price_contrat", "quantity": 1}]
+    assert catalogue.line_items("batch", 3) == [{"price": DEFAULT_PRICE_ID, "quantity": 3}]
+
+
+def test_inactive_price_falls_back_to_the_default():
+    catalogue = _catalogue({"price_contrat": False, DEFAULT_PRICE_ID: True})
+    catalogue.refresh()
+    assert catalogue.line_items("contrat") == [{"price": DEFAULT_PRICE_ID, "quantity": 1}]
+
+
+def test_no_active_price_is_refused():
+    catalogue = _catalogue({"price_contrat": False, DEFAULT_PRICE_ID: False})
+    catalogue.refresh()
+    with pytest.raises(PriceUnavailable):
+        catalogue.line_items("contrat")
+
+
+def test_default_price_is_loaded_even_when_no_module_uses_it():
+    catalogue = _catalogue({"price_contrat": False, "price_fiche": True, DEFAULT_PRICE_ID: True},
+                           price_ids={"contrat": "price_contrat", "fiche": "price_fiche"})
+    assert catalogue.refresh() == []
+    assert catalogue.line_items("contrat") == [{"price": DEFAULT_PRICE_ID, "quantity": 1}]
+
+
+def test_one_failing_price_does_not_block_the_others():
+    catalogue = _catalogue({DEFAULT_PRICE_ID: True})
+    assert catalogue.refresh() == ["price_contrat"]
+    assert catalogue.prices[DEFAULT_PRICE_ID].active
+    assert catalogue.line_items("contrat") == [{"price": "price_contrat", "quantity": 1}]
+
+
+def test_failed_price_keeps_its_previous_entry():
+    active = {"price_contrat": False, DEFAULT_PRICE_ID: True}
+    catalogue = _catalogue(active)
+    catalogue.refresh()
+    del active["price_contrat"]  # Stripe unreachable for this price on the next refresh
+
+    assert catalogue.refresh() == ["price_contrat"]
+    assert not catalogue.prices["price_contrat"].active
+    assert catalogue.line_items("contrat") == [{"price": DEFAULT_PRICE_ID, "quantity": 1}]
@@ -0,0 +1,113 @@
+import pytest
+
+from core import rate_limit
+from core.rate_limit import (AdaptiveConcurrency, BucketBackend, MemoryBucketBackend, RateLimiter,
+                             SQLiteBucketBackend, _take)
+
+
+def test_bucket_grants_until_empty_then_refills():
+    state = {}
+    bucket = [("m:tokens", 60, 100, 10)]  # 100 tokens, 10 per second
+
+    assert _take(state, bucket, now=0) == 0
+    assert state["m:tokens"] == (40, 0)
+    # 40 left, 60 needed: 2 seconds of refill, nothing taken meanwhile
+    assert _take(state, bucket, now=0) == pytest.approx(2)
+    assert state["m:tokens"] == (40, 0)
+    assert _take(state, bucket, now=2) == 0
+    assert state["m:tokens"] == (pytest.approx(0), 2)
+    # Refill stops at the capacity
+    _take(state, [("m:tokens", 0, 100, 10)], now=1000)
+    assert state["m:tokens"] == (100, 1000)
+
+
+def test_take_is_all_or_nothing_across_buckets():
+    state = {}
+    requests = [("m:requests", 1, 10, 1), ("m:tokens", 500, 100, 10)]
+
+    # More than the capacity is capped to it (a single huge request still passes)
+    assert _take(state, requests, now=0) == 0
+    assert _take(state, requests, now=0) == pytest.approx(10)
+    assert state["m:requests"] == (9, 0)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def bucket_backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryBucketBackend()
+    return SQLiteBucketBackend(tmp_path / "rate-limit.sqlite3")
+
+
+def test_backend_shares_one_budget(bucket_backend):
+    requests = [("m:requests", 1, 2, 2 / 60)]
+    assert bucket_backend.take(requests) == 0
+    assert bucket_backend.take(requests) == 0
+    assert bucket_backend.take(requests) == pytest.approx(30, rel=0.01)
+
+
+def test_sqlite_buckets_are_shared_between_instances(tmp_path):
+    requests = [("m:requests", 1, 1, 1 / 60)]
+    assert SQLiteBucketBackend(tmp_path / "rl.sqlite3").take(requests) == 0
+    assert SQLiteBucketBackend(tmp_path / "rl.sqlite3").take(requests) > 0
+
+
+def test_incomplete_bucket_backend_fails_on_instantiation():
+    class Nothing(BucketBackend):
+        pass
+
+    with pytest.raises(TypeError):
+        Nothing()
+
+
+def test_limiter_sleeps_for_the_wait_then_takes(monkeypatch):
+    waits = [1.5, 0]
+
+    class Backend(BucketBackend):
+        def take(self, requests):
+            return waits.pop(0)
+
+    slept = []
+    monkeypatch.setattr(rate_limit.time, "sleep", slept.append)
+    monkeypatch.setattr(rate_limit.random, "uniform", lambda a, b: 0)
+
+    assert RateLimiter(Backend()).acquire("gpt-4o-mini", 100) == 1.5
+    assert slept == [1.5]
+
+
+def test_concurrency_halves_on_overload_down_to_the_minimum():
+    concurrency = AdaptiveConcurrency(initial=8, minimum=2, maximum=32)
+    for expected in (4, 2, 2):
+        concurrency.acquire()
+        concurrency.release(overloaded=True)
+        assert concurrency.limit == expected
+
+
+def test_concurrency_halves_on_latency_spike():
+    concurrency = AdaptiveConcurrency(initial=8, minimum=1, maximum=32, latency_spike=3.0)
+    concurrency.acquire()
+    concurrency.release(latency=1.0)
+    limit = concurrency.limit
+    concurrency.acquire()
+    concurrency.release(latency=3.5)
+    assert concurrency.limit == pytest.approx(limit / 2)
+
+
+def test_concurrency_grows_by_one_per_window_of_successes():
+    concurrency = AdaptiveConcurrency(initial=4, minimum=1, maximum=5)
+    for _ in range(4):
+        concurrency.acquire()
+        concurrency.release(latency=1.0)
+    assert int(concurrency.limit) == 4 and concurrency.limit > 4.8
+
+    for _ in range(20):
+        concurrency.acquire()
+        concurrency.release(latency=1.0)
+    assert concurrency.limit == 5
+
+
+def test_concurrency_caps_calls_in_flight():
+    concurrency = AdaptiveConcurrency(initial=2)
+    assert concurrency.try_acquire() and concurrency.try_acquire()
+    assert not concurrency.try_acquire()
+    concurrency.release(latency=1.0)
+    assert concurrency.try_acquire()
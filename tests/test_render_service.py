@@ -0,0 +1,28 @@
+import pytest
+
+from core import report
+from core.render_service import RenderService
+
+RESULT = {"result": "Conforme", "detail": "## Analyse\n\nLe contrat est **conforme**."}
+
+
+def test_pool_does_not_fork():
+    service = RenderService(workers=1)
+    try:
+        assert service._get_executor()._mp_context.get_start_method() in ("forkserver", "spawn")
+    finally:
+        service.shutdown()
+
+
+def test_renders_while_the_parent_holds_the_renderer_lock():
+    pytest.importorskip("markdown")
+    service = RenderService(workers=1)
+    try:
+        # A forked child would inherit this lock held and never render
+        with report._renderer_lock:
+            pdf = service.render(RESULT, timeout=60)
+    finally:
+        service.shutdown()
+
+    assert pdf.startswith(b"%PDF")
+    assert service.stats()["completed"] == 1
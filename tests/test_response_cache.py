@@ -0,0 +1,87 @@
+import time
+
+import pytest
+
+from core.response_cache import CacheBackend, MemoryBackend, ResponseCache, SQLiteBackend, request_key
+
+REQUEST = {
+    "model": "gpt-4o-mini",
+    "messages": [{"role": "user", "content": "Analyse ce contrat"}],
+    "temperature": 0,
+}
+
+
+def test_request_key_ignores_key_order():
+    reordered = {"temperature": 0, "messages": [{"content": "Analyse ce contrat", "role": "user"}],
+                 "model": "gpt-4o-mini"}
+    assert request_key(reordered) == request_key(REQUEST)
+
+
+def test_request_key_changes_with_the_request():
+    other = dict(REQUEST, messages=[{"role": "user", "content": "Analyse cette fiche"}])
+    assert request_key(other) != request_key(REQUEST)
+    assert request_key(dict(REQUEST, model="gpt-4o")) != request_key(REQUEST)
+
+
+def test_sqlite_backend_keeps_the_most_recently_used(tmp_path):
+    backend = SQLiteBackend(tmp_path / "cache.sqlite3", max_entries=2)
+    expires_at = time.time() + 60
+    for key in ("a", "b", "c"):
+        backend.set(key, key, expires_at)
+        time.sleep(0.01)
+    assert backend.get("a") is None
+    assert backend.get("c") == "c"
+
+
+def test_hit_and_miss_are_counted():
+    cache = ResponseCache(MemoryBackend())
+    assert cache.get(REQUEST) is None
+    cache.set(REQUEST, "Conforme")
+    assert cache.get(REQUEST) == "Conforme"
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    return MemoryBackend() if request.param == "memory" else SQLiteBackend(tmp_path / "cache.sqlite3")
+
+
+def test_expired_entries_are_misses(backend):
+    backend.set("fresh", "a", time.time() + 60)
+    backend.set("stale", "b", time.time() - 1)
+    assert backend.get("fresh") == "a"
+    assert backend.get("stale") is None
+
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = MemoryBackend(max_entries=2)
+    expires_at = time.time() + 60
+    backend.set("a", "1", expires_at)
+    backend.set("b", "2", expires_at)
+    backend.get("a")
+    backend.set("c", "3", expires_at)
+    assert backend.get("b") is None
+    assert backend.get("a") == "1" and backend.get("c") == "3"
+
+
+def test_incomplete_backend_fails_on_instantiation():
+    class GetOnly(CacheBackend):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        GetOnly()
+
+
+def test_engine_answers_identical_requests_from_the_cache(make_engine):
+    engine = make_engine()
+    completions = engine.client.chat.completions
+
+    first = engine._analyse_text("Analyse ce contrat", "Article 1 ...")
+    second = engine._analyse_text("Analyse ce contrat", "Article 1 ...")
+    assert first == second
+    assert len(completions.requests) == 1
+
+    engine._analyse_text("Analyse ce contrat", "Article 1 ...", use_cache=False)
+    engine._analyse_text("Analyse ce contrat", "Article 2 ...")
+    assert len(completions.requests) == 3
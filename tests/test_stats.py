@@ -0,0 +1,57 @@
+import pytest
+from sqlalchemy import event
+
+from models import stats
+from models.models import Check, User, db
+
+
+@pytest.fixture
+def user_id(app, monkeypatch):
+    monkeypatch.setattr(stats, "_cache", {})
+    user = User(username="u", email="u@example.com", password_hash="x", confirmed_email=True)
+    db.session.add(user)
+    db.session.add_all([
+        Check(module="fiche", input_files="a.pdf", has_paid=True, result="Conforme", user=user),
+        Check(module="fiche", input_files="b.pdf", has_paid=True, result="Non conforme", user=user),
+        Check(module="fiche", input_files="c.pdf", has_paid=False, result=None, user=user),
+    ])
+    db.session.commit()
+    return user.id
+
+
+@pytest.fixture
+def statements(app):
+    seen = []
+
+    def record(conn, cursor, statement, *args):
+        seen.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", record)
+    yield seen
+    event.remove(db.engine, "before_cursor_execute", record)
+
+
+def test_stats_are_counted_in_one_grouped_query(user_id, statements):
+    assert stats.user_check_stats(user_id) == {"total": 3, "paid": 2, "conforme": 1, "non_conforme": 1}
+    assert len(statements) == 1 and "GROUP BY" in statements[0]
+
+
+def test_cache_hit_does_not_query_again(user_id, statements):
+    first = stats.user_check_stats(user_id)
+    assert stats.user_check_stats(user_id) == first
+    assert len(statements) == 1
+
+
+def test_new_check_invalidates_the_cached_stats(user_id):
+    assert stats.user_check_stats(user_id)["total"] == 3
+    db.session.add(Check(module="fiche", input_files="d.pdf", has_paid=True, result="Conforme", user_id=user_id))
+    db.session.commit()
+
+    assert stats.user_check_stats(user_id)["conforme"] == 2
+
+
+def test_expired_entry_is_recomputed(user_id, statements, monkeypatch):
+    monkeypatch.setattr(stats, "STATS_TTL", -1)
+    stats.user_check_stats(user_id)
+    stats.user_check_stats(user_id)
+    assert len(statements) == 2
@@ -0,0 +1,67 @@
+import errno
+import io
+import os
+
+import pytest
+
+from core import store
+
+
+def test_put_is_content_addressed(store_dirs):
+    first = store.put(io.BytesIO(b"contrat"), 1, ".pdf")
+    again = store.put(io.BytesIO(b"contrat"), 1, ".pdf")
+    other_user = store.put(io.BytesIO(b"contrat"), 2, ".pdf")
+
+    assert first == again != other_user
+    assert len(list((store_dirs / "blobs").glob("*/*"))) == 1
+    assert store.digest_for(first) == store.digest_for(other_user)
+
+
+def test_link_raises_file_exists_instead_of_copying(store_dirs, monkeypatch):
+    digest = store.write_blob(io.BytesIO(b"fiche"), ".pdf")
+    alias_path = store_dirs / "1_alias.pdf"
+    alias_path.write_bytes(b"already there")
+
+    # no link support at all: the copy fallback must not overwrite the alias
+    def unsupported(*args, **kwargs):
+        raise OSError(errno.EPERM, "not permitted")
+
+    monkeypatch.setattr(store.Path, "symlink_to", unsupported)
+    monkeypatch.setattr(store.os, "link", unsupported)
+
+    with pytest.raises(FileExistsError):
+        store._link(store._blob_path(digest, ".pdf"), alias_path)
+    assert alias_path.read_bytes() == b"already there"
+
+
+def test_concurrent_link_alias_is_already_linked(store_dirs, monkeypatch):
+    digest = store.write_blob(io.BytesIO(b"fiche"), ".pdf")
+    link = store._link
+
+    # the other request creates the alias between the exists() check and our link
+    def racing_link(target, alias_path):
+        link(target, alias_path)
+        link(target, alias_path)
+
+    monkeypatch.setattr(store, "_link", racing_link)
+    alias = store.link_alias(1, digest, ".pdf")
+
+    assert os.path.islink(store_dirs / alias)
+    assert store.resolve(alias).read_bytes() == b"fiche"
+
+
+def test_migrate_files_stores_identical_legacy_uploads_once(app, store_dirs):
+    (store_dirs / "1_contrat.pdf").write_bytes(b"same contract")
+    (store_dirs / "2_contrat.pdf").write_bytes(b"same contract")
+    (store_dirs / "2_fiche.pdf").write_bytes(b"payslip")
+
+    result = app.test_cli_runner().invoke(args=["migrate-files"])
+
+    assert result.exit_code == 0, result.output
+    assert "Migrated 3 files" in result.output
+    assert len(list((store_dirs / "blobs").glob("*/*"))) == 2
+    assert (store_dirs / "1_contrat.pdf").read_bytes() == b"same contract"
+    assert store.digest_for("1_contrat.pdf") == store.digest_for("2_contrat.pdf")
+    assert not list(store_dirs.glob("*.migrating"))
+    # Nothing left to migrate on a second run
+    assert "Migrated 0 files" in app.test_cli_runner().invoke(args=["migrate-files"]).output
@@ -0,0 +1,81 @@
+import json
+import runpy
+from pathlib import Path
+
+import pytest
+
+import main
+from core.streaming import STREAM_MAX_SECONDS, StreamHub
+from models.models import Check, Job, User, db
+
+
+def test_producer_persists_the_text_at_most_every_interval():
+    hub = StreamHub()
+    saved = []
+    with hub.producer("k", persist=saved.append, persist_every=3600) as publish:
+        publish("Le")
+        publish("Le contrat")
+    assert saved == ["Le"]
+
+    with hub.producer("k", persist=saved.append, persist_every=0) as publish:
+        publish("Le contrat est")
+    assert saved == ["Le", "Le contrat est"]
+
+
+@pytest.fixture
+def remote_job(app, monkeypatch):
+    """A check whose job runs in another process (nothing in this stream hub)."""
+    monkeypatch.setattr(main, "STREAM_POLL_SECONDS", 0.01)
+    monkeypatch.setattr(main, "STREAM_MAX_SECONDS", 0.05)
+    user = User(username="u", email="u@example.com", password_hash="x", confirmed_email=True)
+    check = Check(module="contrat", input_files="c.pdf", has_paid=True, user=user)
+    db.session.add_all([user, check])
+    db.session.commit()
+    job = Job(module="contrat", status="running", check=check, user_id=user.id, partial="## Analyse")
+    db.session.add(job)
+    db.session.commit()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = str(user.id)
+    return client, check, job
+
+
+def _events(response):
+    return [(block.split("\n")[0][len("event: "):], json.loads(block.split("\n")[1][len("data: "):]))
+            for block in response.get_data(as_text=True).split("\n\n") if block.startswith("event:")]
+
+
+def test_stream_reads_the_text_saved_by_another_process(remote_job):
+    client, check, job = remote_job
+
+    assert _events(client.get(f"/check-result/{check.id}/stream")) == [("delta", "## Analyse")]
+
+    db.session.get(Job, job.id).status = "done"  # the stream closed the session
+    db.session.commit()
+    assert _events(client.get(f"/check-result/{check.id}/stream")) == [("done", "")]
+
+
+def test_job_text_is_saved_while_running_and_cleared_when_done(app):
+    jobs = main.get_jobs()
+    seen = []
+
+    def handler(job, data):
+        with main.stream_hub.producer(job.id, persist=main.partial_text_writer(job), persist_every=0) as on_text:
+            on_text("Le contrat")
+            seen.append(db.session.scalar(db.select(Job.partial).where(Job.id == job.id)))
+
+    jobs.handler("test")(handler)
+    job = jobs.submit("test", {})
+    jobs._run(job.id)
+
+    db.session.expire_all()
+    assert seen == ["Le contrat"]
+    assert db.session.get(Job, job.id).status == "done"
+    assert db.session.get(Job, job.id).partial is None
+
+
+def test_streams_close_before_the_worker_timeout():
+    config = runpy.run_path(str(Path(main.__file__).with_name("gunicorn.conf.py")))
+
+    assert config["worker_class"] == "gthread"
+    assert STREAM_MAX_SECONDS < config["timeout"]
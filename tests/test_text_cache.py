@@ -0,0 +1,55 @@
+import io
+
+from core import extraction, store, text_cache
+from core.text_cache import TextCache
+
+
+def test_get_put_and_counters(tmp_path):
+    cache = TextCache(path=tmp_path / "texts.sqlite3")
+
+    assert cache.get("abc") is None
+    cache.put("abc", "Article 1")
+    assert cache.get("abc") == "Article 1"
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_other_extractor_version_is_a_miss(tmp_path):
+    TextCache(path=tmp_path / "texts.sqlite3", version="1").put("abc", "old extraction")
+    assert TextCache(path=tmp_path / "texts.sqlite3", version="2").get("abc") is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, monkeypatch):
+    clock = iter(range(100))
+    monkeypatch.setattr(text_cache.time, "time", lambda: next(clock))
+    cache = TextCache(path=tmp_path / "texts.sqlite3", max_bytes=20)
+
+    cache.put("a", "x" * 8)
+    cache.put("b", "y" * 8)
+    cache.get("a")  # "b" is now the least recently used
+    cache.put("c", "z" * 8)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "x" * 8 and cache.get("c") == "z" * 8
+    assert cache.stats()["bytes"] <= 20
+
+
+def test_text_above_the_bound_is_not_stored(tmp_path):
+    cache = TextCache(path=tmp_path / "texts.sqlite3", max_bytes=4)
+    cache.put("a", "too long")
+    assert cache.stats()["entries"] == 0
+
+
+def test_engine_extracts_a_document_once(make_engine, store_dirs, monkeypatch):
+    engine = make_engine()
+    calls = []
+
+    def read_pdf(path, max_tokens=None):
+        calls.append(path)
+        return {"text": "Contrat de travail", "truncated": False}
+
+    monkeypatch.setattr(extraction, "read_pdf", read_pdf)
+    first = store.put(io.BytesIO(b"%PDF contrat"), 1, ".pdf")
+    other_user = store.put(io.BytesIO(b"%PDF contrat"), 2, ".pdf")
+
+    assert engine._read_file(first) == engine._read_file(other_user) == "Contrat de travail"
+    assert len(calls) == 1
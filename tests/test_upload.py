@@ -0,0 +1,49 @@
+import io
+import zipfile
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from core import upload
+from core.upload import UploadError, save_batch_uploads
+
+
+def _zip(entries):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in entries:
+            archive.writestr(name, data)
+    buffer.seek(0)
+    return FileStorage(stream=buffer, filename="fiches.zip")
+
+
+def test_zip_of_payslips_is_stored(store_dirs):
+    names = save_batch_uploads([_zip([("janvier.pdf", b"%PDF 1"), ("notes.txt", b"x"), ("fevrier.pdf", b"%PDF 2")])], 1)
+    assert len(names) == 2
+
+
+def test_oversized_entry_is_refused_before_extraction(store_dirs, monkeypatch):
+    monkeypatch.setattr(upload, "ZIP_MAX_ENTRY_BYTES", 1024)
+    # Compresses to a few bytes, 1 MB once extracted
+    with pytest.raises(UploadError, match="too large"):
+        save_batch_uploads([_zip([("bomb.pdf", b"\0" * 1024 * 1024)])], 1)
+    assert not list(store_dirs.glob("*.pdf"))
+
+
+def test_total_uncompressed_size_is_capped(store_dirs, monkeypatch):
+    monkeypatch.setattr(upload, "ZIP_MAX_TOTAL_BYTES", 1500)
+    with pytest.raises(UploadError, match="too large"):
+        save_batch_uploads([_zip([(f"{i}.pdf", b"\0" * 1000) for i in range(2)])], 1)
+
+
+def test_entry_count_is_capped(store_dirs, monkeypatch):
+    monkeypatch.setattr(upload, "ZIP_MAX_ENTRIES", 3)
+    with pytest.raises(UploadError, match="Too many entries"):
+        save_batch_uploads([_zip([(f"{i}.txt", b"x") for i in range(4)])], 1)
+
+
+def test_request_body_is_bounded(app):
+    assert app.config["MAX_CONTENT_LENGTH"]
+    client = app.test_client()
+    app.config["MAX_CONTENT_LENGTH"] = 10
+    assert client.post("/login", data=b"x" * 100, content_type="application/octet-stream").status_code == 413
@@ -0,0 +1,10 @@
+"""
+WSGI entry point: `gunicorn wsgi:app`.
+
+Any number of workers may serve it: jobs, mails and the analysis streams
+go through the database, not through the memory of one worker. The worker
+settings (threaded workers, for the streams) are in gunicorn.conf.py.
+"""
+from main import create_app
+
+app = create_app()